@@ -0,0 +1,589 @@
+"""
+usage: simulate_log.py [-h] [-s] [-c COUNT] [-b BATCH_SIZE]
+                       [--max-batch-bytes MAX_BATCH_BYTES]
+                       [--content-encoding {gzip,deflate}]
+                       [--compression-level {1-9}] [--concurrency CONCURRENCY]
+                       [--rate RATE] [--duration DURATION]
+                       [--profile {constant,ramp,step,spike}]
+                       [--retries RETRIES] [--backoff BACKOFF]
+                       [--max-backoff MAX_BACKOFF] [--services SERVICES]
+                       [--levels LEVELS] [--templates TEMPLATES] [--seed SEED]
+                       [--report REPORT]
+
+Simulate a stream of logs sent to Apollo.
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -s, --staging         send to staging instance, defaults to local
+  -c COUNT, --count COUNT
+                        number of logs to send
+  -b BATCH_SIZE, --batch-size BATCH_SIZE
+                        maximum number of logs to send per request
+  --max-batch-bytes MAX_BATCH_BYTES
+                        maximum size of a request body in bytes
+  --content-encoding {gzip,deflate}
+                        compress request bodies with a Content-Encoding of
+                        gzip or deflate
+  --compression-level {1-9}
+                        compression level, 1 is fastest, 9 smallest
+  --concurrency CONCURRENCY
+                        number of requests in flight
+  --rate RATE           target rate in logs per second, replaces --count
+  --duration DURATION   duration of a rate-controlled run in seconds
+  --profile {constant,ramp,step,spike}
+                        profile of the target rate over the run
+  --retries RETRIES     maximum number of retries of a request failing with
+                        429, 5xx or a connection error
+  --backoff BACKOFF     base of the jittered exponential backoff between
+                        retries in seconds
+  --max-backoff MAX_BACKOFF
+                        maximum backoff between retries in seconds
+  --services SERVICES   comma-separated services logs are sent from
+  --levels LEVELS       comma-separated levels of the logs, each optionally
+                        followed by =WEIGHT, defaults to
+                        debug=10,info=70,warning=15,error=5
+  --templates TEMPLATES
+                        file of message templates, one per line, with
+                        placeholders {count}, {duration}, {id}, {resource},
+                        {status}, {user}
+  --seed SEED           seed of the mix of logs, defaults to the current time
+  --report REPORT       file the JSON report of the run is written to
+"""
+
+import argparse
+import base64
+import datetime
+import itertools
+import json
+import os
+import random
+import string
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import (
+    BASE_URL_LOCAL, BASE_URL_STAGING, INCOMING_LOGS, MAX_BATCH_BYTES,
+    TIME_FORMAT_DEFAULT_DATETIME)
+from sender import (
+    BACKOFF, COMPRESSION_LEVEL, CONTENT_ENCODINGS, MAX_BACKOFF, RATE_PROFILES,
+    RateProfile, RetryPolicy, Sender, compress_payloads, create_payloads,
+    pace)
+from hubble.workload import cumulative, draw
+from stats import RunStats, format_summary, write_report
+from utils import get_cookies
+
+LEVELS = ['debug', 'info', 'warning', 'error', 'critical']
+
+# default mix of log levels
+DEFAULT_LEVELS = 'debug=10,info=70,warning=15,error=5'
+
+# default message templates, placeholders are filled in for every log, see
+# PLACEHOLDERS
+MESSAGE_TEMPLATES = [
+    'GET /api/v1/{resource}/{id} {status} in {duration}ms',
+    'User {user} signed in',
+    'Processed {count} records of {resource} in {duration}ms',
+    'Cache miss for {resource}:{id}',
+    'Retrying request to {resource} in {duration}ms'
+]
+
+PLACEHOLDERS = ['count', 'duration', 'id', 'resource', 'status', 'user']
+
+RESOURCES = ['documents', 'sheets', 'users', 'workspaces']
+
+STATUS_CODES = ['200', '200', '200', '201', '204', '404', '500']
+
+
+def parse_args():
+    # configure command line argument parser
+    parser = argparse.ArgumentParser(
+        description='Simulate a stream of logs sent to Apollo.')
+
+    # specify if logs should be sent to staging, defaults to local
+    parser.add_argument('-s', '--staging', action='store_true',
+                        help='send to staging instance, defaults to local')
+
+    # specify the number of logs to send, defaults to 1000
+    parser.add_argument('-c', '--count', type=int, default=1000,
+                        help='number of logs to send')
+
+    # specify the maximum number of logs to send per request
+    parser.add_argument('-b', '--batch-size', type=int, default=100,
+                        help='maximum number of logs to send per request')
+
+    # specify the maximum size of a request body in bytes
+    parser.add_argument('--max-batch-bytes', type=int,
+                        default=MAX_BATCH_BYTES,
+                        help='maximum size of a request body in bytes')
+
+    # specify if request bodies are compressed, see compress_payloads
+    parser.add_argument('--content-encoding', choices=CONTENT_ENCODINGS,
+                        default=None,
+                        help='compress request bodies with a Content-Encoding '
+                             'of gzip or deflate')
+    parser.add_argument('--compression-level', type=int,
+                        default=COMPRESSION_LEVEL, choices=range(1, 10),
+                        metavar='{1-9}',
+                        help='compression level, 1 is fastest, 9 smallest')
+
+    # specify the number of requests in flight
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='number of requests in flight')
+
+    # specify a target rate in logs per second, sends logs for --duration
+    # seconds instead of sending --count logs
+    parser.add_argument('--rate', type=float, default=None,
+                        help='target rate in logs per second, replaces '
+                             '--count')
+    parser.add_argument('--duration', type=float, default=60,
+                        help='duration of a rate-controlled run in seconds')
+    parser.add_argument('--profile', choices=RATE_PROFILES,
+                        default='constant',
+                        help='profile of the target rate over the run')
+
+    # specify how requests failing with 429, 5xx or a connection error are
+    # retried, see RetryPolicy
+    parser.add_argument('--retries', type=int, default=3,
+                        help='maximum number of retries of a request failing '
+                             'with 429, 5xx or a connection error')
+    parser.add_argument('--backoff', type=float, default=BACKOFF,
+                        help='base of the jittered exponential backoff '
+                             'between retries in seconds')
+    parser.add_argument('--max-backoff', type=float, default=MAX_BACKOFF,
+                        help='maximum backoff between retries in seconds')
+
+    # specify the services, levels and messages of the logs
+    parser.add_argument('--services', type=parse_list,
+                        default=['service-prod'],
+                        help='comma-separated services logs are sent from')
+    parser.add_argument('--levels', type=parse_levels,
+                        default=parse_levels(DEFAULT_LEVELS),
+                        help='comma-separated levels of the logs, each '
+                             'optionally followed by =WEIGHT, defaults to '
+                             '{}'.format(DEFAULT_LEVELS))
+    parser.add_argument('--templates', default=None,
+                        help='file of message templates, one per line, with '
+                             'placeholders {{{}}}'.format(
+                                 '}, {'.join(PLACEHOLDERS)))
+
+    # specify the seed of the random mix of logs, defaults to the current
+    # time
+    parser.add_argument('--seed', default=None,
+                        help='seed of the mix of logs, defaults to the '
+                             'current time')
+
+    # specify a file the JSON report of the run is written to
+    parser.add_argument('--report', default=None,
+                        help='file the JSON report of the run is written to')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.staging:
+        base_url = BASE_URL_STAGING
+    else:
+        base_url = BASE_URL_LOCAL
+    url = base_url + INCOMING_LOGS
+
+    if args.templates:
+        templates = load_templates(args.templates)
+    else:
+        templates = [MessageTemplate(t) for t in MESSAGE_TEMPLATES]
+
+    if args.seed is None:
+        args.seed = str(datetime.datetime.now())
+
+    mix = LogMix(args.services, args.levels, templates, args.seed)
+
+    if args.rate:
+        count = None
+        profile = RateProfile(args.rate, args.duration, args.profile)
+    else:
+        count = args.count
+        profile = None
+
+    stats = RunStats()
+    try:
+        send_logs(
+            generate_logs(mix, count), url, args.batch_size,
+            args.max_batch_bytes, args.concurrency, profile, stats,
+            RetryPolicy(args.retries, args.backoff, args.max_backoff),
+            args.content_encoding, args.compression_level)
+        print_levels(stats)
+    finally:
+        # the report is written even if the run exits on a failed request
+        if args.report:
+            write_report(create_report(args, stats), args.report)
+
+
+def parse_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_levels(value):
+    """
+    Parse a comma-separated list of log levels, each optionally followed by
+    =WEIGHT.
+
+    :param value: e.g. info=80,warning=15,error
+    :type value: str
+    :return: (level, weight) of each level, weights default to 1
+    :rtype: list
+    """
+    levels = []
+    for item in parse_list(value):
+        level, _, weight = item.partition('=')
+        if level not in LEVELS:
+            raise argparse.ArgumentTypeError(
+                '{} is not one of: {}.'.format(level, ', '.join(LEVELS)))
+        levels.append((level, float(weight) if weight else 1.0))
+    return levels
+
+
+def load_templates(filename):
+    """
+    Load message templates, one per line. Blank lines are skipped.
+
+    :param filename: name of the file of message templates
+    :type filename: str
+    :return: message templates
+    :rtype: list
+    """
+    with open(filename) as f:
+        templates = [MessageTemplate(line.rstrip('\n')) for line in f
+                     if line.strip()]
+    if not templates:
+        raise ValueError('{} does not contain a template.'.format(filename))
+    return templates
+
+
+class MessageTemplate(object):
+    """
+    Message with placeholders filled in with random values, e.g.
+    'User {user} signed in'.
+    """
+
+    def __init__(self, template):
+        """
+        :param template: message with placeholders of PLACEHOLDERS
+        :type template: str
+        """
+        self.template = template
+        # the placeholders are parsed once, only their values are drawn
+        self.fields = sorted(set(
+            field for _, field, _, _ in string.Formatter().parse(template)
+            if field is not None))
+        unknown = set(self.fields) - set(PLACEHOLDERS)
+        if unknown:
+            raise ValueError('{} has unknown placeholders: {}.'.format(
+                template, ', '.join(sorted(unknown))))
+
+    def render(self, random_):
+        """
+        Render the message with random values.
+
+        :param random_: random number generator
+        :type random_: random.Random
+        :return: message
+        :rtype: str
+        """
+        if not self.fields:
+            return self.template
+        return self.template.format(**dict(
+            (field, draw_placeholder(field, random_))
+            for field in self.fields))
+
+
+def draw_placeholder(field, random_):
+    if field == 'count':
+        return random_.randint(1, 10000)
+    elif field == 'duration':
+        return random_.randint(1, 5000)
+    elif field == 'id':
+        return '{:08x}'.format(random_.getrandbits(32))
+    elif field == 'resource':
+        return random_.choice(RESOURCES)
+    elif field == 'status':
+        return random_.choice(STATUS_CODES)
+    return 'user-{}'.format(random_.randint(1, 1000))
+
+
+class LogTemplate(object):
+    """
+    Pre-serialised log of a service and level.
+
+    The log is serialised once with placeholders for its message and
+    timestamp, so that rendering a log only escapes its message and joins it
+    with the serialised parts. The result is identical to json.dumps of the
+    log with sorted keys.
+    """
+
+    def __init__(self, service, level):
+        """
+        :param service: service from which the logs are sent
+        :type service: str
+        :param level: level of the logs
+        :type level: str
+        """
+        token = uuid.uuid4().hex
+        serialised = json.dumps(create_log(
+            service, level, 'message-' + token, 'timestamp-' + token),
+            sort_keys=True)
+        # message comes before timestamp in a log with sorted keys
+        self._head, rest = serialised.split('"message-{}"'.format(token))
+        self._middle, self._tail = rest.split('"timestamp-{}"'.format(token))
+
+    def render(self, message, timestamp):
+        """
+        Render a log as JSON.
+
+        :param message: message of the log
+        :type message: str
+        :param timestamp: timestamp of the log, already formatted
+        :type timestamp: str
+        :return: JSON representation of the log
+        :rtype: str
+        """
+        return ''.join([self._head, json.dumps(message), self._middle,
+                        json.dumps(timestamp), self._tail])
+
+
+def create_log(service, level, message, timestamp):
+    """
+    Create a log as sent to Apollo.
+
+    A log has the following form:
+    {
+      "context": {},
+      "level": "info",
+      "message": "",
+      "metadata": {
+        "logger": "service"
+      },
+      "service": {
+        "name": "service"
+      },
+      "timestamp": "%Y-%m-%dT%H:%M:%S.%fZ"
+    }
+
+    :param service: service from which the log is sent
+    :type service: str
+    :param level: level of the log
+    :type level: str
+    :param message: message of the log
+    :type message: str
+    :param timestamp: timestamp of the log, already formatted
+    :type timestamp: str
+    :return: log
+    :rtype: dict
+    """
+    return {
+        'context': {},
+        'level': level,
+        'message': message,
+        'metadata': {
+            'logger': service
+        },
+        'service': {
+            'name': service
+        },
+        'timestamp': timestamp
+    }
+
+
+class LogMix(object):
+    """
+    Random mix of the services, levels and messages of logs.
+
+    Services and message templates are drawn uniformly, levels by weight.
+    """
+
+    def __init__(self, services, levels, templates, random_seed=None):
+        """
+        :param services: services logs are sent from
+        :type services: list
+        :param levels: (level, weight) of the levels of the logs
+        :type levels: list
+        :param templates: message templates
+        :type templates: list
+        :param random_seed: seed of the draws
+        :type random_seed: str
+        """
+        if not services or not levels or not templates:
+            raise ValueError(
+                'services, levels and templates must not be empty.')
+        self.services = services
+        self.levels = [level for level, _ in levels]
+        self.templates = templates
+        self._level_weights = cumulative(weight for _, weight in levels)
+        self.random = random.Random(random_seed)
+
+    def sample(self):
+        """
+        Draw the service, level and message template of a log.
+
+        :return: service, level, message template
+        :rtype: str, str, MessageTemplate
+        """
+        level = self.levels[draw(self.random, self._level_weights)]
+        return (self.random.choice(self.services), level,
+                self.random.choice(self.templates))
+
+
+def generate_logs(mix, count=None, clock=time.time):
+    """
+    Lazily generate base64 encoded logs, labelled by level.
+
+    Each log is rendered from the template of its service and level, see
+    LogTemplate, with the current time of the clock in UTC. The time is
+    formatted with strftime once per second. The label of a log is its
+    level, so that the logs delivered are counted by level, see
+    create_payloads.
+
+    :param mix: mix of services, levels and messages
+    :type mix: LogMix
+    :param count: number of logs, None for an unbounded number of logs
+    :type count: int
+    :param clock: function returning the current time in seconds since the
+        epoch
+    :type clock: function
+    :return: generator of (base64 encoded log, level)
+    :rtype: generator
+    """
+    templates = {}
+    last_second = None
+    prefix = ''
+    draws = itertools.count() if count is None else xrange(count)
+    for _ in draws:
+        service, level, message = mix.sample()
+        template = templates.get((service, level))
+        if template is None:
+            template = templates[(service, level)] = LogTemplate(
+                service, level)
+        now = clock()
+        second = int(now)
+        if second != last_second:
+            prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            last_second = second
+        timestamp = '{}.{:06d}Z'.format(prefix, int((now - second) * 1e6))
+        yield base64.b64encode(
+            template.render(message.render(mix.random), timestamp)), level
+
+
+def send_logs(encoded_logs, url, batch_size=1, max_bytes=MAX_BATCH_BYTES,
+              concurrency=1, profile=None, stats=None, retry=None,
+              encoding=None, level=COMPRESSION_LEVEL):
+    """
+    Send base64 encoded logs to the incoming logs endpoint.
+
+    Logs are sent in batches of up to batch_size logs per request, see
+    create_payloads, with up to concurrency requests in flight. If a rate
+    profile is given, logs are sent at the target rate of the profile until
+    its duration has elapsed.
+
+    :param encoded_logs: iterable of base64 encoded logs, or of (base64
+        encoded log, level) to count the logs delivered by level, consumed
+        lazily
+    :type encoded_logs: iterable
+    :param url: url for incoming logs endpoint
+    :type url: str
+    :param batch_size: maximum number of logs per request
+    :type batch_size: int
+    :param max_bytes: maximum size of a request body in bytes
+    :type max_bytes: int
+    :param concurrency: number of requests in flight
+    :type concurrency: int
+    :param profile: target rate over the duration of the run
+    :type profile: RateProfile
+    :param stats: statistics the requests are recorded in
+    :type stats: RunStats
+    :param retry: policy of retrying failed requests, defaults to no retries
+    :type retry: RetryPolicy
+    :param encoding: content encoding request bodies are compressed with:
+        gzip, deflate, defaults to none
+    :type encoding: str
+    :param level: compression level, 1 (fastest) to 9 (smallest)
+    :type level: int
+    :return: sender used to send the logs
+    :rtype: Sender
+    """
+    headers = {
+        'Content-Type': 'application/json'
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    cookies = get_cookies()
+
+    stats = stats or RunStats()
+    payloads = create_payloads(encoded_logs, batch_size, max_bytes)
+    if encoding:
+        payloads = compress_payloads(payloads, encoding, level, stats)
+    if profile:
+        payloads = pace(payloads, profile)
+
+    sender = Sender(url, concurrency, headers, cookies, stats=stats,
+                    retry=retry)
+    sender.send(payloads)
+
+    print format_summary(stats.summary(), 'Incoming logs:', 'logs')
+
+    if sender.exception:
+        raise sender.exception
+    elif sender.status_code == 403:
+        print 'Error! 403 Forbidden.'
+        sys.exit(1)
+    elif sender.status_code:
+        print 'Error! {}'.format(sender.status_code)
+        sys.exit(1)
+
+    print 'Success!'
+    return sender
+
+
+def print_levels(stats):
+    """
+    Print the logs delivered by level.
+
+    :param stats: statistics of the run
+    :type stats: RunStats
+    :return: None
+    :rtype: None
+    """
+    total = float(sum(stats.labels.itervalues()))
+    if not total:
+        return
+    print '{:<12} {:>12} {:>8}'.format('level', 'logs', 'share')
+    for level in LEVELS:
+        if level in stats.labels:
+            count = stats.labels[level]
+            print '{:<12} {:>12} {:>7.1%}'.format(level, count, count / total)
+
+
+def create_report(args, stats):
+    """
+    Create the report of a run.
+
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param stats: statistics of the run
+    :type stats: RunStats
+    :return: report
+    :rtype: dict
+    """
+    return {
+        'args': vars(args),
+        'created': datetime.datetime.utcnow().strftime(
+            TIME_FORMAT_DEFAULT_DATETIME),
+        'incoming_logs': stats.summary()
+    }
+
+
+if __name__ == '__main__':
+    main()
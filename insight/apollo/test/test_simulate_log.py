@@ -0,0 +1,119 @@
+import unittest
+import mock
+import argparse
+import base64
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+from insight.apollo import simulate_log
+from insight.hubble import stub_server
+
+
+class SimulateLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.templates = [
+            simulate_log.MessageTemplate(t)
+            for t in simulate_log.MESSAGE_TEMPLATES]
+
+    def test_message_template(self):
+        template = simulate_log.MessageTemplate(
+            'User {user} read {resource}')
+        self.assertEqual(['resource', 'user'], template.fields)
+        message = template.render(mock.Mock(
+            randint=mock.Mock(return_value=7),
+            choice=mock.Mock(return_value='sheets')))
+        self.assertEqual('User user-7 read sheets', message)
+        # test a message without placeholders is rendered as it is
+        self.assertEqual(
+            'message', simulate_log.MessageTemplate('message').render(None))
+        with self.assertRaises(ValueError):
+            simulate_log.MessageTemplate('{unknown}')
+
+    def test_log_template(self):
+        template = simulate_log.LogTemplate('service-prod', 'info')
+        message = u'quoted "message" \u2603'
+        timestamp = '2018-06-14T12:00:00.000000Z'
+        self.assertEqual(
+            json.dumps(simulate_log.create_log(
+                'service-prod', 'info', message, timestamp), sort_keys=True),
+            template.render(message, timestamp))
+
+    def test_log_mix(self):
+        mix = simulate_log.LogMix(
+            ['a', 'b'], [('info', 3.0), ('error', 1.0)], self.templates,
+            'seed')
+        levels = [mix.sample()[1] for _ in range(4000)]
+        self.assertAlmostEqual(3000, levels.count('info'), delta=150)
+        # test draws are reproducible
+        other = simulate_log.LogMix(
+            ['a', 'b'], [('info', 3.0), ('error', 1.0)], self.templates,
+            'seed')
+        self.assertEqual(levels, [other.sample()[1] for _ in range(4000)])
+        with self.assertRaises(ValueError):
+            simulate_log.LogMix([], [('info', 1.0)], self.templates)
+
+    def test_generate_logs(self):
+        mix = simulate_log.LogMix(
+            ['service-prod'], [('info', 1.0), ('error', 1.0)], self.templates,
+            'seed')
+        clock = iter([1528977600.25, 1528977600.5, 1528977601.0])
+        labelled = list(simulate_log.generate_logs(mix, 3, clock.next))
+        logs = [json.loads(base64.b64decode(log)) for log, _ in labelled]
+        self.assertEqual(
+            ['2018-06-14T12:00:00.250000Z', '2018-06-14T12:00:00.500000Z',
+             '2018-06-14T12:00:01.000000Z'],
+            [log['timestamp'] for log in logs])
+        self.assertEqual({'name': 'service-prod'}, logs[0]['service'])
+        self.assertEqual([log['level'] for log in logs],
+                         [level for _, level in labelled])
+        # test an unbounded number of logs
+        logs = simulate_log.generate_logs(mix)
+        self.assertEqual(5, len(list(itertools.islice(logs, 5))))
+
+    def test_parse_levels(self):
+        self.assertEqual([('info', 80.0), ('error', 1.0)],
+                         simulate_log.parse_levels('info=80, error'))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            simulate_log.parse_levels('fatal')
+
+    def test_load_templates(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'templates.txt')
+        with open(filename, 'w') as f:
+            f.write('User {user} signed in\n\nSigned out\n')
+        self.assertEqual(
+            ['User {user} signed in', 'Signed out'],
+            [t.template for t in simulate_log.load_templates(filename)])
+        with open(filename, 'w') as f:
+            f.write('\n')
+        with self.assertRaises(ValueError):
+            simulate_log.load_templates(filename)
+
+    @mock.patch('time.sleep')
+    def test_send_logs(self, mock_sleep):
+        server = stub_server.start_server()
+        url = 'http://localhost:{}{}'.format(
+            server.server_address[1], simulate_log.INCOMING_LOGS)
+        mix = simulate_log.LogMix(
+            ['service-prod'], [('info', 1.0)], self.templates, 'seed')
+        stats = simulate_log.RunStats()
+        try:
+            simulate_log.send_logs(
+                simulate_log.generate_logs(mix, 250), url,
+                batch_size=100, concurrency=2, stats=stats, encoding='gzip')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual({'200': 3}, stats.status_codes)
+        self.assertEqual({'info': 250}, stats.labels)
+        self.assertEqual(250, server.get_stats()['records'])
+        self.assertEqual(0, server.get_stats()['rejected'])
+
+
+if __name__ == '__main__':
+    unittest.main()
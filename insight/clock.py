@@ -0,0 +1,111 @@
+import calendar
+import datetime
+import threading
+import time
+
+
+def get_utc_offset():
+    """
+    Return the offset of local time from UTC, rounded to the minute.
+
+    :return: local time minus UTC
+    :rtype: datetime.timedelta
+    """
+    offset = datetime.datetime.now() - datetime.datetime.utcnow()
+    return datetime.timedelta(
+        minutes=int(round(offset.total_seconds() / 60.0)))
+
+
+class Clock(object):
+    """
+    Wall clock of a run.
+
+    The times errors are dated with, the windows they are processed in and
+    the waits between them are read from a clock rather than the datetime
+    and time modules, so that a run can be driven by a VirtualClock instead.
+    Latencies and rates are always measured in wall-clock time.
+    """
+
+    def now(self):
+        """
+        :return: local time
+        :rtype: datetime.datetime
+        """
+        return datetime.datetime.now()
+
+    def utcnow(self):
+        """
+        :return: time in UTC
+        :rtype: datetime.datetime
+        """
+        return datetime.datetime.utcnow()
+
+    def time(self):
+        """
+        :return: seconds since the epoch
+        :rtype: float
+        """
+        return time.time()
+
+    def sleep(self, seconds):
+        """
+        Wait a number of seconds.
+
+        :param seconds: seconds to wait
+        :type seconds: float
+        :return: None
+        :rtype: None
+        """
+        time.sleep(seconds)
+
+    def advance(self, seconds):
+        """
+        Move the clock forward a number of seconds, which the wall clock can
+        only do by waiting.
+
+        :param seconds: seconds to move forward
+        :type seconds: float
+        :return: None
+        :rtype: None
+        """
+        self.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    Simulated clock, which only moves when it is slept on or advanced.
+
+    Sleeping and advancing return immediately, so that a scenario spanning
+    days runs as fast as the errors are accepted.
+    """
+
+    def __init__(self, start, utc_offset=None):
+        """
+        :param start: local time the clock starts at
+        :type start: datetime.datetime
+        :param utc_offset: local time minus UTC, defaults to the offset of
+            the wall clock
+        :type utc_offset: datetime.timedelta
+        """
+        if utc_offset is None:
+            utc_offset = get_utc_offset()
+        self.utc_offset = utc_offset
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._now
+
+    def utcnow(self):
+        return self._now - self.utc_offset
+
+    def time(self):
+        utc = self.utcnow()
+        return calendar.timegm(utc.timetuple()) + utc.microsecond / 1e6
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._now += datetime.timedelta(seconds=seconds)
+
+    def advance(self, seconds):
+        self.sleep(seconds)
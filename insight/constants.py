@@ -2,13 +2,21 @@ BASE_URL_LOCAL = 'http://localhost:8080'
 BASE_URL_STAGING = 'https://w-insight-staging.appspot.com'
 INCOMING_GCP_ERRORS = '/api/v1/hubble/incoming_gcp_errors'
 INCOMING_KINESIS_ERRORS = '/api/v1/hubble/incoming_errors'
+INCOMING_LOGS = '/api/v1/apollo/incoming_logs'
+MAX_BATCH_BYTES = 1048576
 PROCESS_ERRORS_PATH = '/cron/create_tasks_to_process_errors'
-SERVICE_SUFFIX = ['-prod', '-eu', '-demo', '-sandbox', '-wk-dev', '-eu']
+PROCESSED_ERRORS = '/api/v1/hubble/errors'
+PUBSUB_PROJECT = 'w-insight-staging'
+PUBSUB_TOPIC = 'hubble-gcp-errors'
+SERVICE_SUFFIX = ['-prod', '-eu', '-demo', '-sandbox', '-wk-dev']
 TIME_FORMAT_DEFAULT_DATETIME = '%Y-%m-%d %H:%M:%S'
 TIME_FORMAT_GCP_ERROR = '%Y-%m-%dT%H:%M:%S.0000Z'
 TIME_FORMAT_GCP_RAW_ERROR = '%Y-%m-%dT%H:%M:%S.%fZ'
 TIME_FORMAT_KINESIS_ERROR = '%Y/%m/%d %H:%M:%S'
 TIME_FORMAT_KINESIS_RAW_ERROR = '%Y-%m-%dT%H:%M:%S.%fZ'
+TIME_FORMAT_KINESIS_RAW_ERROR_NO_MICRO_SEC = '%Y-%m-%dT%H:%M:%SZ'
 TIME_FORMAT_NO_MICRO_SEC = '%Y-%m-%dT%H:%M:%S.000-00:00'
 DEFAULT_GCP_FILE = 'logs/default_gcp.json'
 DEFAULT_KINESIS_FILE = 'logs/default_kinesis.json'
+CORPUS_DIRECTORY = 'logs'
+CORPUS_INDEX_FILE = 'logs/.corpus_index'
@@ -0,0 +1,217 @@
+import bisect
+import datetime
+import math
+import random
+
+DISTRIBUTIONS = ['uniform', 'diurnal', 'bursty']
+
+# width of the bins the intensity of a distribution is integrated over, in
+# seconds, and the minimum number of bins of a short range
+BIN_WIDTH = 60
+MIN_BINS = 1000
+
+# relative amplitude of the diurnal distribution, which peaks at PEAK_HOUR UTC
+DIURNAL_AMPLITUDE = 0.8
+PEAK_HOUR = 14
+
+# bursts of the bursty distribution, BURST_FACTOR times as intense as the
+# rest of the range for BURST_DURATION seconds, BURSTS_PER_DAY times a day
+BURST_FACTOR = 20.0
+BURST_DURATION = 300
+BURSTS_PER_DAY = 4
+
+SECONDS_PER_DAY = 86400
+
+
+def generate_offsets(count, duration, distribution='uniform', start=None,
+                     random_=None):
+    """
+    Lazily generate the ascending offsets of a number of errors in a range.
+
+    The offsets are drawn in order, see sorted_uniforms, so no more than one
+    offset is held in memory. Offsets of a diurnal or bursty distribution are
+    mapped from uniform ones through the inverse of the cumulative intensity
+    of the distribution.
+
+    :param count: number of offsets
+    :type count: int
+    :param duration: duration of the range in seconds
+    :type duration: float
+    :param distribution: distribution of the offsets over the range:
+        uniform, diurnal, bursty
+    :type distribution: str
+    :param start: start of the range, which the diurnal distribution depends
+        on
+    :type start: datetime.datetime
+    :param random_: random number generator
+    :type random_: random.Random
+    :return: generator of offsets in seconds from the start of the range
+    :rtype: generator
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError('{} is not one of: {}.'.format(
+            distribution, ', '.join(DISTRIBUTIONS)))
+    random_ = random_ or random.Random()
+
+    if distribution == 'uniform':
+        for uniform in sorted_uniforms(count, random_):
+            yield uniform * duration
+        return
+
+    bins = max(int(duration / BIN_WIDTH), MIN_BINS)
+    width = float(duration) / bins
+    intensity = create_intensity(distribution, start, duration, random_)
+    cdf = cumulative_intensity(intensity, width, bins)
+
+    # the uniforms are ascending, so the bin only ever moves forward
+    index = 0
+    for uniform in sorted_uniforms(count, random_):
+        index = bisect.bisect_right(cdf, uniform, index)
+        index = min(index, bins - 1)
+        low = cdf[index - 1] if index else 0.0
+        fraction = (uniform - low) / (cdf[index] - low) \
+            if cdf[index] > low else 0.0
+        yield (index + fraction) * width
+
+
+def sorted_uniforms(count, random_):
+    """
+    Lazily draw a number of uniform values between 0 and 1 in ascending order.
+
+    The largest of n uniform values is distributed as U ** (1 / n), and the
+    rest are uniform below it, so the sorted values are drawn one at a time
+    from the top down (Bentley and Saxe).
+
+    :param count: number of values
+    :type count: int
+    :param random_: random number generator
+    :type random_: random.Random
+    :return: generator of ascending values
+    :rtype: generator
+    """
+    value = 1.0
+    for remaining in xrange(count, 0, -1):
+        value *= random_.random() ** (1.0 / remaining)
+        # 1 - value is ascending, and uniform like value
+        yield 1.0 - value
+
+
+def create_intensity(distribution, start, duration, random_):
+    """
+    Create the relative intensity of errors over a range.
+
+    :param distribution: diurnal, bursty
+    :type distribution: str
+    :param start: start of the range
+    :type start: datetime.datetime
+    :param duration: duration of the range in seconds
+    :type duration: float
+    :param random_: random number generator, which places the bursts
+    :type random_: random.Random
+    :return: function of the offset in seconds returning the intensity
+    :rtype: function
+    """
+    if distribution == 'diurnal':
+        start = start or datetime.datetime(1970, 1, 1)
+        start_seconds = (start.hour * 3600 + start.minute * 60 + start.second)
+        phase = 2 * math.pi / SECONDS_PER_DAY
+
+        def diurnal(offset):
+            seconds = start_seconds + offset - PEAK_HOUR * 3600
+            return 1.0 + DIURNAL_AMPLITUDE * math.cos(phase * seconds)
+        return diurnal
+
+    bursts = max(int(round(duration / SECONDS_PER_DAY * BURSTS_PER_DAY)), 1)
+    starts = sorted(random_.random() * max(duration - BURST_DURATION, 0)
+                    for _ in range(bursts))
+
+    def bursty(offset):
+        index = bisect.bisect_right(starts, offset)
+        if index and offset < starts[index - 1] + BURST_DURATION:
+            return BURST_FACTOR
+        return 1.0
+    return bursty
+
+
+def cumulative_intensity(intensity, width, bins):
+    """
+    Integrate an intensity over bins, normalised to end at 1.
+
+    :param intensity: function of the offset in seconds returning the
+        intensity
+    :type intensity: function
+    :param width: width of a bin in seconds
+    :type width: float
+    :param bins: number of bins
+    :type bins: int
+    :return: cumulative intensity at the end of each bin
+    :rtype: list
+    """
+    totals = []
+    total = 0.0
+    for index in xrange(bins):
+        # intensity at the middle of the bin
+        total += intensity((index + 0.5) * width)
+        totals.append(total)
+    return [t / total for t in totals]
+
+
+def format_times(start, offsets, time_format):
+    """
+    Lazily format the times of ascending offsets from a start.
+
+    Only the part of the format that changes every second is formatted with
+    strftime, once per second; microseconds are formatted as an integer.
+
+    :param start: start of the range
+    :type start: datetime.datetime
+    :param offsets: ascending offsets in seconds, see generate_offsets
+    :type offsets: iterable
+    :param time_format: format of the times, %f may only occur once
+    :type time_format: str
+    :return: generator of formatted times
+    :rtype: generator
+    """
+    head, has_microseconds, tail = time_format.partition('%f')
+    base = start.replace(microsecond=0)
+    last_second = None
+    prefix = suffix = ''
+
+    for offset in offsets:
+        microseconds = int(offset * 1e6) + start.microsecond
+        second, microsecond = divmod(microseconds, 1000000)
+        if second != last_second:
+            time = base + datetime.timedelta(seconds=second)
+            prefix = time.strftime(head)
+            suffix = time.strftime(tail) if has_microseconds else ''
+            last_second = second
+        if has_microseconds:
+            yield '{}{:06d}{}'.format(prefix, microsecond, suffix)
+        else:
+            yield prefix
+
+
+def get_windows(start, end, window):
+    """
+    Split a range into consecutive windows.
+
+    :param start: start of the range
+    :type start: datetime.datetime
+    :param end: end of the range
+    :type end: datetime.datetime
+    :param window: duration of a window in seconds, the last window may be
+        shorter
+    :type window: float
+    :return: (start, end) of each window
+    :rtype: list
+    """
+    if window <= 0:
+        raise ValueError('window must be positive.')
+    windows = []
+    step = datetime.timedelta(seconds=window)
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + step, end)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
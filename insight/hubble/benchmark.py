@@ -0,0 +1,480 @@
+"""
+usage: benchmark.py [-h] [-n NUMBER] [-r REPEAT] [-k FILTER]
+                    [--baseline BASELINE] [--save] [--threshold THRESHOLD]
+
+Benchmark the hot paths of the Hubble simulation.
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -n NUMBER, --number NUMBER
+                        number of operations per benchmark
+  -r REPEAT, --repeat REPEAT
+                        number of times each benchmark is run, the fastest run
+                        is reported
+  -k FILTER, --filter FILTER
+                        only run benchmarks whose name contains FILTER
+  --baseline BASELINE   JSON file of baseline operations per second
+  --save                save the results as the baseline
+  --threshold THRESHOLD
+                        fraction by which a benchmark may be slower than its
+                        baseline
+"""
+
+import argparse
+import copy
+import datetime
+import functools
+import itertools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import (
+    INCOMING_KINESIS_ERRORS, SERVICE_SUFFIX, TIME_FORMAT_GCP_RAW_ERROR,
+    TIME_FORMAT_KINESIS_ERROR)
+
+import simulate_error
+from sender import Sender, compress_payloads
+from stats import write_report
+from stub_server import start_server
+from template import ErrorTemplate
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# fraction by which a benchmark may be slower than its baseline
+THRESHOLD = 0.2
+
+# errors per request and requests in flight of the end-to-end benchmark
+SENDER_BATCH_SIZE = 100
+SENDER_CONCURRENCY = 4
+
+
+def parse_args():
+    # configure command line argument parser
+    parser = argparse.ArgumentParser(
+        description='Benchmark the hot paths of the Hubble simulation.')
+
+    # specify the number of operations per benchmark
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='number of operations per benchmark')
+
+    # specify the number of times each benchmark is run
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of times each benchmark is run, the '
+                             'fastest run is reported')
+
+    # specify the benchmarks to run, defaults to all of them
+    parser.add_argument('-k', '--filter', default='',
+                        help='only run benchmarks whose name contains FILTER')
+
+    # specify the baseline the results are compared with
+    parser.add_argument('--baseline', default=BASELINE_FILE,
+                        help='JSON file of baseline operations per second')
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='fraction by which a benchmark may be slower '
+                             'than its baseline')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+
+    print '{:<32} {:>12} {:>12} {:>8}'.format(
+        'benchmark', 'ops/s', 'baseline', 'change')
+    for name, benchmark in BENCHMARKS:
+        if args.filter not in name:
+            continue
+        results[name] = benchmark(args.number, args.repeat)
+        print format_result(name, results[name], baseline.get(name))
+
+    regressions = find_regressions(results, baseline, args.threshold)
+
+    if args.save:
+        baseline.update(results)
+        write_report(baseline, args.baseline)
+        print 'Saved the baseline to {}.'.format(args.baseline)
+    elif regressions:
+        print 'Error! {} slower than the baseline by more than {:.0%}.'.format(
+            ', '.join(regressions), args.threshold)
+        sys.exit(1)
+
+
+def measure(run, number, repeat=1):
+    """
+    Measure the operations per second of the fastest of a number of runs.
+
+    :param run: function performing a given number of operations
+    :type run: function
+    :param number: number of operations per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: operations per second
+    :rtype: float
+    """
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        run(number)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return number / best if best else float('inf')
+
+
+def bench_populate_default_log(source, number, repeat=1):
+    """
+    Measure the logs per second of populate_default_log.
+
+    :param source: source of the log: gcp, kinesis
+    :type source: str
+    :param number: number of logs per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: logs per second
+    :rtype: float
+    """
+    timestamp = datetime.datetime(2018, 6, 14, 12)
+
+    def run(number):
+        for _ in xrange(number):
+            simulate_error.populate_default_log(source, timestamp, 'service')
+
+    return measure(run, number, repeat)
+
+
+def bench_lambda(source, number, repeat=1):
+    """
+    Measure the logs per second of the scalar Insight lambda,
+    simulate_insight_lambda.
+
+    :param source: source of the log: gcp, kinesis
+    :type source: str
+    :param number: number of logs per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: logs per second
+    :rtype: float
+    """
+    log = create_log(source)
+
+    def run(number):
+        for _ in xrange(number):
+            simulate_error.simulate_insight_lambda(source, log, '', 'prod')
+
+    return measure(run, number, repeat)
+
+
+def bench_lambdas(source, number, repeat=1):
+    """
+    Measure the logs per second of the batch Insight lambda,
+    simulate_insight_lambdas.
+
+    :param source: source of the log: gcp, kinesis
+    :type source: str
+    :param number: number of logs per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: logs per second
+    :rtype: float
+    """
+    log = create_log(source)
+
+    def run(number):
+        for _ in simulate_error.simulate_insight_lambdas(
+                source, itertools.repeat(log, number), '', 'prod'):
+            pass
+
+    return measure(run, number, repeat)
+
+
+def bench_generate_errors(source, number, repeat=1):
+    """
+    Measure the errors per second of synthesising errors by copying,
+    processing and serialising the log for every error, see generate_errors.
+
+    :param source: source of the log: gcp, kinesis
+    :type source: str
+    :param number: number of errors per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: errors per second
+    :rtype: float
+    """
+    log = create_log(source)
+
+    def run(number):
+        for error in simulate_error.generate_errors(
+                source, log, 'service', 'prod', number):
+            simulate_error.encode_error(error)
+
+    return measure(run, number, repeat)
+
+
+def bench_template(source, number, repeat=1):
+    """
+    Measure the errors per second of synthesising errors by rendering a
+    pre-serialised template with a new time and suffix, see ErrorTemplate.
+
+    :param source: source of the log: gcp, kinesis
+    :type source: str
+    :param number: number of errors per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: errors per second
+    :rtype: float
+    """
+    timestamp = datetime.datetime(2018, 6, 14, 12)
+    if source == 'gcp':
+        formatted = timestamp.strftime(TIME_FORMAT_GCP_RAW_ERROR)
+    else:
+        formatted = timestamp.strftime(TIME_FORMAT_KINESIS_ERROR)
+    template = ErrorTemplate(source, simulate_error.simulate_insight_lambda(
+        source, create_log(source), 'service', 'prod'))
+
+    def run(number):
+        for _ in xrange(number):
+            template.encode(formatted, '-0123456')
+
+    return measure(run, number, repeat)
+
+
+def bench_encode_error(number, repeat=1):
+    """
+    Measure the errors per second of encode_error.
+
+    :param number: number of errors per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: errors per second
+    :rtype: float
+    """
+    error = simulate_error.simulate_insight_lambda(
+        'kinesis', create_log('kinesis'), 'service', 'prod')
+
+    def run(number):
+        for _ in xrange(number):
+            simulate_error.encode_error(error)
+
+    return measure(run, number, repeat)
+
+
+def bench_create_batches(number, repeat=1):
+    """
+    Measure the errors per second of batching encoded errors into request
+    bodies, see create_batches.
+
+    :param number: number of errors per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: errors per second
+    :rtype: float
+    """
+    error = simulate_error.simulate_insight_lambda(
+        'kinesis', create_log('kinesis'), 'service', 'prod')
+    encoded = simulate_error.encode_error(error)
+
+    def run(number):
+        for batch in simulate_error.create_batches(
+                itertools.repeat(encoded, number), SENDER_BATCH_SIZE):
+            json.dumps({'data': batch})
+
+    return measure(run, number, repeat)
+
+
+def bench_compress(encoding, number, repeat=1):
+    """
+    Measure the errors per second of compressing batched request bodies, see
+    compress_payloads.
+
+    :param encoding: content encoding of the request bodies: gzip, deflate
+    :type encoding: str
+    :param number: number of errors per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: errors per second
+    :rtype: float
+    """
+    error = simulate_error.simulate_insight_lambda(
+        'kinesis', create_log('kinesis'), 'service', 'prod')
+    batch = [simulate_error.encode_error(error)] * SENDER_BATCH_SIZE
+    body = json.dumps({'data': batch})
+
+    def run(number):
+        payloads = itertools.repeat(
+            (body, SENDER_BATCH_SIZE), number // SENDER_BATCH_SIZE or 1)
+        for _ in compress_payloads(payloads, encoding):
+            pass
+
+    return measure(run, number, repeat)
+
+
+def bench_get_service_env(number, repeat=1):
+    """
+    Measure the services per second of get_service_env.
+
+    :param number: number of services per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: services per second
+    :rtype: float
+    """
+    services = ['service{}'.format(suffix) for suffix in SERVICE_SUFFIX]
+    services.append('service')
+
+    def run(number):
+        for service in itertools.islice(itertools.cycle(services), number):
+            simulate_error.get_service_env(service)
+
+    return measure(run, number, repeat)
+
+
+def bench_sender(number, repeat=1):
+    """
+    Measure the errors per second sent end-to-end to a local stub server,
+    see stub_server.
+
+    :param number: number of errors per run
+    :type number: int
+    :param repeat: number of runs
+    :type repeat: int
+    :return: errors per second
+    :rtype: float
+    """
+    error = simulate_error.simulate_insight_lambda(
+        'kinesis', create_log('kinesis'), 'service', 'prod')
+    encoded = simulate_error.encode_error(error)
+    server = start_server()
+    url = 'http://localhost:{}{}'.format(
+        server.server_address[1], INCOMING_KINESIS_ERRORS)
+    headers = {
+        'Content-Type': 'application/json'
+    }
+
+    def run(number):
+        payloads = ((json.dumps({'data': batch}), len(batch))
+                    for batch in simulate_error.create_batches(
+                        itertools.repeat(encoded, number), SENDER_BATCH_SIZE))
+        sender = Sender(url, SENDER_CONCURRENCY, headers)
+        if not sender.send(payloads):
+            raise RuntimeError('Sending to the stub server failed: {}'.format(
+                sender.status_code or sender.exception))
+
+    try:
+        return measure(run, number, repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+BENCHMARKS = [
+    ('populate_default_log_gcp',
+     functools.partial(bench_populate_default_log, 'gcp')),
+    ('populate_default_log_kinesis',
+     functools.partial(bench_populate_default_log, 'kinesis')),
+    ('lambda_gcp', functools.partial(bench_lambda, 'gcp')),
+    ('lambda_kinesis', functools.partial(bench_lambda, 'kinesis')),
+    ('lambdas_gcp', functools.partial(bench_lambdas, 'gcp')),
+    ('lambdas_kinesis', functools.partial(bench_lambdas, 'kinesis')),
+    ('generate_errors_gcp', functools.partial(bench_generate_errors, 'gcp')),
+    ('generate_errors_kinesis',
+     functools.partial(bench_generate_errors, 'kinesis')),
+    ('template_gcp', functools.partial(bench_template, 'gcp')),
+    ('template_kinesis', functools.partial(bench_template, 'kinesis')),
+    ('encode_error', bench_encode_error),
+    ('create_batches', bench_create_batches),
+    ('compress_gzip', functools.partial(bench_compress, 'gzip')),
+    ('compress_deflate', functools.partial(bench_compress, 'deflate')),
+    ('get_service_env', bench_get_service_env),
+    ('sender', bench_sender)
+]
+
+
+def create_log(source):
+    """
+    Create the default log of a source, at a fixed time.
+
+    :param source: source of the log: gcp, kinesis
+    :type source: str
+    :return: log
+    :rtype: dict
+    """
+    timestamp = datetime.datetime(2018, 6, 14, 12)
+    return copy.deepcopy(
+        simulate_error.populate_default_log(source, timestamp, 'service'))
+
+
+def load_baseline(filename):
+    """
+    Load the baseline operations per second of each benchmark.
+
+    :param filename: name of the JSON file
+    :type filename: str
+    :return: operations per second by benchmark, empty if the file does not
+        exist
+    :rtype: dict
+    """
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def find_regressions(results, baseline, threshold=THRESHOLD):
+    """
+    Return the benchmarks that are slower than their baseline by more than a
+    threshold.
+
+    :param results: operations per second by benchmark
+    :type results: dict
+    :param baseline: baseline operations per second by benchmark
+    :type baseline: dict
+    :param threshold: fraction by which a benchmark may be slower
+    :type threshold: float
+    :return: names of the benchmarks that regressed
+    :rtype: list
+    """
+    return sorted(name for name, result in results.iteritems()
+                  if baseline.get(name) and
+                  result < baseline[name] * (1 - threshold))
+
+
+def format_result(name, result, baseline=None):
+    """
+    Format the result of a benchmark as a row of the results table.
+
+    :param name: name of the benchmark
+    :type name: str
+    :param result: operations per second
+    :type result: float
+    :param baseline: baseline operations per second
+    :type baseline: float
+    :return: row of the results table
+    :rtype: str
+    """
+    if not baseline:
+        return '{:<32} {:>12.0f} {:>12} {:>8}'.format(name, result, '-', '-')
+    return '{:<32} {:>12.0f} {:>12.0f} {:>+7.1%}'.format(
+        name, result, baseline, result / baseline - 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+usage: corpus.py [-h] [-d DIRECTORY] [--index INDEX] [-s {gcp,kinesis}]
+
+List the logs of the corpus and what they contain.
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -d DIRECTORY, --directory DIRECTORY
+                        directory of the corpus
+  --index INDEX         file the index of the corpus is cached in
+  -s {gcp,kinesis}, --source {gcp,kinesis}
+                        only list logs from this source
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import marshal
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import CORPUS_DIRECTORY, CORPUS_INDEX_FILE
+from workload import cumulative, draw
+
+# version of the format of the cached index, a cache of another version is
+# rebuilt
+INDEX_VERSION = 1
+
+# name of the service of logs sent by App Intelligence, whose service is
+# metadata:app_name instead
+FRONTEND_SERVICE = 'app-int-collection-gateway'
+
+
+def parse_args():
+    # configure command line argument parser
+    parser = argparse.ArgumentParser(
+        description='List the logs of the corpus and what they contain.')
+
+    # specify the directory of the corpus
+    parser.add_argument('-d', '--directory', default=CORPUS_DIRECTORY,
+                        help='directory of the corpus')
+
+    # specify the file the index is cached in
+    parser.add_argument('--index', default=CORPUS_INDEX_FILE,
+                        help='file the index of the corpus is cached in')
+
+    # specify the source of the logs listed, defaults to every source
+    parser.add_argument('-s', '--source', choices=['gcp', 'kinesis'],
+                        default=None,
+                        help='only list logs from this source')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    index = load_index(args.directory, args.index)
+
+    print '{:<20} {:<8} {:<32} {:>8}  {}'.format(
+        'name', 'source', 'service', 'bytes', 'error type')
+    for name, entry in sorted(index.iteritems()):
+        if args.source and entry['source'] != args.source:
+            continue
+        print u'{:<20} {:<8} {:<32} {:>8}  {}'.format(
+            name, entry['source'], entry['service'] or '-', entry['size'],
+            entry['error_type'][:60] or '-').encode('utf-8')
+
+
+def load_index(directory, cache_file=None):
+    """
+    Load the index of the logs of a corpus, rebuilding it where it is stale.
+
+    Only logs whose modification time or size changed since the index was
+    cached, and logs that are new, are parsed. The index is cached with
+    marshal, which loads far faster than the JSON of the logs, and is only
+    written if it changed.
+
+    :param directory: directory of the corpus, every *.json file is a log
+    :type directory: str
+    :param cache_file: file the index is cached in, defaults to no cache
+    :type cache_file: str
+    :return: entries of the logs by name, see describe_log
+    :rtype: dict
+    """
+    cached = read_index(cache_file) if cache_file else {}
+    index = {}
+    changed = False
+    for filename in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        stat = os.stat(filename)
+        entry = cached.get(name)
+        if entry is None or entry['mtime'] != stat.st_mtime or \
+                entry['size'] != stat.st_size:
+            entry = describe_log(name, open_log(filename))
+            entry['mtime'] = stat.st_mtime
+            entry['size'] = stat.st_size
+            changed = True
+        index[name] = entry
+    # logs that were removed are dropped
+    changed = changed or len(index) != len(cached)
+    if cache_file and changed:
+        write_index(index, cache_file)
+    return index
+
+
+def read_index(cache_file):
+    """
+    Read a cached index.
+
+    :param cache_file: file the index is cached in
+    :type cache_file: str
+    :return: entries of the logs by name, empty if the cache does not exist,
+        is corrupt or of another version
+    :rtype: dict
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        return {}
+    if not isinstance(cached, dict) or \
+            cached.get('version') != INDEX_VERSION:
+        return {}
+    return cached['entries']
+
+
+def write_index(index, cache_file):
+    """
+    Cache an index.
+
+    The index is written to a temporary file that is then renamed, so that
+    concurrent runs never read a partially written cache.
+
+    :param index: entries of the logs by name
+    :type index: dict
+    :param cache_file: file the index is cached in
+    :type cache_file: str
+    :return: None
+    :rtype: None
+    """
+    temporary = '{}.{}.tmp'.format(cache_file, os.getpid())
+    with open(temporary, 'wb') as f:
+        marshal.dump({'version': INDEX_VERSION, 'entries': index}, f)
+    os.rename(temporary, cache_file)
+
+
+def open_log(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except ValueError:
+        raise ValueError('{} is not valid JSON.'.format(filename))
+
+
+def describe_log(name, log):
+    """
+    Describe a raw GCP or Kinesis error log.
+
+    :param name: name of the log, its file name without extension
+    :type name: str
+    :param log: raw error log
+    :type log: dict
+    :return: name, source, service, error type and the log itself
+    :rtype: dict
+    """
+    if 'appId' in log:
+        source = 'gcp'
+        service = log['appId'].replace('s~', '', 1)
+        stack = log.get('stack') or ''
+        error_type = log.get('_hubbleErrorType') or \
+            (stack.splitlines()[0] if stack else '')
+    else:
+        source = 'kinesis'
+        service = (log.get('service') or {}).get('name', '')
+        metadata = log.get('metadata') or {}
+        if service == FRONTEND_SERVICE:
+            service = metadata.get('app_name', '')
+        error_type = metadata.get('_hubbleErrorType') or \
+            (log.get('exception') or {}).get('type', '')
+    return {
+        'name': name,
+        'source': source,
+        'service': service,
+        'error_type': error_type,
+        'log': log
+    }
+
+
+def select_entries(index, source, weights=None):
+    """
+    Select the logs of a source, and their weights.
+
+    :param index: entries of the logs by name, see load_index
+    :type index: dict
+    :param source: gcp, kinesis
+    :type source: str
+    :param weights: (name, weight) of the logs to select, defaults to every
+        log of the source weighted equally
+    :type weights: list
+    :return: (entry, weight) of the selected logs
+    :rtype: list
+    """
+    if not weights:
+        weights = [(name, 1.0) for name in sorted(index)
+                   if index[name]['source'] == source]
+    selected = []
+    for name, weight in weights:
+        if name not in index:
+            raise ValueError('{} is not in the corpus.'.format(name))
+        if index[name]['source'] != source:
+            raise ValueError('{} is not a {} log.'.format(name, source))
+        selected.append((index[name], weight))
+    if not selected:
+        raise ValueError('The corpus has no {} logs.'.format(source))
+    return selected
+
+
+def parse_weights(value):
+    """
+    Parse a comma-separated list of log names, each optionally followed by
+    =WEIGHT.
+
+    :param value: e.g. IN-2725=5,IN-3295
+    :type value: str
+    :return: (name, weight) of each log, weights default to 1
+    :rtype: list
+    """
+    weights = []
+    for item in value.split(','):
+        name, _, weight = item.strip().partition('=')
+        weights.append((name, float(weight) if weight else 1.0))
+    return weights
+
+
+class CorpusMix(object):
+    """
+    Weighted mix of the logs of a corpus.
+    """
+
+    def __init__(self, entries, random_seed=None):
+        """
+        :param entries: (entry, weight) of the logs, see select_entries
+        :type entries: list
+        :param random_seed: seed of the draws
+        :type random_seed: str
+        """
+        self.entries = [entry for entry, _ in entries]
+        self._weights = cumulative(weight for _, weight in entries)
+        self._random = random.Random(random_seed)
+
+    def sample(self):
+        """
+        Draw the log of an error.
+
+        :return: entry of the log, see describe_log
+        :rtype: dict
+        """
+        return self.entries[draw(self._random, self._weights)]
+
+    def samples(self, count=None):
+        """
+        Draw the logs of a number of errors.
+
+        :param count: number of errors, None for an unbounded number
+        :type count: int
+        :return: generator of entries
+        :rtype: generator
+        """
+        draws = itertools.count() if count is None else xrange(count)
+        for _ in draws:
+            yield self.sample()
+
+    def skip(self, count):
+        """
+        Skip the draws of a number of errors, e.g. the errors a soak test
+        sent before it was resumed, so that the draws continue where they
+        stopped.
+
+        :param count: number of errors
+        :type count: int
+        :return: None
+        :rtype: None
+        """
+        for _ in xrange(count):
+            self.sample()
+
+
+if __name__ == '__main__':
+    main()
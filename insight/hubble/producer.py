@@ -0,0 +1,414 @@
+import Queue
+import collections
+import hashlib
+import threading
+
+# prefix of a record aggregated by the Kinesis Producer Library (KPL)
+KPL_MAGIC = '\xf3\x89\x9a\xc2'
+
+# size of the md5 digest of the protobuf of an aggregated record
+DIGEST_BYTES = 16
+
+# default maximum size of an aggregated record, the KPL's AggregationMaxSize
+MAX_RECORD_BYTES = 51200
+
+# partition keys of logs: a random key per log, the project of the log, or a
+# single key for every log
+PARTITION_KEYS = ['random', 'project', 'fixed']
+
+# partition key of every log with the fixed partition key
+FIXED_PARTITION_KEY = 'hubble'
+
+# tags of the fields of the AggregatedRecord and Record protobufs, see
+# aggregation-format.md of awslabs/amazon-kinesis-producer
+PARTITION_KEY_TABLE_TAG = '\x0a'
+RECORDS_TAG = '\x1a'
+PARTITION_KEY_INDEX_TAG = '\x08'
+DATA_TAG = '\x1a'
+
+# record put to a shard: the partition key of its first log, its data and
+# the number of logs it contains
+Record = collections.namedtuple('Record', ['partition_key', 'data', 'logs'])
+
+
+def get_shard(partition_key, shards):
+    """
+    Return the shard of a partition key, as Kinesis does.
+
+    The md5 hash of the partition key, a 128 bit integer, is mapped to one
+    of shards evenly split ranges of hash keys.
+
+    :param partition_key: partition key
+    :type partition_key: str
+    :param shards: number of shards
+    :type shards: int
+    :return: index of the shard
+    :rtype: int
+    """
+    return int(hashlib.md5(partition_key).hexdigest(), 16) * shards >> 128
+
+
+def encode_varint(value):
+    encoded = []
+    while value > 0x7f:
+        encoded.append(chr(value & 0x7f | 0x80))
+        value >>= 7
+    encoded.append(chr(value))
+    return ''.join(encoded)
+
+
+def decode_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError('Truncated varint.')
+        byte = ord(data[offset])
+        value |= (byte & 0x7f) << shift
+        offset += 1
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_bytes(tag, value):
+    return tag + encode_varint(len(value)) + value
+
+
+def varint_size(value):
+    return len(encode_varint(value))
+
+
+def bytes_size(value_size):
+    return 1 + varint_size(value_size) + value_size
+
+
+def iter_fields(data):
+    """
+    Iterate the fields of a protobuf message.
+
+    Only the varint and length-delimited wire types used by the aggregation
+    format are supported.
+
+    :param data: protobuf message
+    :type data: str
+    :return: generator of (field number, value)
+    :rtype: generator
+    """
+    offset = 0
+    while offset < len(data):
+        tag, offset = decode_varint(data, offset)
+        number, wire_type = tag >> 3, tag & 0x7
+        if wire_type == 0:
+            value, offset = decode_varint(data, offset)
+        elif wire_type == 2:
+            size, offset = decode_varint(data, offset)
+            value = data[offset:offset + size]
+            if len(value) != size:
+                raise ValueError('Truncated field {}.'.format(number))
+            offset += size
+        else:
+            raise ValueError('Unsupported wire type {}.'.format(wire_type))
+        yield number, value
+
+
+def deaggregate(data):
+    """
+    Split a record into the logs it contains, as the KPL deaggregation
+    library does in a lambda.
+
+    A record that does not start with KPL_MAGIC, or whose digest does not
+    match, is a single log.
+
+    :param data: data of the record
+    :type data: str
+    :return: (partition key, data) of each log, the partition key of a
+        record that is not aggregated is None
+    :rtype: list
+    """
+    body = data[len(KPL_MAGIC):-DIGEST_BYTES]
+    if not data.startswith(KPL_MAGIC) or \
+            len(data) < len(KPL_MAGIC) + DIGEST_BYTES or \
+            hashlib.md5(body).digest() != data[-DIGEST_BYTES:]:
+        return [(None, data)]
+
+    keys = []
+    logs = []
+    for number, value in iter_fields(body):
+        if number == 1:
+            keys.append(value)
+        elif number == 3:
+            fields = dict(iter_fields(value))
+            logs.append((keys[fields.get(1, 0)], fields[3]))
+    return logs
+
+
+class Aggregator(object):
+    """
+    Aggregate the logs of a shard into records of up to max_bytes, in the
+    aggregation format of the KPL.
+
+    The size of a record is tracked as logs are added, so that a record is
+    only encoded once it is complete. A record with a single log is put as
+    the log itself, as the KPL does, which is also how a log larger than
+    max_bytes is put.
+    """
+
+    def __init__(self, max_bytes=MAX_RECORD_BYTES):
+        """
+        :param max_bytes: maximum size of an aggregated record in bytes
+        :type max_bytes: int
+        """
+        self.max_bytes = max_bytes
+        self._reset()
+
+    def _reset(self):
+        self._keys = {}
+        self._key_table = []
+        self._logs = []
+        self._size = len(KPL_MAGIC) + DIGEST_BYTES
+
+    def _log_size(self, partition_key, data):
+        index = self._keys.get(partition_key)
+        size = 0
+        if index is None:
+            index = len(self._key_table)
+            size += bytes_size(len(partition_key))
+        inner = 1 + varint_size(index) + bytes_size(len(data))
+        return size + bytes_size(inner)
+
+    def add(self, partition_key, data):
+        """
+        Add a log.
+
+        :param partition_key: partition key of the log
+        :type partition_key: str
+        :param data: data of the log
+        :type data: str
+        :return: the record completed by the log, None if the log fits in
+            the current record
+        :rtype: Record
+        """
+        completed = None
+        if self._logs and self._size + self._log_size(
+                partition_key, data) > self.max_bytes:
+            completed = self.flush()
+        size = self._log_size(partition_key, data)
+        index = self._keys.get(partition_key)
+        if index is None:
+            index = self._keys[partition_key] = len(self._key_table)
+            self._key_table.append(partition_key)
+        self._logs.append((index, data))
+        self._size += size
+        return completed
+
+    def flush(self):
+        """
+        Complete the current record.
+
+        :return: the record, None if no log was added since the last one
+        :rtype: Record
+        """
+        if not self._logs:
+            return None
+        if len(self._logs) == 1:
+            record = Record(self._key_table[0], self._logs[0][1], 1)
+        else:
+            parts = [encode_bytes(PARTITION_KEY_TABLE_TAG, key)
+                     for key in self._key_table]
+            for index, data in self._logs:
+                parts.append(encode_bytes(
+                    RECORDS_TAG,
+                    PARTITION_KEY_INDEX_TAG + encode_varint(index) +
+                    encode_bytes(DATA_TAG, data)))
+            body = ''.join(parts)
+            record = Record(
+                self._key_table[0],
+                KPL_MAGIC + body + hashlib.md5(body).digest(),
+                len(self._logs))
+        self._reset()
+        return record
+
+
+class ShardedProducer(object):
+    """
+    Put logs to simulated shards, aggregating the logs of each shard.
+
+    The logs, records and bytes put to each shard are counted, see
+    shard_counts and skew.
+    """
+
+    def __init__(self, shards, max_bytes=MAX_RECORD_BYTES):
+        """
+        :param shards: number of shards
+        :type shards: int
+        :param max_bytes: maximum size of an aggregated record in bytes
+        :type max_bytes: int
+        """
+        self.shards = shards
+        self.aggregators = [Aggregator(max_bytes) for _ in range(shards)]
+        self.shard_counts = [{'logs': 0, 'records': 0, 'bytes': 0}
+                             for _ in range(shards)]
+
+    def put(self, partition_key, data):
+        """
+        Put a log.
+
+        :param partition_key: partition key of the log
+        :type partition_key: str
+        :param data: data of the log
+        :type data: str
+        :return: (shard, record) of the record completed by the log, None if
+            no record was completed
+        :rtype: tuple
+        """
+        shard = get_shard(partition_key, self.shards)
+        self.shard_counts[shard]['logs'] += 1
+        record = self.aggregators[shard].add(partition_key, data)
+        if record is None:
+            return None
+        self._count(shard, record)
+        return shard, record
+
+    def flush(self):
+        """
+        Complete the current record of every shard.
+
+        :return: generator of (shard, record)
+        :rtype: generator
+        """
+        for shard, aggregator in enumerate(self.aggregators):
+            record = aggregator.flush()
+            if record is not None:
+                self._count(shard, record)
+                yield shard, record
+
+    def _count(self, shard, record):
+        counts = self.shard_counts[shard]
+        counts['records'] += 1
+        counts['bytes'] += len(record.data)
+
+    def skew(self):
+        """
+        Return the skew of the logs put to the shards.
+
+        :return: logs of the hottest shard divided by the mean logs per
+            shard, 1 if logs are spread evenly
+        :rtype: float
+        """
+        logs = [counts['logs'] for counts in self.shard_counts]
+        if not sum(logs):
+            return 0.0
+        return max(logs) / (float(sum(logs)) / len(logs))
+
+
+def produce(producer, logs, queues):
+    """
+    Put logs to the shards of a producer, and each completed record on the
+    queue of its shard. A None is put on every queue once every log is put.
+
+    A shard whose consumer falls behind fills its queue and blocks the
+    producer, as the KPL blocks once its buffer is full.
+
+    :param producer: producer
+    :type producer: ShardedProducer
+    :param logs: iterable of (partition key, data)
+    :type logs: iterable
+    :param queues: queue of each shard
+    :type queues: list
+    :return: None
+    :rtype: None
+    """
+    try:
+        for partition_key, data in logs:
+            completed = producer.put(partition_key, data)
+            if completed:
+                shard, record = completed
+                queues[shard].put(record)
+        for shard, record in producer.flush():
+            queues[shard].put(record)
+    finally:
+        for queue in queues:
+            queue.put(None)
+
+
+def invocations(queue, records_per_invocation):
+    """
+    Read the records of a shard in invocations, as the event source of a
+    lambda does.
+
+    An invocation contains the records waiting on the queue, up to
+    records_per_invocation.
+
+    :param queue: queue of the records of the shard, ended by None
+    :type queue: Queue.Queue
+    :param records_per_invocation: maximum number of records per invocation
+    :type records_per_invocation: int
+    :return: generator of lists of records
+    :rtype: generator
+    """
+    while True:
+        record = queue.get()
+        if record is None:
+            return
+        batch = [record]
+        while len(batch) < records_per_invocation:
+            try:
+                record = queue.get_nowait()
+            except Queue.Empty:
+                break
+            if record is None:
+                yield batch
+                return
+            batch.append(record)
+        yield batch
+
+
+def deliver(producer, logs, senders, payloads, records_per_invocation=100,
+            queue_size=100):
+    """
+    Put logs to the shards of a producer, and deliver the records of each
+    shard with its own sender, at the same time.
+
+    Each shard is consumed by a single sender, as a lambda processes the
+    records of a shard in order, so that a hot shard delivers its logs
+    alone after the other shards are done.
+
+    :param producer: producer
+    :type producer: ShardedProducer
+    :param logs: iterable of (partition key, data)
+    :type logs: iterable
+    :param senders: sender of each shard
+    :type senders: list
+    :param payloads: function of the invocations of a shard, see
+        invocations, returning the payloads of its sender
+    :type payloads: function
+    :param records_per_invocation: maximum number of records per invocation
+    :type records_per_invocation: int
+    :param queue_size: maximum number of records waiting per shard
+    :type queue_size: int
+    :return: None
+    :rtype: None
+    """
+    queues = [Queue.Queue(maxsize=queue_size) for _ in senders]
+
+    def consume(queue, sender):
+        batches = invocations(queue, records_per_invocation)
+        try:
+            sender.send(payloads(batches))
+        finally:
+            # a sender that failed leaves the rest of its records, which
+            # must not block the producer
+            for _ in batches:
+                pass
+
+    threads = [threading.Thread(target=consume, args=(queue, sender))
+               for queue, sender in zip(queues, senders)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        produce(producer, logs, queues)
+    finally:
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,170 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+# environment variable the Pub/Sub client reads the host of the local
+# emulator from, e.g. localhost:8085
+EMULATOR_HOST = 'PUBSUB_EMULATOR_HOST'
+
+# default maximum seconds a message waits for its batch
+MAX_BATCH_LATENCY = 0.05
+
+# status recorded for a message that was published
+PUBLISHED = 'published'
+
+
+def import_pubsub():
+    """
+    Import the Pub/Sub client, which is only needed to publish to Pub/Sub.
+
+    :return: google.cloud.pubsub_v1
+    :rtype: module
+    """
+    try:
+        from google.cloud import pubsub_v1
+    except ImportError:
+        raise ImportError(
+            'Publishing to Pub/Sub requires google-cloud-pubsub, see '
+            'requirements.txt.')
+    return pubsub_v1
+
+
+def create_publisher(max_messages, max_bytes, max_latency):
+    """
+    Create a Pub/Sub publisher batching messages.
+
+    A batch is published once it contains max_messages messages or
+    max_bytes bytes, or max_latency seconds after its first message. If
+    PUBSUB_EMULATOR_HOST is set, the publisher publishes to the emulator.
+
+    :param max_messages: maximum number of messages per batch
+    :type max_messages: int
+    :param max_bytes: maximum size of a batch in bytes
+    :type max_bytes: int
+    :param max_latency: maximum seconds a message waits for its batch
+    :type max_latency: float
+    :return: publisher
+    :rtype: google.cloud.pubsub_v1.PublisherClient
+    """
+    pubsub_v1 = import_pubsub()
+    return pubsub_v1.PublisherClient(pubsub_v1.types.BatchSettings(
+        max_bytes=max_bytes, max_latency=max_latency,
+        max_messages=max_messages))
+
+
+def ensure_topic(publisher, topic_path):
+    """
+    Create a topic on the emulator, which starts without any topics.
+
+    Topics of a real project are never created, they are expected to exist.
+
+    :param publisher: publisher
+    :type publisher: google.cloud.pubsub_v1.PublisherClient
+    :param topic_path: projects/<project>/topics/<topic>
+    :type topic_path: str
+    :return: None
+    :rtype: None
+    """
+    if not os.environ.get(EMULATOR_HOST):
+        return
+    from google.api_core import exceptions
+    try:
+        publisher.create_topic(topic_path)
+    except exceptions.AlreadyExists:
+        pass
+
+
+def generate_messages(log, count=None):
+    """
+    Lazily generate the messages of a raw log, serialised once.
+
+    :param log: raw log
+    :type log: dict
+    :param count: number of messages, None for an unbounded number of
+        messages
+    :type count: int
+    :return: generator of (data, 1)
+    :rtype: generator
+    """
+    data = json.dumps(log)
+    draws = itertools.count() if count is None else xrange(count)
+    for _ in draws:
+        yield data, 1
+
+
+def publish_messages(publisher, topic_path, messages, max_outstanding=1000,
+                     stats=None):
+    """
+    Publish messages and wait until every message is published.
+
+    The publisher batches messages in the background, see create_publisher.
+    At most max_outstanding messages are waiting to be published at any
+    time, so that a fast generator of messages does not fill memory.
+
+    The latency of a message is the time from publishing it until the
+    publisher confirms it was published, which includes the time it waited
+    for its batch. Published messages are recorded in stats with status
+    published, failed ones with the name of the exception. Publishing stops
+    at the first failure.
+
+    :param publisher: publisher
+    :type publisher: google.cloud.pubsub_v1.PublisherClient
+    :param topic_path: projects/<project>/topics/<topic>
+    :type topic_path: str
+    :param messages: iterable of (data, number of records in the data)
+    :type messages: iterable
+    :param max_outstanding: maximum number of messages waiting to be
+        published
+    :type max_outstanding: int
+    :param stats: statistics the messages are recorded in
+    :type stats: RunStats
+    :return: exception of the first message that failed, None if every
+        message was published
+    :rtype: Exception
+    """
+    semaphore = threading.BoundedSemaphore(max_outstanding)
+    failures = []
+
+    def publish(data, count):
+        start = time.time()
+
+        def done(future):
+            latency = time.time() - start
+            try:
+                exception = future.exception()
+                if exception is not None:
+                    failures.append(exception)
+                    status, records = exception.__class__.__name__, 0
+                else:
+                    status, records = PUBLISHED, count
+                if stats:
+                    stats.record(latency, status, len(data), records)
+            finally:
+                semaphore.release()
+
+        try:
+            future = publisher.publish(topic_path, data)
+        except Exception:
+            semaphore.release()
+            raise
+        future.add_done_callback(done)
+
+    if stats:
+        stats.start()
+    try:
+        for data, count in messages:
+            semaphore.acquire()
+            if failures:
+                semaphore.release()
+                break
+            publish(data, count)
+    finally:
+        # wait for the outstanding messages
+        for _ in range(max_outstanding):
+            semaphore.acquire()
+        if stats:
+            stats.stop()
+
+    return failures[0] if failures else None
@@ -0,0 +1,108 @@
+import gzip
+import json
+import mmap
+import os
+import time
+
+from timestamps import parse_raw_timestamp
+
+
+def read_ndjson(filename):
+    """
+    Lazily read the logs of a NDJSON file, one JSON log per line.
+
+    Plain files are memory-mapped, so only the line being parsed is held in
+    memory. Files ending in .gz are decompressed while they are read.
+
+    :param filename: name of the NDJSON file, optionally gzipped
+    :type filename: str
+    :return: generator of logs
+    :rtype: generator
+    """
+    if filename.endswith('.gz'):
+        with gzip.open(filename) as f:
+            for log in _parse_lines(filename, f):
+                yield log
+        return
+
+    try:
+        f = open(filename, 'rb')
+    except IOError:
+        raise IOError('{} does not exist.'.format(filename))
+
+    with f:
+        if not os.fstat(f.fileno()).st_size:
+            # empty files cannot be memory-mapped
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for log in _parse_lines(filename, iter(mapped.readline, '')):
+                yield log
+        finally:
+            mapped.close()
+
+
+def _parse_lines(filename, lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise ValueError('{}:{} is not valid JSON.'.format(
+                filename, number))
+
+
+def get_log_time(source, log):
+    """
+    Return the time of a raw GCP or Kinesis log.
+
+    The time is endTime for GCP and timestamp for Kinesis, see
+    parse_raw_timestamp.
+
+    :param source: source from which the log is sent:
+        gcp, kinesis
+    :type source: str
+    :param log: raw log
+    :type log: dict
+    :return: time of the log
+    :rtype: datetime.datetime
+    """
+    if source == 'gcp':
+        return parse_raw_timestamp(log['endTime'])
+    return parse_raw_timestamp(log['timestamp'])
+
+
+def replay_logs(source, logs, speed=1.0):
+    """
+    Yield logs with the time between them in the original logs.
+
+    The time between two logs is divided by speed, i.e. a speed of 10
+    replays the logs ten times as fast. A speed of 0 yields the logs without
+    waiting. Logs that are older than a log before them are yielded without
+    waiting.
+
+    :param source: source from which the logs are sent:
+        gcp, kinesis
+    :type source: str
+    :param logs: iterable of raw logs, ordered by time
+    :type logs: iterable
+    :param speed: factor by which the time between logs is compressed
+    :type speed: float
+    :return: generator of raw logs
+    :rtype: generator
+    """
+    first_time = None
+    started = None
+
+    for log in logs:
+        if speed:
+            log_time = get_log_time(source, log)
+            if first_time is None:
+                first_time = log_time
+                started = time.time()
+            offset = (log_time - first_time).total_seconds() / speed
+            wait = started + offset - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        yield log
@@ -1,6 +1,40 @@
 """
-usage: simulate_error.py [-h] [-s] [-n | -r] [-t TIME] [-c COUNT] [-f FILE]
-                         [-p PROJECT]
+usage: simulate_error.py [-h] [-s] [-n | -r]
+                         [--resurface-after RESURFACE_AFTER] [-t TIME]
+                         [--virtual-clock START] [--ticks TICKS] [--tick TICK]
+                         [-c COUNT] [-b BATCH_SIZE]
+                         [--max-batch-bytes MAX_BATCH_BYTES]
+                         [--content-encoding {gzip,deflate}]
+                         [--compression-level {1-9}]
+                         [--transport {http,pubsub,kinesis}] [--topic TOPIC]
+                         [--pubsub-project PUBSUB_PROJECT]
+                         [--max-batch-latency MAX_BATCH_LATENCY]
+                         [--shards SHARDS]
+                         [--partition-key {random,project,fixed}]
+                         [--max-record-bytes MAX_RECORD_BYTES]
+                         [--records-per-invocation RECORDS_PER_INVOCATION]
+                         [--concurrency CONCURRENCY] [--rate RATE]
+                         [--duration DURATION]
+                         [--profile {constant,ramp,step,spike}]
+                         [--steps STEPS] [--spike-factor SPIKE_FACTOR]
+                         [--retries RETRIES] [--backoff BACKOFF]
+                         [--max-backoff MAX_BACKOFF] [--adaptive]
+                         [--max-error-rate MAX_ERROR_RATE]
+                         [--max-latency MAX_LATENCY] [--replay REPLAY]
+                         [--speed SPEED] [--start START] [--end END]
+                         [--distribution {uniform,diurnal,bursty}]
+                         [--process-window PROCESS_WINDOW] [--sweep]
+                         [--sweep-sources SWEEP_SOURCES] [--probes PROBES]
+                         [--poll-timeout POLL_TIMEOUT]
+                         [--poll-interval POLL_INTERVAL]
+                         [--processed-errors-path PROCESSED_ERRORS_PATH]
+                         [--fingerprints FINGERPRINTS] [--skew SKEW]
+                         [--new-fraction NEW_FRACTION] [--services SERVICES]
+                         [--envs ENVS] [-w WORKERS] [--seed SEED]
+                         [--report REPORT] [--soak CHECKPOINT]
+                         [--checkpoint-interval CHECKPOINT_INTERVAL]
+                         [--resume] [-f FILE] [--corpus]
+                         [--corpus-logs CORPUS_LOGS] [-p PROJECT]
                          {gcp,kinesis}
 
 Simulate error(s) from GCP or Kinesis.
@@ -13,21 +47,155 @@ optional arguments:
   -s, --staging         send to staging instance, defaults to local
   -n, --new             send new error(s)
   -r, --resurfaced      send resurfaced error(s)
+  --resurface-after RESURFACE_AFTER
+                        days between the first occurrence of a resurfaced
+                        error and the error(s), defaults to 90
   -t TIME, --time TIME  date and time of the error(s). Format: Y-m-d H:M:S
+  --virtual-clock START
+                        run on a virtual clock starting at START, which dates
+                        and processes the error(s) and only advances by
+                        --tick, replaces --time. Format: Y-m-d H:M:S
+  --ticks TICKS         number of times the error(s) are sent and processed,
+                        the clock advancing --tick seconds in between,
+                        defaults to 1. More than 1 tick requires --virtual-
+                        clock
+  --tick TICK           seconds the clock advances between ticks, defaults to
+                        a day
   -c COUNT, --count COUNT
                         number of errors to send
+  -b BATCH_SIZE, --batch-size BATCH_SIZE
+                        maximum number of errors to send per request
+  --max-batch-bytes MAX_BATCH_BYTES
+                        maximum size of a request body in bytes
+  --content-encoding {gzip,deflate}
+                        compress request bodies with a Content-Encoding of
+                        gzip or deflate, --max-batch-bytes still limits the
+                        uncompressed size
+  --compression-level {1-9}
+                        compression level, 1 is fastest, 9 smallest
+  --transport {http,pubsub,kinesis}
+                        post errors to the incoming errors endpoint, publish
+                        raw GCP logs to --topic, to the emulator if
+                        PUBSUB_EMULATOR_HOST is set, or put raw Kinesis logs
+                        to --shards simulated shards each delivered by a
+                        simulated lambda
+  --topic TOPIC         Pub/Sub topic raw GCP logs are published to
+  --pubsub-project PUBSUB_PROJECT
+                        project of the Pub/Sub topic
+  --max-batch-latency MAX_BATCH_LATENCY
+                        maximum seconds a message waits for its Pub/Sub batch,
+                        -b and --max-batch-bytes limit the messages and bytes
+                        of a batch
+  --shards SHARDS       number of simulated Kinesis shards
+  --partition-key {random,project,fixed}
+                        partition key of each log: random, its project, or a
+                        single key for every log
+  --max-record-bytes MAX_RECORD_BYTES
+                        maximum size of a Kinesis record logs are aggregated
+                        into
+  --records-per-invocation RECORDS_PER_INVOCATION
+                        maximum number of records per invocation of the lambda
+                        of a shard
+  --concurrency CONCURRENCY
+                        number of requests in flight, or Pub/Sub batches, a
+                        comma-separated list compares the throughput of each
+                        level
+  --rate RATE           target rate in errors per second, replaces --count
+  --duration DURATION   duration of a rate-controlled run in seconds
+  --profile {constant,ramp,step,spike}
+                        profile of the target rate over the run
+  --steps STEPS         number of steps of the step profile
+  --spike-factor SPIKE_FACTOR
+                        multiple of the target rate during a spike
+  --retries RETRIES     maximum number of retries of a request failing with
+                        429, 5xx or a connection error
+  --backoff BACKOFF     base of the jittered exponential backoff between
+                        retries in seconds
+  --max-backoff MAX_BACKOFF
+                        maximum backoff between retries in seconds
+  --adaptive            increase --rate while the endpoint keeps up and halve
+                        it when errors or latency rise
+  --max-error-rate MAX_ERROR_RATE
+                        fraction of failed requests per second above which an
+                        adaptive rate is decreased
+  --max-latency MAX_LATENCY
+                        90th percentile latency in milliseconds above which an
+                        adaptive rate is decreased
+  --replay REPLAY       NDJSON file of raw logs to replay, optionally gzipped,
+                        replaces --count and --file
+  --speed SPEED         factor by which the time between replayed logs is
+                        compressed, 0 replays as fast as possible
+  --start START         start of a range of times in UTC --count errors are
+                        spread over, replaces --time. Format: Y-m-d H:M:S
+  --end END             end of the range of times in UTC, defaults to now.
+                        Format: Y-m-d H:M:S
+  --distribution {uniform,diurnal,bursty}
+                        distribution of errors over the range of times
+  --process-window PROCESS_WINDOW
+                        process the errors of the range of times in windows of
+                        PROCESS_WINDOW seconds
+  --sweep               process every window, environment and source
+                        concurrently, and measure the end-to-end latency of
+                        probe errors
+  --sweep-sources SWEEP_SOURCES
+                        comma-separated sources of a sweep, defaults to the
+                        source of the run
+  --probes PROBES       number of probe errors per environment and source of a
+                        sweep
+  --poll-timeout POLL_TIMEOUT
+                        seconds a probe error is polled for
+  --poll-interval POLL_INTERVAL
+                        seconds between two polls for a probe error
+  --processed-errors-path PROCESSED_ERRORS_PATH
+                        path of the endpoint probe errors are polled at, which
+                        lists the processed errors of a source, env and
+                        identifier as JSON
+  --fingerprints FINGERPRINTS
+                        number of distinct error fingerprints, sends a Zipf-
+                        distributed mix of fingerprints
+  --skew SKEW           exponent of the Zipf distribution of fingerprints, 0
+                        is uniform
+  --new-fraction NEW_FRACTION
+                        fraction of errors with a new fingerprint
+  --services SERVICES   comma-separated services errors are sent from
+  --envs ENVS           comma-separated environments errors are sent from
+  -w WORKERS, --workers WORKERS
+                        number of processes the count or rate is sharded
+                        across
+  --seed SEED           seed of new error hashes, defaults to the current time
+  --report REPORT       file the JSON report of the run is written to
+  --soak CHECKPOINT     run as a soak test, writing progress, statistics and
+                        resource usage to CHECKPOINT every --checkpoint-
+                        interval seconds
+  --checkpoint-interval CHECKPOINT_INTERVAL
+                        seconds between the checkpoints of a soak test,
+                        defaults to 60
+  --resume              resume a soak test from its last checkpoint
   -f FILE, --file FILE  file containing a log
+  --corpus              draw errors from the logs of the source in logs/,
+                        weighted equally
+  --corpus-logs CORPUS_LOGS
+                        only draw errors from these logs of the corpus, a
+                        comma-separated list of NAME[=WEIGHT], e.g.
+                        IN-2725=5,IN-3295
   -p PROJECT, --project PROJECT
-                        project from which the error(s) is sent
+                        project from which the error(s) is sent, or a file or
+                        glob of files of projects and their weights
 """
 
+import Queue
 import argparse
 import base64
 import copy
 import datetime
+import glob
 import hashlib
+import itertools
 import json
+import multiprocessing
 import os
+import random
+import re
 import sys
 import time
 
@@ -35,14 +203,50 @@ import requests
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from backfill import DISTRIBUTIONS, format_times, generate_offsets, get_windows
+from clock import Clock, VirtualClock
 from constants import (
-    BASE_URL_LOCAL, BASE_URL_STAGING, DEFAULT_GCP_FILE, DEFAULT_KINESIS_FILE,
-    INCOMING_GCP_ERRORS, INCOMING_KINESIS_ERRORS, SERVICE_SUFFIX,
-    TIME_FORMAT_DEFAULT_DATETIME, TIME_FORMAT_GCP_RAW_ERROR,
-    TIME_FORMAT_KINESIS_ERROR, TIME_FORMAT_KINESIS_RAW_ERROR,
-    TIME_FORMAT_NO_MICRO_SEC)
-
-from settings import (COOKIE_LOCAL, COOKIE_STAGING)
+    BASE_URL_LOCAL, BASE_URL_STAGING, CORPUS_DIRECTORY, CORPUS_INDEX_FILE,
+    DEFAULT_GCP_FILE, DEFAULT_KINESIS_FILE, INCOMING_GCP_ERRORS,
+    INCOMING_KINESIS_ERRORS, MAX_BATCH_BYTES, PROCESSED_ERRORS, PUBSUB_PROJECT,
+    PUBSUB_TOPIC, SERVICE_SUFFIX, TIME_FORMAT_DEFAULT_DATETIME,
+    TIME_FORMAT_GCP_RAW_ERROR, TIME_FORMAT_KINESIS_ERROR,
+    TIME_FORMAT_KINESIS_RAW_ERROR, TIME_FORMAT_NO_MICRO_SEC)
+
+from corpus import (
+    FRONTEND_SERVICE, CorpusMix, load_index, parse_weights, select_entries)
+from producer import (
+    FIXED_PARTITION_KEY, MAX_RECORD_BYTES, PARTITION_KEYS, ShardedProducer,
+    deaggregate, deliver)
+from publisher import (
+    MAX_BATCH_LATENCY, create_publisher, ensure_topic, generate_messages,
+    publish_messages)
+from replay import read_ndjson, replay_logs
+from sender import (
+    BACKOFF, COMPRESSION_LEVEL, CONTENT_ENCODINGS, MAX_BACKOFF, RATE_PROFILES,
+    AimdController, RateProfile, RetryPolicy, Sender, compress_payloads,
+    create_batches, create_payloads, pace)
+from soak import CHECKPOINT_INTERVAL, Checkpointer
+from stats import RunStats, format_summary, write_report
+from sweep import Probe, poll_probes, process_concurrently
+from template import IDENTIFIER_FIELD, ErrorTemplate, get_field
+from timestamps import format_kinesis_time
+from utils import HttpClient, get_cookies
+from workload import ProjectMix, Workload
+
+# service with one of the environments in SERVICE_SUFFIX appended, anchored on
+# the end of the name
+SERVICE_ENV = re.compile(r'(.*)({})\Z'.format(
+    '|'.join(re.escape(suffix) for suffix in SERVICE_SUFFIX)), re.DOTALL)
+
+# memoised results of get_service_env, cleared once it holds
+# MAX_SERVICE_ENVS names so that it does not grow with every name resolved
+_service_envs = {}
+MAX_SERVICE_ENVS = 10000
+
+# seconds run_workers waits for the output of a worker before checking
+# whether a worker exited without it
+WORKER_POLL_INTERVAL = 1
 
 
 def parse_args():
@@ -63,23 +267,274 @@ def parse_args():
     group.add_argument('-r', '--resurfaced', action='store_true',
                        help='send resurfaced error(s)')
 
-    # specify the date and time of the error(s), defaults to
-    # datetime.datetime.now()
+    # specify how long before the error(s) a resurfaced error first occurred,
+    # defaults to 90 days
+    parser.add_argument('--resurface-after', type=float, default=90,
+                        help='days between the first occurrence of a '
+                             'resurfaced error and the error(s), defaults '
+                             'to 90')
+
+    # specify the date and time of the error(s), defaults to the time of the
+    # clock, see --virtual-clock
     parser.add_argument('-t', '--time', default=None,
                         help='date and time of the error(s). Format: {}'.
                         format(TIME_FORMAT_DEFAULT_DATETIME.replace('%', '')))
 
+    # specify a virtual clock the run is driven by, see VirtualClock,
+    # defaults to the wall clock
+    parser.add_argument('--virtual-clock', default=None, metavar='START',
+                        help='run on a virtual clock starting at START, '
+                             'which dates and processes the error(s) and '
+                             'only advances by --tick, replaces --time. '
+                             'Format: {}'.
+                        format(TIME_FORMAT_DEFAULT_DATETIME.replace('%', '')))
+    parser.add_argument('--ticks', type=int, default=1,
+                        help='number of times the error(s) are sent and '
+                             'processed, the clock advancing --tick seconds '
+                             'in between, defaults to 1. More than 1 tick '
+                             'requires --virtual-clock')
+    parser.add_argument('--tick', type=float, default=86400,
+                        help='seconds the clock advances between ticks, '
+                             'defaults to a day')
+
     # specify the number of errors to send, defaults to 1
     parser.add_argument('-c', '--count', type=int, default=1,
                         help='number of errors to send')
 
+    # specify the maximum number of errors to send per request, defaults to 1
+    parser.add_argument('-b', '--batch-size', type=int, default=1,
+                        help='maximum number of errors to send per request')
+
+    # specify the maximum size of a request body in bytes
+    parser.add_argument('--max-batch-bytes', type=int,
+                        default=MAX_BATCH_BYTES,
+                        help='maximum size of a request body in bytes')
+
+    # specify if request bodies are compressed, see compress_payloads
+    parser.add_argument('--content-encoding', choices=CONTENT_ENCODINGS,
+                        default=None,
+                        help='compress request bodies with a Content-Encoding '
+                             'of gzip or deflate, --max-batch-bytes still '
+                             'limits the uncompressed size')
+    parser.add_argument('--compression-level', type=int,
+                        default=COMPRESSION_LEVEL, choices=range(1, 10),
+                        metavar='{1-9}',
+                        help='compression level, 1 is fastest, 9 smallest')
+
+    # specify if raw GCP logs are published to Pub/Sub, as the log sink of a
+    # project does, instead of posting errors to the incoming errors
+    # endpoint, see publish_logs
+    parser.add_argument('--transport', choices=['http', 'pubsub', 'kinesis'],
+                        default='http',
+                        help='post errors to the incoming errors endpoint, '
+                             'publish raw GCP logs to --topic, to the '
+                             'emulator if PUBSUB_EMULATOR_HOST is set, or put '
+                             'raw Kinesis logs to --shards simulated shards '
+                             'each delivered by a simulated lambda')
+    parser.add_argument('--topic', default=PUBSUB_TOPIC,
+                        help='Pub/Sub topic raw GCP logs are published to')
+    parser.add_argument('--pubsub-project', default=PUBSUB_PROJECT,
+                        help='project of the Pub/Sub topic')
+    parser.add_argument('--max-batch-latency', type=float,
+                        default=MAX_BATCH_LATENCY,
+                        help='maximum seconds a message waits for its '
+                             'Pub/Sub batch, -b and --max-batch-bytes limit '
+                             'the messages and bytes of a batch')
+
+    # specify the shards raw Kinesis logs are put to, and how they are
+    # aggregated into records and delivered, see produce_errors
+    parser.add_argument('--shards', type=int, default=4,
+                        help='number of simulated Kinesis shards')
+    parser.add_argument('--partition-key', choices=PARTITION_KEYS,
+                        default='random',
+                        help='partition key of each log: random, its '
+                             'project, or a single key for every log')
+    parser.add_argument('--max-record-bytes', type=int,
+                        default=MAX_RECORD_BYTES,
+                        help='maximum size of a Kinesis record logs are '
+                             'aggregated into')
+    parser.add_argument('--records-per-invocation', type=int, default=100,
+                        help='maximum number of records per invocation of '
+                             'the lambda of a shard')
+
+    # specify the number of requests in flight, a comma-separated list runs
+    # the errors once per concurrency level
+    parser.add_argument('--concurrency', type=parse_int_list, default=[1],
+                        help='number of requests in flight, or Pub/Sub '
+                             'batches, a comma-separated list compares the '
+                             'throughput of each level')
+
+    # specify a target rate in errors per second, sends errors for --duration
+    # seconds instead of sending --count errors
+    parser.add_argument('--rate', type=float, default=None,
+                        help='target rate in errors per second, replaces '
+                             '--count')
+
+    # specify the duration of a rate-controlled run in seconds
+    parser.add_argument('--duration', type=float, default=60,
+                        help='duration of a rate-controlled run in seconds')
+
+    # specify how the target rate changes over the duration of the run
+    parser.add_argument('--profile', choices=RATE_PROFILES,
+                        default='constant',
+                        help='profile of the target rate over the run')
+
+    # specify the number of steps of the step profile
+    parser.add_argument('--steps', type=int, default=5,
+                        help='number of steps of the step profile')
+
+    # specify the multiple of the target rate during a spike
+    parser.add_argument('--spike-factor', type=float, default=5.0,
+                        help='multiple of the target rate during a spike')
+
+    # specify how requests failing with 429, 5xx or a connection error are
+    # retried, see RetryPolicy
+    parser.add_argument('--retries', type=int, default=3,
+                        help='maximum number of retries of a request failing '
+                             'with 429, 5xx or a connection error')
+    parser.add_argument('--backoff', type=float, default=BACKOFF,
+                        help='base of the jittered exponential backoff '
+                             'between retries in seconds')
+    parser.add_argument('--max-backoff', type=float, default=MAX_BACKOFF,
+                        help='maximum backoff between retries in seconds')
+
+    # specify if the target rate adapts to the errors and latency of the
+    # endpoint, see AimdController
+    parser.add_argument('--adaptive', action='store_true',
+                        help='increase --rate while the endpoint keeps up '
+                             'and halve it when errors or latency rise')
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='fraction of failed requests per second above '
+                             'which an adaptive rate is decreased')
+    parser.add_argument('--max-latency', type=float, default=None,
+                        help='90th percentile latency in milliseconds above '
+                             'which an adaptive rate is decreased')
+
+    # specify a NDJSON file of raw logs to replay instead of a single log
+    parser.add_argument('--replay', default=None,
+                        help='NDJSON file of raw logs to replay, optionally '
+                             'gzipped, replaces --count and --file')
+
+    # specify how many times faster than the original logs to replay them
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='factor by which the time between replayed logs '
+                             'is compressed, 0 replays as fast as possible')
+
+    # specify a range of times to spread --count errors over instead of
+    # sending them at --time
+    parser.add_argument('--start', default=None,
+                        help='start of a range of times in UTC --count errors '
+                             'are spread over, replaces --time. Format: {}'.
+                        format(TIME_FORMAT_DEFAULT_DATETIME.replace('%', '')))
+    parser.add_argument('--end', default=None,
+                        help='end of the range of times in UTC, defaults to '
+                             'now. Format: {}'.
+                        format(TIME_FORMAT_DEFAULT_DATETIME.replace('%', '')))
+
+    # specify how errors are distributed over the range of times
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS,
+                        default='uniform',
+                        help='distribution of errors over the range of times')
+
+    # specify the windows errors are processed in after a backfill
+    parser.add_argument('--process-window', type=float, default=None,
+                        help='process the errors of the range of times in '
+                             'windows of PROCESS_WINDOW seconds')
+
+    # specify a sweep processing errors concurrently and measuring the time
+    # from ingestion until errors are processed, see sweep_process_errors
+    parser.add_argument('--sweep', action='store_true',
+                        help='process every window, environment and source '
+                             'concurrently, and measure the end-to-end '
+                             'latency of probe errors')
+    parser.add_argument('--sweep-sources', type=parse_list, default=None,
+                        help='comma-separated sources of a sweep, defaults '
+                             'to the source of the run')
+    parser.add_argument('--probes', type=int, default=1,
+                        help='number of probe errors per environment and '
+                             'source of a sweep')
+    parser.add_argument('--poll-timeout', type=float, default=300,
+                        help='seconds a probe error is polled for')
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help='seconds between two polls for a probe error')
+    parser.add_argument('--processed-errors-path', default=PROCESSED_ERRORS,
+                        help='path of the endpoint probe errors are polled '
+                             'at, which lists the processed errors of a '
+                             'source, env and identifier as JSON')
+
+    # specify the number of distinct error fingerprints of a realistic
+    # workload, see Workload
+    parser.add_argument('--fingerprints', type=int, default=None,
+                        help='number of distinct error fingerprints, sends a '
+                             'Zipf-distributed mix of fingerprints')
+
+    # specify the skew of the Zipf distribution of fingerprints
+    parser.add_argument('--skew', type=float, default=1.0,
+                        help='exponent of the Zipf distribution of '
+                             'fingerprints, 0 is uniform')
+
+    # specify the fraction of errors with a fingerprint never sent before
+    parser.add_argument('--new-fraction', type=float, default=0.0,
+                        help='fraction of errors with a new fingerprint')
+
+    # specify the services of a realistic workload, defaults to the service
+    # of --project
+    parser.add_argument('--services', type=parse_list, default=None,
+                        help='comma-separated services errors are sent from')
+
+    # specify the environments of a realistic workload, defaults to the
+    # environment of --project or every environment in SERVICE_SUFFIX
+    parser.add_argument('--envs', type=parse_list, default=None,
+                        help='comma-separated environments errors are sent '
+                             'from')
+
+    # specify the number of processes the errors are sent from
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of processes the count or rate is '
+                             'sharded across')
+
+    # specify the seed of new error hashes, defaults to the current time
+    parser.add_argument('--seed', default=None,
+                        help='seed of new error hashes, defaults to the '
+                             'current time')
+
+    # specify the file the JSON report of the run is written to
+    parser.add_argument('--report', default=None,
+                        help='file the JSON report of the run is written to')
+
+    # specify a soak test checkpointed to a file, see Checkpointer
+    parser.add_argument('--soak', default=None, metavar='CHECKPOINT',
+                        help='run as a soak test, writing progress, '
+                             'statistics and resource usage to CHECKPOINT '
+                             'every --checkpoint-interval seconds')
+    parser.add_argument('--checkpoint-interval', type=float,
+                        default=CHECKPOINT_INTERVAL,
+                        help='seconds between the checkpoints of a soak '
+                             'test, defaults to {}'.format(
+                                 CHECKPOINT_INTERVAL))
+    parser.add_argument('--resume', action='store_true',
+                        help='resume a soak test from its last checkpoint')
+
     # specify the file containing the log for the error
     parser.add_argument('-f', '--file', default=None,
                         help='file containing a log')
 
-    # project from which the error(s) is sent
+    # specify a weighted mix of the logs of the corpus in logs/ to draw errors
+    # from instead of a single log, see load_index
+    parser.add_argument('--corpus', action='store_true',
+                        help='draw errors from the logs of the source in '
+                             'logs/, weighted equally')
+    parser.add_argument('--corpus-logs', type=parse_weights, default=None,
+                        help='only draw errors from these logs of the corpus, '
+                             'a comma-separated list of NAME[=WEIGHT], e.g. '
+                             'IN-2725=5,IN-3295')
+
+    # project from which the error(s) is sent, or a file or glob of files
+    # listing projects, see load_projects
     parser.add_argument('-p', '--project', default=None,
-                        help='project from which the error(s) is sent')
+                        help='project from which the error(s) is sent, or a '
+                             'file or glob of files of projects and their '
+                             'weights')
 
     # source (gcp or kinesis) from which the error(s) is sent
     parser.add_argument('source', choices=['gcp', 'kinesis'],
@@ -89,10 +544,13 @@ def parse_args():
 
 
 def main():
-    errors = []
     args = parse_args()
 
-    if args.project:
+    projects = None
+    if args.project and is_project_list(args.project):
+        projects = load_projects(args.project)
+        service, env = '', ''
+    elif args.project:
         service, env = get_service_env(args.project)
     else:
         service, env = '', ''
@@ -109,51 +567,1086 @@ def main():
 
     if args.time:
         try:
-            time = datetime.datetime.strptime(
+            timestamp = datetime.datetime.strptime(
                 args.time, TIME_FORMAT_DEFAULT_DATETIME)
         except ValueError:
             raise ValueError(
                 'Argument -t TIME must be in the format: {}.'.format(
                     TIME_FORMAT_DEFAULT_DATETIME))
     else:
-        time = datetime.datetime.now()
+        # errors are dated by the clock at each tick
+        timestamp = None
 
-    if args.file:
-        log = open_json_file(args.file)
+    if args.virtual_clock:
+        if args.time:
+            raise ValueError(
+                'Argument --virtual-clock cannot be used with --time.')
+        try:
+            clock = VirtualClock(datetime.datetime.strptime(
+                args.virtual_clock, TIME_FORMAT_DEFAULT_DATETIME))
+        except ValueError:
+            raise ValueError(
+                'Argument --virtual-clock START must be in the format: {}.'.
+                format(TIME_FORMAT_DEFAULT_DATETIME))
+    else:
+        clock = Clock()
+
+    if args.ticks > 1 and (
+            not args.virtual_clock or args.start or args.replay):
+        raise ValueError(
+            'Argument --ticks requires --virtual-clock, and cannot be used '
+            'with --start or --replay.')
+
+    if args.adaptive and (not args.rate or args.profile != 'constant'):
+        raise ValueError(
+            'Argument --adaptive requires --rate with a constant profile.')
+
+    if args.corpus_logs:
+        args.corpus = True
+    if args.corpus and (
+            args.file or args.replay or args.resurfaced or
+            args.fingerprints or projects):
+        raise ValueError(
+            'Argument --corpus cannot be used with --file, --replay, '
+            '--resurfaced, --fingerprints or a list of projects.')
+
+    if args.transport == 'pubsub' and (
+            args.source != 'gcp' or args.replay or args.corpus or
+            args.resurfaced or args.fingerprints or projects or args.start or
+            args.adaptive or args.content_encoding):
+        raise ValueError(
+            'Argument --transport pubsub requires the gcp source, and cannot '
+            'be used with --replay, --corpus, --resurfaced, --fingerprints, '
+            'a list of projects, --start, --adaptive or --content-encoding.')
+
+    if args.transport == 'kinesis' and (
+            args.source != 'kinesis' or args.replay or args.corpus or
+            args.resurfaced or args.start or args.rate):
+        raise ValueError(
+            'Argument --transport kinesis requires the kinesis source, and '
+            'cannot be used with --replay, --corpus, --resurfaced, --start '
+            'or --rate.')
+
+    if args.start:
+        if args.rate or args.replay:
+            raise ValueError(
+                'Argument --start cannot be used with --rate or --replay.')
+        # workers and concurrency levels spread errors over the same range
+        if args.end is None:
+            args.end = clock.utcnow().strftime(
+                TIME_FORMAT_DEFAULT_DATETIME)
+        start, end = get_backfill_range(args)
+
+    if args.resume and not args.soak:
+        raise ValueError('Argument --resume requires --soak.')
+
+    checkpointer = None
+    if args.soak:
+        if args.workers > 1 or len(args.concurrency) > 1 or \
+                args.transport != 'http' or args.replay or args.start or \
+                args.ticks > 1:
+            raise ValueError(
+                'Argument --soak cannot be used with --workers, more than one '
+                'concurrency level, --transport pubsub or kinesis, --replay, '
+                '--start or --ticks.')
+        checkpointer = Checkpointer(args.soak, args, args.checkpoint_interval)
+        if args.resume:
+            checkpointer.resume()
+            if checkpointer.complete:
+                print 'Soak test {} is already complete.'.format(args.soak)
+                return
+
+    # the seed is drawn from the wall clock, as a virtual clock starts at
+    # the same time on every run
+    if args.seed is None:
+        args.seed = str(datetime.datetime.now())
+
+    if args.start and args.process_window:
+        windows = get_windows(start, end, args.process_window)
     else:
-        log = populate_default_log(args.source, time, service)
+        windows = []
+    process_url = create_url(base_url, '/tasks/process_errors')
+
+    results = []
+    process_stats = RunStats()
+    latency_stats = RunStats() if args.sweep else None
+    try:
+        for tick in range(args.ticks):
+            if tick:
+                clock.advance(args.tick)
+            if args.ticks > 1:
+                print 'Tick {} of {}: {}'.format(
+                    tick + 1, args.ticks,
+                    clock.now().strftime(TIME_FORMAT_DEFAULT_DATETIME))
+            tick_results = len(results)
+
+            if args.workers > 1:
+                failed = run_workers(args, url, service, env,
+                                     timestamp or clock.now(), results,
+                                     projects, tick)
+            else:
+                if checkpointer:
+                    checkpointer.start()
+                complete = False
+                try:
+                    send_incoming_errors(args, url, service, env,
+                                         timestamp or clock.now(), results,
+                                         projects=projects,
+                                         checkpointer=checkpointer,
+                                         tick=tick)
+                    complete = True
+                finally:
+                    # a soak test that exits is checkpointed to be resumed
+                    if checkpointer:
+                        checkpointer.stop(complete)
+                failed = False
+
+            print_throughput(results[tick_results:])
+            print_projects(results[tick_results:])
+
+            if failed:
+                print 'Error! At least one worker failed.'
+                sys.exit(1)
+
+            # let the errors settle before they are processed
+            clock.sleep(1)
+
+            if args.sweep:
+                sweep_process_errors(args, base_url, service, env, windows,
+                                     process_stats, latency_stats, clock,
+                                     tick)
+            elif not args.staging:
+                if windows:
+                    process_windows(env, args.source, process_url, windows,
+                                    process_stats)
+                else:
+                    simulate_process_errors(env, args.source, process_url,
+                                            process_stats, clock)
+    finally:
+        # the report is written even if the run exits on a failed request
+        if args.report:
+            write_report(
+                create_report(args, results, process_stats, latency_stats),
+                args.report)
+
+
+def send_incoming_errors(args, url, service, env, timestamp, results,
+                         worker=0, workers=1, projects=None,
+                         checkpointer=None, tick=0):
+    """
+    Send the incoming errors of a run, once per concurrency level.
+
+    If the run is sharded across worker processes, this worker sends its
+    share of the count or rate, and only its share of the replayed logs.
+
+    Errors of a list of projects are sent through the same sender, each
+    project getting its weighted share, see create_workload. With --corpus,
+    errors are drawn from a weighted mix of the logs of the corpus instead.
 
-    log = simulate_insight_lambda(args.source, log, service, env)
+    With --start, the errors are spread over a range of times, see
+    create_backfill_times.
 
-    hash = hashlib.sha256(str(datetime.datetime.now()))
+    A soak test records the errors in the statistics of its checkpointer,
+    and only sends the errors, or the rest of the duration, its last
+    checkpoint had not. The draws of a resumed soak test skip the errors its
+    checkpoint had sent, so that new fingerprints are not sent again.
 
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param url: url for incoming errors endpoint
+    :type url: str
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :param timestamp: time of the error(s)
+    :type timestamp: datetime.datetime
+    :param results: list the concurrency level and statistics of each level
+        are appended to
+    :type results: list
+    :param worker: index of this worker
+    :type worker: int
+    :param workers: number of workers
+    :type workers: int
+    :param projects: (service, env, weight) of the projects errors are sent
+        from, replaces service and env
+    :type projects: list
+    :param checkpointer: checkpointer of a soak test
+    :type checkpointer: Checkpointer
+    :param tick: index of the tick of the run, see --ticks
+    :type tick: int
+    :return: None
+    :rtype: None
+    """
+    # errors are sent until the duration of the profile has elapsed in a
+    # rate-controlled run
+    if args.rate:
+        count = None
+    else:
+        count = get_shard_count(args.count, worker, workers)
+    resumed_at = 0.0
+    sent = 0
+    if checkpointer:
+        resumed_at = checkpointer.stats.get_elapsed()
+        sent = checkpointer.stats.records
+        if count is not None:
+            count = max(count - sent, 0)
+
+    def get_log(service):
+        if args.file:
+            return open_json_file(args.file)
+        return populate_default_log(args.source, timestamp, service)
+
+    suffix = ''
     if args.new:
-        if args.source == 'gcp':
-            log['resource'] += '{}{}'.format(
-                '-', str(hash.hexdigest())[0:7])
-        elif args.source == 'kinesis':
-            log['exception']['message'] += '{}{}'.format(
-                '-', str(hash.hexdigest())[0:7])
-    elif args.resurfaced:
-        # TODO: resurfaced errors currently do not work
-        log_copy = copy.deepcopy(log)
-        if args.source == 'gcp':
-            log_copy['_time'] = time - datetime.timedelta(days=90)
-        elif args.source == 'kinesis':
-            log_copy['time'] = time - datetime.timedelta(days=90)
-        errors.append(log_copy)
-
-    for i in range(args.count):
-        errors.append(copy.deepcopy(log))
-
-    simulate_incoming_errors(errors, url)
+        hash = hashlib.sha256(get_worker_seed(
+            get_tick_seed(args.seed, tick), worker, workers))
+        suffix = '{}{}'.format('-', str(hash.hexdigest())[0:7])
+
+    resurfaced = []
+    if args.corpus:
+        # the index is loaded once, and each log is only processed the first
+        # time it is drawn, see generate_corpus_errors
+        entries = select_entries(
+            load_index(CORPUS_DIRECTORY, CORPUS_INDEX_FILE), args.source,
+            args.corpus_logs)
+    elif not args.replay:
+        log = get_log(service)
+
+        if args.new:
+            add_suffix(args.source, log, suffix)
+
+        if args.resurfaced and worker == 0 and not sent:
+            log_copy = simulate_insight_lambda(
+                args.source, copy.deepcopy(log), service, env)
+            resurfaced_time = (timestamp - datetime.timedelta(
+                days=args.resurface_after)).strftime(
+                    get_error_time_format(args.source))
+            if args.source == 'gcp':
+                log_copy['_time'] = resurfaced_time
+            elif args.source == 'kinesis':
+                log_copy['time'] = resurfaced_time
+            resurfaced.append(log_copy)
+
+        if not args.fingerprints and not projects:
+            # the log is processed and serialised once, see ErrorTemplate
+            template = ErrorTemplate(args.source, simulate_insight_lambda(
+                args.source, copy.deepcopy(log), service, env))
+
+    for level, concurrency in enumerate(args.concurrency):
+        stats = checkpointer.stats if checkpointer else RunStats()
+        # each concurrency level starts from the same errors, except for new
+        # fingerprints, see create_workload
+        if args.start:
+            times = create_backfill_times(args, count, worker, workers)
+        else:
+            times = None
+        if args.replay:
+            errors = replay_errors(args.replay, args.source, service, env,
+                                   args.speed, worker, workers)
+        elif args.corpus:
+            mix = CorpusMix(
+                entries, get_worker_seed(args.seed, worker, workers))
+            mix.skip(sent)
+            errors = generate_corpus_errors(
+                args.source, mix, service, env, timestamp, count, times,
+                suffix)
+        elif args.fingerprints or projects:
+            workload = create_workload(args, service, env, worker, workers,
+                                       projects, level, tick)
+            workload.skip(sent)
+            errors = itertools.chain(
+                (encode_error(e) for e in resurfaced),
+                generate_workload_errors(
+                    args.source, workload, get_log, count, times))
+        else:
+            errors = itertools.chain(
+                (encode_error(e) for e in resurfaced),
+                generate_encoded_errors(template, count, times))
+        if args.rate:
+            profile = RateProfile(
+                float(args.rate) / workers, args.duration, args.profile,
+                args.steps, args.spike_factor, resumed_at)
+        else:
+            profile = None
+        if args.adaptive:
+            controller = AimdController(
+                profile.rate, max_error_rate=args.max_error_rate,
+                max_latency=args.max_latency / 1000.0
+                if args.max_latency else None)
+        else:
+            controller = None
+        results.append((concurrency, stats))
+        if args.transport == 'pubsub':
+            publish_logs(
+                generate_messages(log, count), args.pubsub_project,
+                args.topic, args.batch_size, args.max_batch_bytes,
+                args.max_batch_latency, concurrency, profile, stats)
+            continue
+        retry = RetryPolicy(args.retries, args.backoff, args.max_backoff)
+        if args.transport == 'kinesis':
+            if args.fingerprints or projects:
+                workload = create_workload(args, service, env, worker,
+                                           workers, projects, level, tick)
+            else:
+                workload = ProjectMix([(service, env)], suffix)
+            logs = generate_partitioned_logs(
+                workload, get_log, args.partition_key, count,
+                get_worker_seed(args.seed, worker, workers))
+            produce_errors(
+                logs, url, args.shards, args.max_record_bytes,
+                args.records_per_invocation, args.batch_size,
+                args.max_batch_bytes, stats, retry)
+            continue
+        send_errors(
+            errors, url, args.batch_size, args.max_batch_bytes,
+            concurrency, profile, stats, retry, controller,
+            args.content_encoding, args.compression_level)
 
-    if not args.staging:
-        url = create_url(base_url, '/tasks/process_errors')
-        simulate_process_errors(env, args.source, url)
 
+def run_workers(args, url, service, env, timestamp, results, projects=None,
+                tick=0):
+    """
+    Send the incoming errors of a run from multiple worker processes.
+
+    Each worker sends its share of the errors with its own connection pool,
+    see send_incoming_errors. The statistics of the workers are merged per
+    concurrency level.
 
-def simulate_incoming_errors(errors, url):
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param url: url for incoming errors endpoint
+    :type url: str
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :param timestamp: time of the error(s)
+    :type timestamp: datetime.datetime
+    :param results: list the concurrency level and merged statistics of each
+        level are appended to
+    :type results: list
+    :param projects: (service, env, weight) of the projects errors are sent
+        from, replaces service and env
+    :type projects: list
+    :param tick: index of the tick of the run, see --ticks
+    :type tick: int
+    :return: True if any worker failed
+    :rtype: bool
+    """
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(args, url, service, env, timestamp, worker, queue,
+                  projects, tick))
+        for worker in range(args.workers)]
+    for process in processes:
+        process.start()
+
+    outputs = collect_worker_outputs(queue, processes)
+    for process in processes:
+        process.join()
+
+    merged = [(concurrency, RunStats()) for concurrency in args.concurrency]
+    failed = False
+    for worker_failed, worker_results in outputs:
+        failed = failed or worker_failed
+        for (_, stats), (_, d) in zip(merged, worker_results):
+            stats.merge(RunStats.from_dict(d))
+
+    for concurrency, stats in merged:
+        print format_summary(
+            stats.summary(), 'Incoming errors (concurrency {}, {} workers):'.
+            format(concurrency, args.workers), 'errors')
+    results.extend(merged)
+    return failed
+
+
+def collect_worker_outputs(queue, processes, interval=WORKER_POLL_INTERVAL):
+    """
+    Wait for the output of every worker process, see run_worker.
+
+    A worker killed before it puts its output, e.g. by the OOM killer, is
+    counted as failed, without statistics, rather than waited for forever.
+
+    :param queue: queue the workers put their output on
+    :type queue: multiprocessing.Queue
+    :param processes: process of each worker
+    :type processes: list
+    :param interval: seconds to wait for an output before checking whether
+        a worker exited without it
+    :type interval: float
+    :return: (whether the worker failed, statistics of each concurrency
+        level) of each worker, in order
+    :rtype: list
+    """
+    outputs = {}
+    while len(outputs) < len(processes):
+        # a worker that exited before the wait has flushed its output
+        exited = [worker for worker, process in enumerate(processes)
+                  if process.exitcode is not None and worker not in outputs]
+        try:
+            worker, failed, results = queue.get(timeout=interval)
+            outputs[worker] = (failed, results)
+        except Queue.Empty:
+            for worker in exited:
+                print 'Error! Worker {} exited with code {} before ' \
+                    'reporting.'.format(worker, processes[worker].exitcode)
+                outputs[worker] = (True, [])
+    return [outputs[worker] for worker in range(len(processes))]
+
+
+def run_worker(args, url, service, env, timestamp, worker, queue,
+               projects=None, tick=0):
+    """
+    Send the share of the incoming errors of a worker process.
+
+    The index and statistics of the worker are put on the queue, even if it
+    fails.
+
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param url: url for incoming errors endpoint
+    :type url: str
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent
+    :type env: str
+    :param timestamp: time of the error(s)
+    :type timestamp: datetime.datetime
+    :param worker: index of the worker
+    :type worker: int
+    :param queue: queue for the index of the worker, whether it failed and
+        its statistics
+    :type queue: multiprocessing.Queue
+    :param projects: (service, env, weight) of the projects errors are sent
+        from, replaces service and env
+    :type projects: list
+    :param tick: index of the tick of the run, see --ticks
+    :type tick: int
+    :return: None
+    :rtype: None
+    """
+    results = []
+    failed = True
+    try:
+        send_incoming_errors(args, url, service, env, timestamp, results,
+                             worker, args.workers, projects, tick=tick)
+        failed = False
+    except SystemExit:
+        pass
+    finally:
+        queue.put((worker, failed, [(concurrency, stats.to_dict())
+                                    for concurrency, stats in results]))
+
+
+def create_workload(args, service, env, worker=0, workers=1, projects=None,
+                    level=0, tick=0):
+    """
+    Create the realistic workload of a run.
+
+    Errors are sent from every combination of --services and --envs. Without
+    --services, the service of --project is used, and without --envs, the
+    environment of --project or else every environment in SERVICE_SUFFIX.
+
+    Errors of a list of projects are sent from those projects instead, each
+    with its weight. Without --fingerprints, every error of a project is the
+    error of its log, with a new suffix if --new is given.
+
+    Every concurrency level and tick draws the same fingerprints, but new
+    ones of its own, so that each pays for the errors Insight has not seen.
+
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param service: service of --project
+    :type service: str
+    :param env: environment of --project
+    :type env: str
+    :param worker: index of the worker
+    :type worker: int
+    :param workers: number of workers
+    :type workers: int
+    :param projects: (service, env, weight) of the projects errors are sent
+        from
+    :type projects: list
+    :param level: index of the concurrency level
+    :type level: int
+    :param tick: index of the tick of the run, see --ticks
+    :type tick: int
+    :return: workload
+    :rtype: Workload | ProjectMix
+    """
+    random_seed = get_worker_seed(args.seed, worker, workers)
+    tick_seed = get_worker_seed(
+        get_tick_seed(args.seed, tick), worker, workers)
+    new_seed = '{}-{}'.format(tick_seed, level)
+    if projects and not args.fingerprints:
+        fingerprint = ''
+        if args.new:
+            hash = hashlib.sha256(tick_seed)
+            fingerprint = '{}{}'.format('-', str(hash.hexdigest())[0:7])
+        return ProjectMix(projects, fingerprint, random_seed)
+    if projects:
+        return Workload(args.fingerprints, projects, args.skew,
+                        args.new_fraction, args.seed, random_seed, new_seed)
+
+    services = args.services or [service or 'service']
+    if args.envs:
+        envs = args.envs
+    elif env:
+        envs = [env]
+    else:
+        envs = get_envs()
+
+    projects = [(s, e) for s in services for e in envs]
+
+    # workers share the fingerprints, but draw from them independently
+    return Workload(args.fingerprints, projects, args.skew, args.new_fraction,
+                    args.seed, random_seed, new_seed)
+
+
+def generate_workload_errors(source, workload, get_log, count=None,
+                             times=None):
+    """
+    Lazily generate base64 encoded errors of a realistic workload, labelled
+    by project.
+
+    A template is created for each project the first time it is drawn, see
+    ErrorTemplate. Each error is rendered from the template of its project
+    with its fingerprint appended to its identifier. The label of an error
+    is its project, so that the errors delivered are counted by project, see
+    create_payloads.
+
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param workload: mix of fingerprints, services and environments
+    :type workload: Workload | ProjectMix
+    :param get_log: function returning a new raw log for a given service
+    :type get_log: function
+    :param count: number of errors, None for an unbounded number of errors
+    :type count: int
+    :param times: formatted time of each error, defaults to the time of its
+        log
+    :type times: iterable
+    :return: generator of (base64 encoded error, project)
+    :rtype: generator
+    """
+    templates = {}
+    if times is None:
+        times = itertools.repeat(None)
+    for (service, env, fingerprint), error_time in itertools.izip(
+            workload.samples(count), times):
+        template = templates.get((service, env))
+        if template is None:
+            template = ErrorTemplate(source, simulate_insight_lambda(
+                source, get_log(service), service, env))
+            templates[(service, env)] = template
+        yield (template.encode(error_time, fingerprint),
+               get_project(service, env))
+
+
+def generate_corpus_errors(source, mix, service, env, timestamp, count=None,
+                           times=None, suffix=''):
+    """
+    Lazily generate base64 encoded errors drawn from the logs of a corpus.
+
+    A template is created for each log the first time it is drawn, see
+    ErrorTemplate, with the time of the log set to timestamp. Logs are not
+    parsed, their entries in the corpus index hold them.
+
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param mix: weighted mix of the logs of the corpus
+    :type mix: CorpusMix
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent
+    :type env: str
+    :param timestamp: time of the error(s)
+    :type timestamp: datetime.datetime
+    :param count: number of errors, None for an unbounded number of errors
+    :type count: int
+    :param times: formatted time of each error, replaces count
+    :type times: iterable
+    :param suffix: suffix appended to the identifier of every error
+    :type suffix: str
+    :return: generator of base64 encoded errors
+    :rtype: generator
+    """
+    templates = {}
+    if times is None:
+        times = itertools.repeat(None)
+    for entry, error_time in itertools.izip(mix.samples(count), times):
+        template = templates.get(entry['name'])
+        if template is None:
+            log = set_raw_time(source, copy.deepcopy(entry['log']), timestamp)
+            template = ErrorTemplate(source, simulate_insight_lambda(
+                source, log, service, env))
+            templates[entry['name']] = template
+        yield template.encode(error_time, suffix)
+
+
+def set_raw_time(source, log, timestamp):
+    """
+    Set the time of a raw GCP or Kinesis error log.
+
+    :param source: gcp, kinesis
+    :type source: str
+    :param log: raw error log
+    :type log: dict
+    :param timestamp: time of the log
+    :type timestamp: datetime.datetime
+    :return: log
+    :rtype: dict
+    """
+    if source == 'gcp':
+        log['endTime'] = timestamp.strftime(TIME_FORMAT_GCP_RAW_ERROR)
+    else:
+        log['timestamp'] = timestamp.strftime(TIME_FORMAT_KINESIS_RAW_ERROR)
+    return log
+
+
+def is_project_list(project):
+    """
+    Return whether --project is a file or glob of files listing projects.
+
+    :param project: project, file or glob
+    :type project: str
+    :return: True if project is a file or glob
+    :rtype: bool
+    """
+    return os.path.isfile(project) or glob.has_magic(project)
+
+
+def load_projects(pattern):
+    """
+    Load the projects listed in a file or glob of files.
+
+    Each line lists a project, e.g. Cerberus-prod, optionally followed by its
+    weight, which defaults to 1. Blank lines and text after a # are ignored.
+
+    :param pattern: name of a file or glob of files
+    :type pattern: str
+    :return: (service, env, weight) of each project
+    :rtype: list
+    """
+    filenames = sorted(glob.glob(pattern))
+    if not filenames:
+        raise IOError('{} does not exist.'.format(pattern))
+
+    names = []
+    weights = []
+    for filename in filenames:
+        with open(filename) as f:
+            for number, line in enumerate(f, 1):
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                try:
+                    if len(fields) > 2:
+                        raise ValueError()
+                    weight = float(fields[1]) if len(fields) > 1 else 1.0
+                    if weight < 0:
+                        raise ValueError()
+                except ValueError:
+                    raise ValueError(
+                        '{}:{} must be of the form: project [weight].'.format(
+                            filename, number))
+                names.append(fields[0])
+                weights.append(weight)
+
+    if not names:
+        raise ValueError('{} does not list any project.'.format(pattern))
+
+    return [(service, env, weight) for (service, env), weight in
+            zip(get_service_envs(names), weights)]
+
+
+def get_project(service, env):
+    """
+    Return the name of a project, the inverse of get_service_env.
+
+    :param service: service of the project
+    :type service: str
+    :param env: environment of the project
+    :type env: str
+    :return: project, e.g. Cerberus-prod
+    :rtype: str
+    """
+    return '{}-{}'.format(service, env) if env else service
+
+
+def get_envs():
+    """
+    Return the environments in SERVICE_SUFFIX.
+
+    :return: environments
+    :rtype: list
+    """
+    return [suffix[1:] for suffix in SERVICE_SUFFIX]
+
+
+def get_shard_count(count, worker, workers):
+    """
+    Return the number of errors a worker sends out of count errors.
+
+    :param count: total number of errors
+    :type count: int
+    :param worker: index of the worker
+    :type worker: int
+    :param workers: number of workers
+    :type workers: int
+    :return: number of errors sent by the worker
+    :rtype: int
+    """
+    return count // workers + (1 if worker < count % workers else 0)
+
+
+def get_worker_seed(seed, worker, workers):
+    """
+    Return the seed of a worker, distinct for every worker.
+
+    :param seed: seed of the run
+    :type seed: str
+    :param worker: index of the worker
+    :type worker: int
+    :param workers: number of workers
+    :type workers: int
+    :return: seed of the worker
+    :rtype: str
+    """
+    if workers == 1:
+        return seed
+    return '{}-{}'.format(seed, worker)
+
+
+def get_tick_seed(seed, tick):
+    """
+    Return the seed of a tick, distinct for every tick, so that new errors
+    and probes are new on every tick.
+
+    :param seed: seed of the run
+    :type seed: str
+    :param tick: index of the tick, see --ticks
+    :type tick: int
+    :return: seed of the tick
+    :rtype: str
+    """
+    if not tick:
+        return seed
+    return '{}-tick-{}'.format(seed, tick)
+
+
+def get_backfill_range(args):
+    """
+    Return the range of times errors are spread over, see --start and --end.
+
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :return: start, end
+    :rtype: datetime.datetime, datetime.datetime
+    """
+    try:
+        start = datetime.datetime.strptime(
+            args.start, TIME_FORMAT_DEFAULT_DATETIME)
+        end = datetime.datetime.strptime(
+            args.end, TIME_FORMAT_DEFAULT_DATETIME)
+    except ValueError:
+        raise ValueError(
+            'Arguments --start and --end must be in the format: {}.'.format(
+                TIME_FORMAT_DEFAULT_DATETIME))
+    if start >= end:
+        raise ValueError('Argument --start must be before --end.')
+    return start, end
+
+
+def create_backfill_times(args, count, worker=0, workers=1):
+    """
+    Lazily generate the times of the errors of a backfill.
+
+    The errors are spread over --start to --end following --distribution,
+    see generate_offsets. Each worker draws the times of its own errors.
+
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param count: number of errors
+    :type count: int
+    :param worker: index of the worker
+    :type worker: int
+    :param workers: number of workers
+    :type workers: int
+    :return: generator of ascending times, formatted as the time of a
+        processed error
+    :rtype: generator
+    """
+    start, end = get_backfill_range(args)
+    random_ = random.Random(get_worker_seed(args.seed, worker, workers))
+    offsets = generate_offsets(count, (end - start).total_seconds(),
+                               args.distribution, start, random_)
+    return format_times(start, offsets, get_error_time_format(args.source))
+
+
+def get_error_time_format(source):
+    """
+    Return the format of the time of a processed error.
+
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :return: time format
+    :rtype: str
+    """
+    if source == 'gcp':
+        return TIME_FORMAT_GCP_RAW_ERROR
+    return TIME_FORMAT_KINESIS_ERROR
+
+
+def create_report(args, results, process_stats, latency_stats=None):
+    """
+    Create the report of a run.
+
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param results: concurrency level and statistics of each level
+    :type results: list
+    :param process_stats: statistics of the process errors request
+    :type process_stats: RunStats
+    :param latency_stats: end-to-end latency of the probes of a sweep
+    :type latency_stats: RunStats
+    :return: report
+    :rtype: dict
+    """
+    incoming_errors = []
+    for concurrency, stats in results:
+        summary = stats.summary()
+        summary['concurrency'] = concurrency
+        incoming_errors.append(summary)
+
+    report = {
+        'args': vars(args),
+        'created': datetime.datetime.utcnow().strftime(
+            TIME_FORMAT_DEFAULT_DATETIME),
+        'incoming_errors': incoming_errors,
+        'process_errors': process_stats.summary()
+    }
+    if latency_stats:
+        report['end_to_end'] = latency_stats.summary()
+    return report
+
+
+def parse_int_list(value):
+    """
+    Parse a comma-separated list of positive integers.
+
+    :param value: comma-separated list of integers, e.g. 1,4,16
+    :type value: str
+    :return: list of integers
+    :rtype: list
+    """
+    try:
+        values = [int(v) for v in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            '{} is not a comma-separated list of integers.'.format(value))
+    if not values or min(values) < 1:
+        raise argparse.ArgumentTypeError(
+            '{} must only contain positive integers.'.format(value))
+    return values
+
+
+def parse_list(value):
+    """
+    Parse a comma-separated list of strings.
+
+    :param value: comma-separated list, e.g. prod,eu
+    :type value: str
+    :return: list of non-empty strings
+    :rtype: list
+    """
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+def print_throughput(results):
+    """
+    Print the throughput of each concurrency level.
+
+    :param results: concurrency level and statistics of each level
+    :type results: list
+    :return: None
+    :rtype: None
+    """
+    print '{:>11} {:>10} {:>10} {:>12}'.format(
+        'concurrency', 'seconds', 'requests/s', 'errors/s')
+    for concurrency, stats in results:
+        summary = stats.summary()
+        print '{:>11} {:>10.2f} {:>10.1f} {:>12.1f}'.format(
+            concurrency, summary['elapsed'], summary['requests_per_second'],
+            summary['records_per_second'])
+
+
+def print_projects(results, number=10):
+    """
+    Print the errors delivered by environment and from the projects with the
+    most errors, summed over every concurrency level.
+
+    :param results: concurrency level and statistics of each level
+    :type results: list
+    :param number: number of projects to print
+    :type number: int
+    :return: None
+    :rtype: None
+    """
+    labels = {}
+    for _, stats in results:
+        for label, count in stats.labels.iteritems():
+            labels[label] = labels.get(label, 0) + count
+    if len(labels) < 2:
+        return
+
+    envs = {}
+    for label, count in labels.iteritems():
+        env = get_service_env(label)[1]
+        envs[env] = envs.get(env, 0) + count
+    total = float(sum(labels.itervalues()))
+
+    print '{:<32} {:>12} {:>8}'.format('environment', 'errors', 'share')
+    for env, count in sorted(envs.iteritems(), key=lambda e: -e[1]):
+        print '{:<32} {:>12} {:>7.1%}'.format(env or '-', count, count / total)
+    print '{:<32} {:>12} {:>8}'.format(
+        'project ({} of {})'.format(min(number, len(labels)), len(labels)),
+        'errors', 'share')
+    for label, count in sorted(labels.iteritems(),
+                               key=lambda p: (-p[1], p[0]))[:number]:
+        print '{:<32} {:>12} {:>7.1%}'.format(label, count, count / total)
+
+
+def generate_errors(source, log, service, env, count=None):
+    """
+    Lazily generate processed errors from a raw log.
+
+    Each error is built from a copy of the raw log and processed by the
+    Insight lambda only when it is consumed, so memory use does not depend on
+    count and the first error is available immediately.
+
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param log: raw log the errors are built from
+    :type log: dict
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :param count: number of errors, None for an unbounded number of errors
+    :type count: int
+    :return: generator of processed errors
+    :rtype: generator
+    """
+    if count is None:
+        logs = itertools.repeat(log)
+    else:
+        logs = itertools.repeat(log, count)
+
+    for raw_log in logs:
+        yield simulate_insight_lambda(
+            source, copy.deepcopy(raw_log), service, env)
+
+
+def generate_encoded_errors(template, count=None, times=None):
+    """
+    Lazily generate base64 encoded errors from a template.
+
+    Produces the same encoded errors as encoding the errors of
+    generate_errors, without copying, processing and serialising the log for
+    every error.
+
+    :param template: pre-serialised processed error
+    :type template: ErrorTemplate
+    :param count: number of errors, None for an unbounded number of errors
+    :type count: int
+    :param times: formatted time of each error, replaces count
+    :type times: iterable
+    :return: iterator of base64 encoded errors
+    :rtype: iterator
+    """
+    if times is not None:
+        return itertools.imap(template.encode, times)
+    encoded = template.encode()
+    if count is None:
+        return itertools.repeat(encoded)
+    return itertools.repeat(encoded, count)
+
+
+def replay_errors(filename, source, service, env, speed=1.0, worker=0,
+                  workers=1):
+    """
+    Lazily generate base64 encoded errors from a NDJSON file of raw logs.
+
+    The raw logs are streamed from the file, see read_ndjson, and yielded with
+    the time between them in the original logs divided by speed, see
+    replay_logs. The logs are processed by the batch Insight lambda, see
+    simulate_insight_lambdas.
+
+    :param filename: name of the NDJSON file, optionally gzipped
+    :type filename: str
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param service: service from which the error(s) is sent, defaults to the
+        service of each log
+    :type service: str
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :param speed: factor by which the time between logs is compressed
+    :type speed: float
+    :param worker: index of the worker, which replays every workers-th log
+    :type worker: int
+    :param workers: number of workers
+    :type workers: int
+    :return: generator of base64 encoded errors
+    :rtype: generator
+    """
+    logs = itertools.islice(read_ndjson(filename), worker, None, workers)
+    errors = simulate_insight_lambdas(
+        source, replay_logs(source, logs, speed), service, env)
+    for error in errors:
+        yield encode_error(error)
+
+
+def add_suffix(source, log, suffix):
+    """
+    Append a suffix to the field of a raw log that identifies the error.
+
+    The field is resource for GCP and exception:message for Kinesis.
+
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param log: raw log
+    :type log: dict
+    :param suffix: suffix, e.g. '-<hash>'
+    :type suffix: str
+    :return: None
+    :rtype: None
+    """
+    if source == 'gcp':
+        log['resource'] += suffix
+    elif source == 'kinesis':
+        log['exception']['message'] += suffix
+
+
+def simulate_incoming_errors(errors, url, batch_size=1,
+                             max_bytes=MAX_BATCH_BYTES, concurrency=1,
+                             profile=None, stats=None, retry=None,
+                             controller=None, encoding=None,
+                             level=COMPRESSION_LEVEL):
     """
     Simulate incoming error(s) from GCP or Kinesis.
 
@@ -161,42 +1654,364 @@ def simulate_incoming_errors(errors, url):
         - /api/v1/hubble/incoming_gcp_errors
         - /api/v1/hubble/incoming_errors
 
-    :param errors: list of dicts corresponding to errors
-    :type errors: list
+    Errors are base64 encoded and sent in batches of up to batch_size errors
+    per request, see create_batches. Up to concurrency requests are in flight
+    at any time, sharing a single pool of keep-alive connections. If a rate
+    profile is given, errors are sent at the target rate of the profile until
+    its duration has elapsed. If a controller is given, its rate replaces the
+    target rate of the profile.
+
+    Request bodies are compressed if an encoding is given, see
+    compress_payloads. Requests failing with 429, 5xx or a connection error
+    are retried as specified by retry. The run exits once the retries of a
+    request are exhausted, or on any other non-200 response.
+
+    :param errors: iterable of dicts corresponding to errors, consumed lazily
+    :type errors: iterable
     :param url: url for incoming errors endpoint
     :type url: str
-    :return: None
-    :rtype: None
+    :param batch_size: maximum number of errors per request
+    :type batch_size: int
+    :param max_bytes: maximum size of a request body in bytes
+    :type max_bytes: int
+    :param concurrency: number of requests in flight
+    :type concurrency: int
+    :param profile: target rate over the duration of the run
+    :type profile: RateProfile
+    :param stats: statistics the requests are recorded in
+    :type stats: RunStats
+    :param retry: policy of retrying failed requests, defaults to no retries
+    :type retry: RetryPolicy
+    :param controller: controller adapting the rate to the endpoint
+    :type controller: AimdController
+    :param encoding: content encoding request bodies are compressed with:
+        gzip, deflate, defaults to none
+    :type encoding: str
+    :param level: compression level, 1 (fastest) to 9 (smallest)
+    :type level: int
+    :return: sender used to send the errors
+    :rtype: Sender
+    """
+    encoded = (encode_error(e) for e in errors)
+    return send_errors(encoded, url, batch_size, max_bytes, concurrency,
+                       profile, stats, retry, controller, encoding, level)
+
+
+def send_errors(encoded_errors, url, batch_size=1, max_bytes=MAX_BATCH_BYTES,
+                concurrency=1, profile=None, stats=None, retry=None,
+                controller=None, encoding=None, level=COMPRESSION_LEVEL):
+    """
+    Send base64 encoded errors to an incoming errors endpoint.
+
+    See simulate_incoming_errors.
+
+    :param encoded_errors: iterable of base64 encoded errors, or of (base64
+        encoded error, project) to count the errors delivered by project
+    :type encoded_errors: iterable
+    :param url: url for incoming errors endpoint
+    :type url: str
+    :param batch_size: maximum number of errors per request
+    :type batch_size: int
+    :param max_bytes: maximum size of a request body in bytes
+    :type max_bytes: int
+    :param concurrency: number of requests in flight
+    :type concurrency: int
+    :param profile: target rate over the duration of the run
+    :type profile: RateProfile
+    :param stats: statistics the requests are recorded in
+    :type stats: RunStats
+    :param retry: policy of retrying failed requests, defaults to no retries
+    :type retry: RetryPolicy
+    :param controller: controller adapting the rate to the endpoint
+    :type controller: AimdController
+    :param encoding: content encoding request bodies are compressed with:
+        gzip, deflate, defaults to none
+    :type encoding: str
+    :param level: compression level, 1 (fastest) to 9 (smallest)
+    :type level: int
+    :return: sender used to send the errors
+    :rtype: Sender
     """
     headers = {
         'Content-Type': 'application/json'
     }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    cookies = get_cookies()
+
+    payloads = create_payloads(encoded_errors, batch_size, max_bytes)
+    if encoding:
+        stats = stats or RunStats()
+        payloads = compress_payloads(payloads, encoding, level, stats)
+    if profile:
+        payloads = pace(payloads, profile,
+                        controller.current_rate if controller else None)
+
+    sender = Sender(url, concurrency, headers, cookies, stats=stats,
+                    retry=retry, controller=controller)
+    sender.send(payloads)
+
+    print format_summary(
+        sender.stats.summary(),
+        'Incoming errors (concurrency {}):'.format(concurrency), 'errors')
+
+    if controller:
+        print 'Adaptive rate: {:.1f} errors/s sustained, {} decreases.'.\
+            format(controller.sustainable_rate(), controller.decreases)
+
+    if sender.failed and controller:
+        print 'Failed at a target rate of {:.1f} errors/s.'.format(
+            controller.rate)
+    elif sender.failed and profile:
+        print 'Failed at a target rate of {:.1f} errors/s.'.format(
+            profile.rate_at(sender.failed_at - profile.started))
+
+    if sender.exception:
+        raise sender.exception
+    elif sender.status_code == 403:
+        print 'Error! 403 Forbidden.'
+        sys.exit(1)
+    elif sender.status_code:
+        print 'Error! {}'.format(sender.status_code)
+        sys.exit(1)
 
-    cookies = {
-        'dev_appserver_login': COOKIE_LOCAL,
-        'SACSID': COOKIE_STAGING
-    }
+    print 'Success!'
+    return sender
 
-    for e in errors:
-        data = json.dumps({'data': [base64.b64encode(json.dumps(e))]})
 
-        response = requests.post(
-            url, headers=headers, data=data, cookies=cookies)
+def publish_logs(messages, project, topic, batch_size=1,
+                 max_bytes=MAX_BATCH_BYTES, max_latency=MAX_BATCH_LATENCY,
+                 concurrency=1, profile=None, stats=None):
+    """
+    Publish raw GCP logs to a Pub/Sub topic.
+
+    This is the path the logs of a GCP project take through its log sink,
+    and Insight's push subscription, instead of the incoming errors
+    endpoint. The publisher batches up to batch_size messages, or max_bytes
+    bytes, waiting at most max_latency seconds, with up to concurrency
+    batches waiting to be published.
+
+    :param messages: iterable of (raw log data, 1), see generate_messages
+    :type messages: iterable
+    :param project: project of the topic
+    :type project: str
+    :param topic: topic the logs are published to
+    :type topic: str
+    :param batch_size: maximum number of messages per batch
+    :type batch_size: int
+    :param max_bytes: maximum size of a batch in bytes
+    :type max_bytes: int
+    :param max_latency: maximum seconds a message waits for its batch
+    :type max_latency: float
+    :param concurrency: number of batches waiting to be published
+    :type concurrency: int
+    :param profile: target rate over the duration of the run
+    :type profile: RateProfile
+    :param stats: statistics the messages are recorded in
+    :type stats: RunStats
+    :return: None
+    :rtype: None
+    """
+    stats = stats or RunStats()
+    publisher = create_publisher(batch_size, max_bytes, max_latency)
+    topic_path = publisher.topic_path(project, topic)
+    ensure_topic(publisher, topic_path)
 
-        if response.status_code == 200:
-            continue
-        elif response.status_code == 403:
-            print 'Error! 403 Forbidden.'
-            sys.exit(1)
+    if profile:
+        messages = pace(messages, profile)
+    exception = publish_messages(publisher, topic_path, messages,
+                                 concurrency * batch_size, stats)
+
+    print format_summary(
+        stats.summary(),
+        'Published logs (concurrency {}):'.format(concurrency), 'logs')
+
+    if exception:
+        raise exception
+
+    print 'Success!'
+
+
+def generate_partitioned_logs(workload, get_log, partition_key='random',
+                              count=None, random_seed=None):
+    """
+    Lazily generate raw Kinesis logs of a workload, and their partition keys.
+
+    The raw log of each project and fingerprint is created and serialised
+    the first time it is drawn, with the project as its service and the
+    fingerprint appended to its identifier, see set_raw_service.
+
+    :param workload: mix of fingerprints, services and environments
+    :type workload: Workload | ProjectMix
+    :param get_log: function returning a new raw log for a given service
+    :type get_log: function
+    :param partition_key: partition key of each log: random, project, fixed
+    :type partition_key: str
+    :param count: number of logs, None for an unbounded number of logs
+    :type count: int
+    :param random_seed: seed of the random partition keys
+    :type random_seed: str
+    :return: generator of (partition key, raw log data)
+    :rtype: generator
+    """
+    random_ = random.Random(random_seed)
+    logs = {}
+    for service, env, fingerprint in workload.samples(count):
+        project = get_project(service, env)
+        data = logs.get((project, fingerprint))
+        if data is None:
+            log = get_log(service)
+            set_raw_service(log, project)
+            if fingerprint:
+                add_suffix('kinesis', log, fingerprint)
+            data = logs[(project, fingerprint)] = json.dumps(log)
+        if partition_key == 'random':
+            key = '{:032x}'.format(random_.getrandbits(128))
+        elif partition_key == 'project':
+            key = project
         else:
-            print 'Error! {}'.format(response.status_code)
-            sys.exit(1)
+            key = FIXED_PARTITION_KEY
+        yield key, data
+
+
+def set_raw_service(log, service):
+    """
+    Set the service of a raw Kinesis log, metadata:app_name for a log of
+    App Intelligence.
+
+    :param log: raw Kinesis error log
+    :type log: dict
+    :param service: service, e.g. Cerberus-prod
+    :type service: str
+    :return: None
+    :rtype: None
+    """
+    if (log.get('service') or {}).get('name') == FRONTEND_SERVICE:
+        log.setdefault('metadata', {})['app_name'] = service
+    else:
+        log['service'] = {'name': service}
+
+
+def produce_errors(logs, url, shards, max_record_bytes=MAX_RECORD_BYTES,
+                   records_per_invocation=100, batch_size=1,
+                   max_bytes=MAX_BATCH_BYTES, stats=None, retry=None):
+    """
+    Put raw Kinesis logs to simulated shards, and deliver each shard through
+    a simulated lambda to the incoming errors endpoint.
+
+    Logs are assigned to shards by the md5 hash of their partition key and
+    aggregated into records of up to max_record_bytes, see
+    ShardedProducer. The lambda of each shard deaggregates and processes the
+    records of an invocation, and sends the errors in batches of up to
+    batch_size, one request at a time, as the records of a shard are
+    processed in order. A hot shard therefore delivers its logs alone after
+    the other shards are done. The errors delivered are counted by service.
+
+    :param logs: iterable of (partition key, raw log data), see
+        generate_partitioned_logs
+    :type logs: iterable
+    :param url: url for incoming errors endpoint
+    :type url: str
+    :param shards: number of shards
+    :type shards: int
+    :param max_record_bytes: maximum size of an aggregated record in bytes
+    :type max_record_bytes: int
+    :param records_per_invocation: maximum number of records per invocation
+    :type records_per_invocation: int
+    :param batch_size: maximum number of errors per request
+    :type batch_size: int
+    :param max_bytes: maximum size of a request body in bytes
+    :type max_bytes: int
+    :param stats: statistics the requests of every shard are recorded in
+    :type stats: RunStats
+    :param retry: policy of retrying failed requests, defaults to no retries
+    :type retry: RetryPolicy
+    :return: producer, with the logs, records and bytes of each shard
+    :rtype: ShardedProducer
+    """
+    headers = {
+        'Content-Type': 'application/json'
+    }
+    stats = stats or RunStats()
+    producer = ShardedProducer(shards, max_record_bytes)
+    session = HttpClient(shards, get_cookies())
+    senders = [Sender(url, 1, headers, session=session, stats=RunStats(),
+                      retry=retry)
+               for _ in range(shards)]
+
+    def invoke_lambda(invocations):
+        for records in invocations:
+            raw_logs = (json.loads(data) for record in records
+                        for _, data in deaggregate(record.data))
+            encoded_errors = ((encode_error(error), error['service'])
+                              for error in simulate_insight_kinesis_lambdas(
+                                  raw_logs, '', ''))
+            for payload in create_payloads(encoded_errors, batch_size,
+                                           max_bytes):
+                yield payload
+
+    stats.start()
+    try:
+        deliver(producer, logs, senders, invoke_lambda,
+                records_per_invocation)
+    finally:
+        stats.stop()
+        for sender in senders:
+            stats.merge(sender.stats)
+
+    print format_summary(stats.summary(), 'Incoming errors ({} shards):'.
+                         format(shards), 'errors')
+    print_shards(producer, senders)
+
+    failed = [sender for sender in senders if sender.failed]
+    if failed and failed[0].exception:
+        raise failed[0].exception
+    elif failed:
+        print 'Error! {}'.format(failed[0].status_code)
+        sys.exit(1)
 
     print 'Success!'
-    time.sleep(1)
+    return producer
+
+
+def print_shards(producer, senders):
+    """
+    Print the logs, records and bytes put to each shard, how long its lambda
+    took to deliver them, and the skew of the shards.
+
+    :param producer: producer
+    :type producer: ShardedProducer
+    :param senders: sender of each shard
+    :type senders: list
+    :return: None
+    :rtype: None
+    """
+    print '{:>6} {:>10} {:>8} {:>12} {:>12} {:>9}'.format(
+        'shard', 'logs', 'records', 'bytes', 'logs/record', 'seconds')
+    for shard, (counts, sender) in enumerate(
+            zip(producer.shard_counts, senders)):
+        print '{:>6} {:>10} {:>8} {:>12} {:>12.1f} {:>9.2f}'.format(
+            shard, counts['logs'], counts['records'], counts['bytes'],
+            float(counts['logs']) / counts['records']
+            if counts['records'] else 0.0, sender.elapsed)
+    print 'Shard skew: {:.2f}x the mean logs per shard.'.format(
+        producer.skew())
+
+
+def encode_error(error):
+    """
+    Encode an error as expected by the incoming errors endpoints.
 
+    :param error: processed error
+    :type error: dict
+    :return: base64 encoded JSON representation of the error
+    :rtype: str
+    """
+    return base64.b64encode(json.dumps(error))
 
-def simulate_process_errors(env, source, url):
+
+def simulate_process_errors(env, source, url, stats=None, clock=None):
     """
     Simulate process error(s).
 
@@ -204,20 +2019,130 @@ def simulate_process_errors(env, source, url):
         - /cron/create_tasks_to_process_errors
 
     :param env: environment from which the error(s) is sent:
-        prod, eu, demo, sandbox, wk-dev, or eu
+        prod, eu, demo, sandbox, or wk-dev
     :type env: str
     :param source: source from which the error(s) is sent:
         gcp, kinesis
     :type source: str
     :param url: url for process errors endpoint
     :type url: str
+    :param stats: statistics the request is recorded in
+    :type stats: RunStats
+    :param clock: clock the errors are processed around the time of,
+        defaults to the wall clock
+    :type clock: Clock
     :return: None
     :rtype: None
     """
-    utc = datetime.datetime.utcnow()
+    utc = (clock or Clock()).utcnow()
     start_time = utc - datetime.timedelta(seconds=60)
     end_time = utc + datetime.timedelta(seconds=60)
-    form_data = {
+
+    client = HttpClient(1, get_cookies())
+    if stats:
+        client.add_timer(stats.time_request)
+        stats.start()
+    response = post_process_errors(
+        env, source, url, start_time, end_time, client)
+    if stats:
+        stats.stop()
+        print format_summary(stats.summary(), 'Process errors:')
+
+    check_process_errors_response(response)
+
+
+def process_windows(env, source, url, windows, stats=None):
+    """
+    Process the errors of consecutive windows of time, in order.
+
+    Processing the windows of a backfill in order lets Insight see errors
+    resurface in later windows.
+
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param url: url for process errors endpoint
+    :type url: str
+    :param windows: (start, end) of each window, see get_windows
+    :type windows: list
+    :param stats: statistics the requests are recorded in
+    :type stats: RunStats
+    :return: None
+    :rtype: None
+    """
+    stats = stats or RunStats()
+    client = HttpClient(1, get_cookies())
+    client.add_timer(stats.time_request)
+    response = None
+    stats.start()
+    try:
+        for start_time, end_time in windows:
+            response = post_process_errors(
+                env, source, url, start_time, end_time, client)
+            if response.status_code != 200:
+                break
+    finally:
+        stats.stop()
+
+    print format_summary(
+        stats.summary(), 'Process errors ({} windows):'.format(len(windows)))
+    if response is not None:
+        check_process_errors_response(response)
+
+
+def post_process_errors(env, source, url, start_time, end_time,
+                        client=None):
+    """
+    Request the errors of a window of time to be processed.
+
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param url: url for process errors endpoint
+    :type url: str
+    :param start_time: start of the window, in UTC
+    :type start_time: datetime.datetime
+    :param end_time: end of the window, in UTC
+    :type end_time: datetime.datetime
+    :param client: client the request is sent with, defaults to a new one
+    :type client: HttpClient
+    :return: response
+    :rtype: requests.Response
+    """
+    form_data = create_process_form(env, source, start_time, end_time)
+
+    headers = {
+        'X-AppEngine-QueueName': 'yes'
+    }
+
+    client = client or HttpClient(1, get_cookies())
+    return client.post(url, headers=headers, data=form_data)
+
+
+def create_process_form(env, source, start_time, end_time):
+    """
+    Create the form data of a request to process the errors of a window.
+
+    :param env: environment from which the error(s) is sent, None for every
+        environment
+    :type env: str
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param start_time: start of the window, in UTC
+    :type start_time: datetime.datetime
+    :param end_time: end of the window, in UTC
+    :type end_time: datetime.datetime
+    :return: form data
+    :rtype: dict
+    """
+    return {
         'start_time': start_time.strftime(TIME_FORMAT_NO_MICRO_SEC),
         'end_time': end_time.strftime(TIME_FORMAT_NO_MICRO_SEC),
         'env': env or None,
@@ -225,18 +2150,156 @@ def simulate_process_errors(env, source, url):
         'should_check_lock': 'True'
     }
 
-    headers = {
-        'X-AppEngine-QueueName': 'yes'
-    }
 
-    cookies = {
-        'dev_appserver_login': COOKIE_LOCAL,
-        'SACSID': COOKIE_STAGING
-    }
+def sweep_process_errors(args, base_url, service, env, windows,
+                         process_stats, latency_stats, clock=None, tick=0):
+    """
+    Process the errors of every window, environment and source concurrently,
+    and measure the end-to-end latency of probe errors.
+
+    A probe is a new error sent for each environment and source. Every
+    window, plus the current one which holds the probes, is processed for
+    every environment and source with --concurrency requests in flight.
+    Each probe is then polled for until it is processed. On staging, errors
+    are processed by Insight itself, so the probes are only polled for.
+
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :param base_url: base url of Insight
+    :type base_url: str
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent
+    :type env: str
+    :param windows: (start, end) of the windows to process, in UTC
+    :type windows: list
+    :param process_stats: statistics the process errors requests are
+        recorded in
+    :type process_stats: RunStats
+    :param latency_stats: statistics the latency of each probe is recorded in
+    :type latency_stats: RunStats
+    :param clock: clock the probes are dated and the current window is
+        read from, defaults to the wall clock
+    :type clock: Clock
+    :param tick: index of the tick of the run, see --ticks
+    :type tick: int
+    :return: None
+    :rtype: None
+    """
+    clock = clock or Clock()
+    sources = args.sweep_sources or [args.source]
+    if args.envs:
+        envs = args.envs
+    elif env:
+        envs = [env]
+    else:
+        envs = get_envs()
+    concurrency = max(args.concurrency)
+
+    cookies = get_cookies()
 
-    response = requests.post(
-        url, headers=headers, data=form_data, cookies=cookies)
+    probes = send_probes(base_url, service, sources, envs, args.probes,
+                         get_tick_seed(args.seed, tick), cookies, clock)
 
+    if not args.staging:
+        utc = clock.utcnow()
+        windows = list(windows) + [(utc - datetime.timedelta(seconds=60),
+                                    utc + datetime.timedelta(seconds=60))]
+        forms = [create_process_form(e, s, start_time, end_time)
+                 for s in sources for e in envs
+                 for start_time, end_time in windows]
+        sender = process_concurrently(
+            create_url(base_url, '/tasks/process_errors'), forms,
+            concurrency, cookies, process_stats)
+        print format_summary(
+            process_stats.summary(),
+            'Process errors ({} windows, {} environments, {} sources):'.
+            format(len(windows), len(envs), len(sources)))
+        if sender.exception:
+            raise sender.exception
+        elif sender.status_code:
+            check_process_errors_response(sender)
+
+    try:
+        found = poll_probes(
+            create_url(base_url, args.processed_errors_path), probes,
+            args.poll_timeout, args.poll_interval, concurrency, cookies,
+            latency_stats)
+    except requests.HTTPError as e:
+        print 'Error! {} Check --processed-errors-path.'.format(e)
+        sys.exit(1)
+
+    # the latencies of every tick are summed up, timeouts are not recorded
+    latency = latency_stats.summary()['latency_ms']
+    if latency['max'] is not None:
+        print 'End-to-end latency (ms): p50 {:.2f} p90 {:.2f} p99 {:.2f} ' \
+            'max {:.2f}'.format(latency['p50'], latency['p90'],
+                                latency['p99'], latency['max'])
+    if found < len(probes):
+        print 'Error! {} of {} probes were not processed within {}s.'.format(
+            len(probes) - found, len(probes), args.poll_timeout)
+        sys.exit(1)
+    print 'Success!'
+
+
+def send_probes(base_url, service, sources, envs, number, seed,
+                cookies=None, clock=None):
+    """
+    Send new errors to measure the time until they are processed.
+
+    :param base_url: base url of Insight
+    :type base_url: str
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param sources: sources the probes are sent from
+    :type sources: list
+    :param envs: environments the probes are sent from
+    :type envs: list
+    :param number: number of probes per environment and source
+    :type number: int
+    :param seed: seed of the identifiers of the probes
+    :type seed: str
+    :param cookies: cookies sent with every request
+    :type cookies: dict
+    :param clock: clock the probes are dated by, defaults to the wall clock
+    :type clock: Clock
+    :return: probes
+    :rtype: list
+    """
+    clock = clock or Clock()
+    headers = {
+        'Content-Type': 'application/json'
+    }
+    session = HttpClient(1, cookies)
+
+    probes = []
+    for source in sources:
+        if source == 'gcp':
+            url = create_url(base_url, INCOMING_GCP_ERRORS)
+        else:
+            url = create_url(base_url, INCOMING_KINESIS_ERRORS)
+        for env in envs:
+            for index in range(number):
+                log = populate_default_log(
+                    source, clock.utcnow(), service or 'service')
+                hash = hashlib.sha256(
+                    '{}-{}-{}-{}'.format(seed, source, env, index))
+                add_suffix(source, log, '{}{}'.format(
+                    '-probe-', hash.hexdigest()[0:7]))
+                error = simulate_insight_lambda(source, log, service, env)
+                response = session.post(url, headers=headers, data=json.dumps(
+                    {'data': [encode_error(error)]}))
+                if response.status_code != 200:
+                    print 'Error! Probe failed with {}.'.format(
+                        response.status_code)
+                    sys.exit(1)
+                probes.append(Probe(
+                    source, env, get_field(error, IDENTIFIER_FIELD[source]),
+                    time.time()))
+    return probes
+
+
+def check_process_errors_response(response):
     if response.status_code == 200:
         print 'Success!'
     elif response.status_code == 403:
@@ -259,7 +2322,7 @@ def simulate_insight_lambda(source, log, service, env):
     :param service: service from which the error(s) is sent
     :type service: str
     :param env: environment from which the error(s) is sent:
-        prod, eu, demo, sandbox, wk-dev, or eu
+        prod, eu, demo, sandbox, or wk-dev
     :type env: str
     :return: processed log
     :rtype: dict
@@ -332,7 +2395,7 @@ def simulate_insight_kinesis_lambda(log, service, env):
     :param service: service from which the error(s) is sent
     :type service: str
     :param env: environment from which the error(s) is sent:
-        prod, eu, demo, sandbox, wk-dev, or eu
+        prod, eu, demo, sandbox, or wk-dev
     :type env: str
     :return: processed, Kinesis error log
     :rtype: dict
@@ -388,6 +2451,111 @@ def simulate_insight_kinesis_lambda(log, service, env):
         raise ValueError('Log does not contain a service.')
 
 
+def simulate_insight_lambdas(source, logs, service, env):
+    """
+    Process raw GCP or Kinesis error logs, see simulate_insight_lambda.
+
+    :param source: source from which the error(s) is sent:
+        gcp, kinesis
+    :type source: str
+    :param logs: iterable of raw logs
+    :type logs: iterable
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :return: generator of processed logs
+    :rtype: generator
+    """
+    if source == 'gcp':
+        return simulate_insight_gcp_lambdas(logs, service)
+    elif source == 'kinesis':
+        return simulate_insight_kinesis_lambdas(logs, service, env)
+
+
+def simulate_insight_gcp_lambdas(logs, service):
+    """
+    Process raw GCP error logs, see simulate_insight_gcp_lambda.
+
+    :param logs: iterable of raw GCP error logs
+    :type logs: iterable
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :return: generator of processed, GCP error logs
+    :rtype: generator
+    """
+    service_app_id = '{}{}'.format('s~', service) if service else None
+
+    for log in logs:
+        get = log.get
+        yield {
+            '_time': get('endTime'),
+            'appId': service_app_id or get('appId'),
+            'resource': get('resource'),
+            'latency': get('latency'),
+            'stack': '',
+            'versionId': get('versionId'),
+        }
+
+
+def simulate_insight_kinesis_lambdas(logs, service, env):
+    """
+    Process raw Kinesis error logs, see simulate_insight_kinesis_lambda.
+
+    Timestamps are converted by format_kinesis_time instead of being parsed
+    with datetime.strptime.
+
+    :param logs: iterable of raw Kinesis error logs
+    :type logs: iterable
+    :param service: service from which the error(s) is sent
+    :type service: str
+    :param env: environment from which the error(s) is sent:
+        prod, eu, demo, sandbox, or wk-dev
+    :type env: str
+    :return: generator of processed, Kinesis error logs
+    :rtype: generator
+    """
+    env_suffix = '-{}'.format(env) if env else ''
+
+    for log in logs:
+        get = log.get
+        metadata = get('metadata', {})
+        source = ''
+
+        if service:
+            log_service = service
+        else:
+            log_service = get('service', {}).get('name') or ''
+            if 'app-int-collection-gateway' in log_service:
+                log_service = metadata.get('app_name', log_service)
+                source = 'client'
+
+        if env_suffix:
+            log_service = '{}{}'.format(log_service, env_suffix)
+        if not log_service:
+            raise ValueError('Log does not contain a service.')
+
+        error = {
+            'context': get('context', {}),
+            'exception': get('exception', {}),
+            'level': get('level', 'info'),
+            'message': get('message', ''),
+            'metadata': metadata,
+            'service': log_service,
+            'time': format_kinesis_time(get('timestamp'))
+        }
+
+        if source:
+            error['source'] = source
+
+        version_name = get('container', {}).get('name')
+        if version_name:
+            error['version'] = version_name
+
+        yield error
+
+
 def populate_default_log(source, time, service, is_frontend=False):
     """
     Populate a default, raw error log using a given time and service.
@@ -543,20 +2711,45 @@ def get_service_env(service):
         Cerberus-prod => 'Cerberus' 'prod'
 
     Service environment can be:
-        prod, eu, demo, sandbox, wk-dev, or eu
+        prod, eu, demo, sandbox, or wk-dev
 
     If the service does not have an environment appended onto its name, an em-
-    pty string is returned.
+    pty string is returned. Only an environment at the end of the name is
+    matched, e.g. service-production has no environment. Results are
+    memoised, for up to MAX_SERVICE_ENVS names.
 
     :param service: name of the service with environment
     :type service: str
-    :return: service, environment (prod, eu, demo, sandbox, wk-dev, or eu)
+    :return: service, environment (prod, eu, demo, sandbox, or wk-dev)
     :rtype: str, str
     """
-    for suffix in SERVICE_SUFFIX:
-        if suffix in service:
-            return service.rsplit(suffix, 1)[0], suffix[1:]
-    return service, ''
+    try:
+        return _service_envs[service]
+    except KeyError:
+        pass
+
+    match = SERVICE_ENV.match(service)
+    if match:
+        service_env = match.group(1), match.group(2)[1:]
+    else:
+        service_env = service, ''
+    if len(_service_envs) >= MAX_SERVICE_ENVS:
+        _service_envs.clear()
+    _service_envs[service] = service_env
+    return service_env
+
+
+def get_service_envs(services):
+    """
+    Return the service and environment of a number of services, see
+    get_service_env.
+
+    :param services: names of services with environments
+    :type services: iterable
+    :return: (service, environment) of each service
+    :rtype: list
+    """
+    return [get_service_env(service) for service in services]
 
 
 def open_json_file(filename):
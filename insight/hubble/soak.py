@@ -0,0 +1,273 @@
+import json
+import os
+import resource
+import threading
+
+from stats import RunStats, write_report
+
+# default seconds between the checkpoints of a soak test
+CHECKPOINT_INTERVAL = 60
+
+# version of the format of checkpoints, see Checkpointer.checkpoint
+CHECKPOINT_VERSION = 1
+
+# arguments a resumed soak test may change, every other argument must match
+# the checkpoint's
+RESUMABLE_ARGS = ['checkpoint_interval', 'report', 'resume', 'seed']
+
+
+def get_rss():
+    """
+    Return the resident set size of the process.
+
+    Where /proc is not available, e.g. on macOS, the peak resident set size
+    is returned instead.
+
+    :return: resident set size in bytes
+    :rtype: int
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # ru_maxrss is in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def get_cpu_seconds():
+    """
+    Return the processor time used by the process, in user and system mode,
+    by all of its threads.
+
+    :return: processor seconds
+    :rtype: float
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def get_rss_growth(samples):
+    """
+    Return the growth of the resident set size over samples, the slope of a
+    least squares fit, which a generator that does not leak keeps near 0.
+
+    :param samples: samples of a single process, see Checkpointer.sample
+    :type samples: list
+    :return: growth in bytes per hour, None if there are less than 2 samples
+    :rtype: float
+    """
+    if len(samples) < 2:
+        return None
+    times = [s['elapsed'] for s in samples]
+    sizes = [s['rss_bytes'] for s in samples]
+    mean_time = sum(times) / len(times)
+    mean_size = float(sum(sizes)) / len(sizes)
+    variance = sum((t - mean_time) ** 2 for t in times)
+    if not variance:
+        return None
+    covariance = sum((t - mean_time) * (r - mean_size)
+                     for t, r in zip(times, sizes))
+    return covariance / variance * 3600
+
+
+def read_checkpoint(filename):
+    """
+    Read the checkpoint of a soak test.
+
+    :param filename: name of the JSON file
+    :type filename: str
+    :return: checkpoint
+    :rtype: dict
+    """
+    with open(filename) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError('{} is not a checkpoint of version {}.'.format(
+            filename, CHECKPOINT_VERSION))
+    return checkpoint
+
+
+def write_checkpoint(checkpoint, filename):
+    """
+    Write the checkpoint of a soak test.
+
+    The checkpoint is written to a temporary file first, which replaces the
+    last checkpoint, so that a run killed while writing does not corrupt it.
+
+    :param checkpoint: checkpoint
+    :type checkpoint: dict
+    :param filename: name of the JSON file
+    :type filename: str
+    :return: None
+    :rtype: None
+    """
+    temporary = filename + '.tmp'
+    write_report(checkpoint, temporary)
+    os.rename(temporary, filename)
+
+
+def check_args(saved, args):
+    """
+    Check the arguments of a run match the arguments of the checkpoint it
+    resumes.
+
+    :param saved: arguments of the checkpoint
+    :type saved: dict
+    :param args: command line arguments of the run
+    :type args: argparse.Namespace
+    :return: None
+    :rtype: None
+    """
+    current = json.loads(json.dumps(vars(args)))
+    changed = sorted(key for key in set(saved) | set(current)
+                     if key not in RESUMABLE_ARGS and
+                     saved.get(key) != current.get(key))
+    if changed:
+        raise ValueError(
+            'Cannot resume a soak test with different arguments: {}.'.format(
+                ', '.join(key.replace('_', '-') for key in changed)))
+
+
+class Checkpointer(object):
+    """
+    Checkpoint a soak test to disk every interval seconds, so that it can be
+    resumed from its last checkpoint once it exits.
+
+    A checkpoint holds the arguments of the run, the cumulative statistics
+    of the errors sent, including their latency histogram, and samples of
+    the resident set size and processor time of each process that ran, to
+    show whether memory grows over a long run.
+
+    Errors in flight when a run exits are not counted, so a resumed run
+    sends at least the errors its checkpoint had not.
+    """
+
+    def __init__(self, filename, args, interval=CHECKPOINT_INTERVAL):
+        """
+        :param filename: name of the JSON file checkpoints are written to
+        :type filename: str
+        :param args: command line arguments of the run
+        :type args: argparse.Namespace
+        :param interval: seconds between checkpoints
+        :type interval: float
+        """
+        self.filename = filename
+        self.args = args
+        self.interval = interval
+        self.stats = RunStats()
+        self.samples = []
+        self.resumes = 0
+        self.complete = False
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def resume(self):
+        """
+        Resume the statistics and samples of the last checkpoint.
+
+        The seed of the checkpoint is used unless the run sets one, so that
+        new errors keep their suffix.
+
+        :return: None
+        :rtype: None
+        """
+        checkpoint = read_checkpoint(self.filename)
+        check_args(checkpoint['args'], self.args)
+        if self.args.seed is None:
+            self.args.seed = checkpoint['args']['seed']
+        self.stats = RunStats.from_dict(checkpoint['stats'])
+        self.samples = checkpoint['samples']
+        self.resumes = checkpoint['resumes'] + 1
+        self.complete = checkpoint['complete']
+
+    def sample(self):
+        """
+        Sample the progress and resource usage of the run.
+
+        :return: sample
+        :rtype: dict
+        """
+        sample = {
+            'run': self.resumes,
+            'elapsed': self.stats.get_elapsed(),
+            'records': self.stats.records,
+            'rss_bytes': get_rss(),
+            'cpu_seconds': get_cpu_seconds()
+        }
+        self.samples.append(sample)
+        return sample
+
+    def checkpoint(self):
+        """
+        Sample the run and write a checkpoint.
+
+        :return: None
+        :rtype: None
+        """
+        self.sample()
+        write_checkpoint({
+            'version': CHECKPOINT_VERSION,
+            'args': vars(self.args),
+            'stats': self.stats.to_dict(),
+            'samples': self.samples,
+            'resumes': self.resumes,
+            'complete': self.complete
+        }, self.filename)
+
+    def start(self):
+        """
+        Start checkpointing every interval seconds, in a daemon thread.
+
+        :return: None
+        :rtype: None
+        """
+        self.sample()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, complete=False):
+        """
+        Stop checkpointing, and write a last checkpoint.
+
+        :param complete: True if the run is complete, and must not be
+            resumed
+        :type complete: bool
+        :return: None
+        :rtype: None
+        """
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.complete = complete
+        self.checkpoint()
+        print self.format_resources()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.checkpoint()
+            print self.format_resources('Checkpoint')
+
+    def format_resources(self, title='Soak test'):
+        """
+        Format the progress and resource usage of the run, since its process
+        started, as human-readable text.
+
+        :param title: title of the run
+        :type title: str
+        :return: progress and resource usage as text
+        :rtype: str
+        """
+        samples = [s for s in self.samples if s['run'] == self.resumes]
+        first, last = samples[0], samples[-1]
+        elapsed = last['elapsed'] - first['elapsed']
+        cpu = last['cpu_seconds'] - first['cpu_seconds']
+        records = last['records'] - first['records']
+        growth = get_rss_growth(samples)
+        return '{}: {} errors in {:.0f}s, RSS {:.1f} MB ({} MB/h), CPU ' \
+            '{:.1f}% ({} ms/1000 errors)'.format(
+                title, last['records'], last['elapsed'],
+                last['rss_bytes'] / 1e6,
+                '-' if growth is None else '{:+.2f}'.format(growth / 1e6),
+                100 * cpu / elapsed if elapsed else 0.0,
+                '{:.2f}'.format(1e6 * cpu / records) if records else '-')
@@ -0,0 +1,480 @@
+"""
+usage: stub_server.py [-h] [--host HOST] [-p PORT] [-l LATENCY] [-j JITTER]
+                      [-e ERROR_RATE] [--error-status ERROR_STATUS]
+                      [-d PROCESS_DELAY] [-i INTERVAL]
+
+Serve a local stand-in for the Hubble and Apollo ingestion endpoints.
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --host HOST           host to listen on
+  -p PORT, --port PORT  port to listen on
+  -l LATENCY, --latency LATENCY
+                        latency added to every request in milliseconds
+  -j JITTER, --jitter JITTER
+                        random latency of up to JITTER milliseconds added to
+                        every request
+  -e ERROR_RATE, --error-rate ERROR_RATE
+                        fraction of requests answered with --error-status
+  --error-status ERROR_STATUS
+                        status code of injected errors
+  -d PROCESS_DELAY, --process-delay PROCESS_DELAY
+                        seconds until errors are processed after a request to
+                        process them
+  -i INTERVAL, --interval INTERVAL
+                        seconds between reports of the records received, 0
+                        disables them
+"""
+
+import BaseHTTPServer
+import SocketServer
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urlparse
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import (
+    INCOMING_GCP_ERRORS, INCOMING_KINESIS_ERRORS, INCOMING_LOGS,
+    PROCESSED_ERRORS)
+from template import IDENTIFIER_FIELD, get_field
+
+PROCESS_ERRORS = '/tasks/process_errors'
+STATS = '/stats'
+
+# keys of processed errors, see simulate_insight_gcp_lambda and
+# simulate_insight_kinesis_lambda
+GCP_ERROR_KEYS = set(['_time', 'appId', 'latency', 'resource', 'stack',
+                      'versionId'])
+KINESIS_ERROR_KEYS = set(['context', 'exception', 'level', 'message',
+                          'metadata', 'service', 'time'])
+# keys of logs, see simulate_log.create_log
+APOLLO_LOG_KEYS = set(['level', 'message', 'service', 'timestamp'])
+
+SOURCES = {
+    INCOMING_GCP_ERRORS: 'gcp',
+    INCOMING_KINESIS_ERRORS: 'kinesis',
+    INCOMING_LOGS: 'apollo'
+}
+
+ERROR_KEYS = {
+    'gcp': GCP_ERROR_KEYS,
+    'kinesis': KINESIS_ERROR_KEYS,
+    'apollo': APOLLO_LOG_KEYS
+}
+
+
+def parse_args():
+    # configure command line argument parser
+    parser = argparse.ArgumentParser(
+        description='Serve a local stand-in for the Hubble and Apollo '
+                    'ingestion endpoints.')
+
+    # specify the host and port to listen on
+    parser.add_argument('--host', default='localhost',
+                        help='host to listen on')
+    parser.add_argument('-p', '--port', type=int, default=8080,
+                        help='port to listen on')
+
+    # specify the latency added to every request
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+                        help='latency added to every request in milliseconds')
+    parser.add_argument('-j', '--jitter', type=float, default=0.0,
+                        help='random latency of up to JITTER milliseconds '
+                             'added to every request')
+
+    # specify the errors injected into the responses
+    parser.add_argument('-e', '--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with '
+                             '--error-status')
+    parser.add_argument('--error-status', type=int, default=500,
+                        help='status code of injected errors')
+
+    # specify how long processing errors takes
+    parser.add_argument('-d', '--process-delay', type=float, default=0.0,
+                        help='seconds until errors are processed after a '
+                             'request to process them')
+
+    # specify how often the records received are reported
+    parser.add_argument('-i', '--interval', type=float, default=10.0,
+                        help='seconds between reports of the records '
+                             'received, 0 disables them')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    server = StubServer((args.host, args.port), args.latency, args.jitter,
+                        args.error_rate, args.error_status,
+                        args.process_delay)
+    print 'Listening on http://{}:{}'.format(*server.server_address)
+
+    if args.interval:
+        thread = threading.Thread(
+            target=report_periodically, args=(server, args.interval))
+        thread.daemon = True
+        thread.start()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print json.dumps(server.get_stats(), indent=2, sort_keys=True,
+                         separators=(',', ': '))
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Local stand-in for the Hubble and Apollo ingestion endpoints.
+
+    Incoming errors are decompressed if the body has a Content-Encoding of
+    gzip or deflate, decoded and validated against the shape of processed
+    errors, and counted per endpoint, bytes as received. Requests to process
+    errors are counted per source and environment. GET /stats returns the
+    counters as JSON.
+
+    The identifiers of incoming errors are kept until a request to process
+    the errors of their source, after which GET PROCESSED_ERRORS finds them.
+    Every distinct identifier is kept, so runs with an unbounded number of
+    new errors grow the memory of the server.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address, latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_status=500, process_delay=0.0):
+        """
+        :param server_address: host and port to listen on
+        :type server_address: tuple
+        :param latency: latency added to every request in milliseconds
+        :type latency: float
+        :param jitter: random latency of up to jitter milliseconds added to
+            every request
+        :type jitter: float
+        :param error_rate: fraction of requests answered with error_status
+        :type error_rate: float
+        :param error_status: status code of injected errors
+        :type error_status: int
+        :param process_delay: seconds until errors are processed after a
+            request to process them
+        :type process_delay: float
+        """
+        BaseHTTPServer.HTTPServer.__init__(
+            self, server_address, StubRequestHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.process_delay = process_delay
+        self.started = time.time()
+        self.endpoints = {}
+        self.process_errors = {}
+        self.rejected = 0
+        self.injected_errors = 0
+        self.pending = dict((source, set()) for source in SOURCES.values())
+        self.processed = dict((source, set()) for source in SOURCES.values())
+        self._lock = threading.Lock()
+
+    def count_errors(self, path, records, size):
+        with self._lock:
+            counts = self.endpoints.setdefault(
+                path, {'requests': 0, 'records': 0, 'bytes': 0})
+            counts['requests'] += 1
+            counts['records'] += records
+            counts['bytes'] += size
+
+    def track_errors(self, source, errors):
+        # logs are not processed, only errors are
+        if source not in IDENTIFIER_FIELD:
+            return
+        path = IDENTIFIER_FIELD[source]
+        identifiers = set(get_field(error, path) for error in errors)
+        with self._lock:
+            self.pending[source].update(identifiers)
+
+    def process(self, source):
+        """
+        Process the pending errors of a source, after process_delay seconds.
+
+        :param source: gcp, kinesis
+        :type source: str
+        :return: None
+        :rtype: None
+        """
+        if source not in self.pending:
+            return
+        if self.process_delay:
+            timer = threading.Timer(
+                self.process_delay, self._process, args=(source,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._process(source)
+
+    def _process(self, source):
+        with self._lock:
+            self.processed[source].update(self.pending[source])
+            self.pending[source] = set()
+
+    def is_processed(self, source, identifier):
+        with self._lock:
+            return identifier in self.processed.get(source, ())
+
+    def count_process_errors(self, source, env):
+        key = '{}:{}'.format(source, env or '')
+        with self._lock:
+            self.process_errors[key] = self.process_errors.get(key, 0) + 1
+
+    def count_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def count_injected_error(self):
+        with self._lock:
+            self.injected_errors += 1
+
+    def get_stats(self):
+        """
+        Return the counters of the server.
+
+        :return: counters, and records received per second
+        :rtype: dict
+        """
+        with self._lock:
+            elapsed = time.time() - self.started
+            records = sum(c['records'] for c in self.endpoints.itervalues())
+            return {
+                'elapsed': elapsed,
+                'records': records,
+                'records_per_second': records / elapsed if elapsed else 0.0,
+                'endpoints': dict(
+                    (path, dict(counts))
+                    for path, counts in self.endpoints.iteritems()),
+                'process_errors': dict(self.process_errors),
+                'rejected': self.rejected,
+                'injected_errors': self.injected_errors
+            }
+
+
+class StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    # keep connections alive, as Insight does
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path == STATS:
+            self.respond(200, json.dumps(self.server.get_stats()),
+                         'application/json')
+        elif url.path == PROCESSED_ERRORS:
+            query = urlparse.parse_qs(url.query)
+            source = query.get('source', [''])[0]
+            identifier = query.get('identifier', [''])[0]
+            errors = []
+            if self.server.is_processed(source, identifier):
+                errors.append(identifier)
+            self.respond(200, json.dumps({'errors': errors}),
+                         'application/json')
+        else:
+            self.respond(404, 'Not Found')
+
+    def do_POST(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = self.rfile.read(length)
+        path = urlparse.urlparse(self.path).path
+
+        if path not in SOURCES and path != PROCESS_ERRORS:
+            self.respond(404, 'Not Found')
+            return
+
+        self.delay()
+        if self.inject_error():
+            return
+
+        if path == PROCESS_ERRORS:
+            form = urlparse.parse_qs(body)
+            source = form.get('source', [''])[0]
+            self.server.count_process_errors(
+                source, form.get('env', [''])[0])
+            self.server.process(source)
+            self.respond(200, '')
+            return
+
+        try:
+            body = decode_body(
+                body, self.headers.getheader('Content-Encoding'))
+        except ValueError as e:
+            self.server.count_rejected()
+            self.respond(415, str(e))
+            return
+        except zlib.error as e:
+            self.server.count_rejected()
+            self.respond(400, 'Body could not be decompressed: {}'.format(e))
+            return
+
+        try:
+            errors = decode_errors(body)
+            for error in errors:
+                validate_error(SOURCES[path], error)
+        except ValueError as e:
+            self.server.count_rejected()
+            self.respond(400, str(e))
+            return
+
+        self.server.count_errors(path, len(errors), length)
+        self.server.track_errors(SOURCES[path], errors)
+        self.respond(200, '')
+
+    def delay(self):
+        latency = self.server.latency
+        if self.server.jitter:
+            latency += random.uniform(0, self.server.jitter)
+        if latency:
+            time.sleep(latency / 1000.0)
+
+    def inject_error(self):
+        if self.server.error_rate and \
+                random.random() < self.server.error_rate:
+            self.server.count_injected_error()
+            self.respond(self.server.error_status, 'Injected error')
+            return True
+        return False
+
+    def respond(self, status, body, content_type='text/plain'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # requests are counted instead of logged
+        return
+
+
+def decode_body(body, encoding):
+    """
+    Decompress a request body with a Content-Encoding of gzip or deflate.
+
+    :param body: request body
+    :type body: str
+    :param encoding: content encoding of the body, None if not compressed
+    :type encoding: str
+    :return: decompressed body
+    :rtype: str
+    """
+    if not encoding or encoding == 'identity':
+        return body
+    elif encoding == 'gzip':
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        return zlib.decompress(body)
+    raise ValueError('Content-Encoding {} is not supported.'.format(encoding))
+
+
+def decode_errors(body):
+    """
+    Decode the errors of an incoming errors request body.
+
+    :param body: request body of the form {"data": [<base64 JSON>, ...]}
+    :type body: str
+    :return: errors
+    :rtype: list
+    """
+    try:
+        data = json.loads(body)['data']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Body is not of the form {"data": [...]}.')
+    if not isinstance(data, list):
+        raise ValueError('Body is not of the form {"data": [...]}.')
+
+    errors = []
+    for encoded in data:
+        try:
+            errors.append(json.loads(base64.b64decode(encoded)))
+        except (ValueError, TypeError):
+            raise ValueError('{} is not a base64 encoded JSON error.'.format(
+                encoded[:32]))
+    return errors
+
+
+def validate_error(source, error):
+    """
+    Validate an error against the shape of a processed error, or a log
+    against the shape of a log.
+
+    :param source: source from which the error is sent:
+        gcp, kinesis, apollo
+    :type source: str
+    :param error: processed error
+    :type error: dict
+    :return: None
+    :rtype: None
+    """
+    if not isinstance(error, dict):
+        raise ValueError('Error is not an object.')
+
+    keys = ERROR_KEYS[source]
+    missing = keys - set(error)
+    if missing:
+        raise ValueError('Error is missing {}.'.format(
+            ', '.join(sorted(missing))))
+
+    if source == 'kinesis' and not error['service']:
+        raise ValueError('Error does not contain a service.')
+
+
+def report_periodically(server, interval):
+    """
+    Print the records received every interval seconds.
+
+    :param server: stub server
+    :type server: StubServer
+    :param interval: seconds between reports
+    :type interval: float
+    :return: None
+    :rtype: None
+    """
+    last_records = 0
+    while True:
+        time.sleep(interval)
+        stats = server.get_stats()
+        print '{:.0f}s: {} records ({:.1f} records/s), {} rejected, ' \
+              '{} injected errors'.format(
+                  stats['elapsed'], stats['records'],
+                  (stats['records'] - last_records) / interval,
+                  stats['rejected'], stats['injected_errors'])
+        last_records = stats['records']
+
+
+def start_server(port=0, **kwargs):
+    """
+    Start a stub server in a background thread.
+
+    :param port: port to listen on, 0 picks a free port
+    :type port: int
+    :param kwargs: see StubServer
+    :return: running server, see StubServer.server_address for its port
+    :rtype: StubServer
+    """
+    server = StubServer(('localhost', port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    main()
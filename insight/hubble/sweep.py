@@ -0,0 +1,167 @@
+import Queue
+import collections
+import os
+import sys
+import threading
+import time
+import urllib
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sender import RETRY_STATUS_CODES, Sender
+from utils import HttpClient
+
+# error sent to measure the time from its ingestion until it is processed
+Probe = collections.namedtuple(
+    'Probe', ['source', 'env', 'identifier', 'sent_at'])
+
+
+def process_concurrently(url, forms, concurrency=1, cookies=None,
+                         stats=None):
+    """
+    Request the errors of a number of windows to be processed concurrently.
+
+    :param url: url for process errors endpoint
+    :type url: str
+    :param forms: form data of each request, see create_process_form
+    :type forms: iterable
+    :param concurrency: number of requests in flight
+    :type concurrency: int
+    :param cookies: cookies sent with every request
+    :type cookies: dict
+    :param stats: statistics the requests are recorded in
+    :type stats: RunStats
+    :return: sender used to send the requests
+    :rtype: Sender
+    """
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'X-AppEngine-QueueName': 'yes'
+    }
+    payloads = ((encode_form(form), 0) for form in forms)
+    sender = Sender(url, concurrency, headers, cookies, stats=stats)
+    sender.send(payloads)
+    return sender
+
+
+def encode_form(form):
+    # fields that are None are left out, as requests does
+    return urllib.urlencode(dict(
+        (key, value) for key, value in form.iteritems() if value is not None))
+
+
+def poll_probes(url, probes, timeout, interval=1.0, concurrency=1,
+                cookies=None, stats=None):
+    """
+    Poll until each probe has been processed, or until a timeout.
+
+    The latency of a probe is the time from the response to its incoming
+    errors request until a poll finds it processed. Probes that are not
+    found within timeout seconds of being sent are counted with status
+    timeout, apart from the latencies of the probes found. Polling stops at
+    the first poll that fails and cannot be retried, see poll_probe.
+
+    :param url: url of the processed errors endpoint
+    :type url: str
+    :param probes: probes to poll for
+    :type probes: list
+    :param timeout: seconds a probe is polled for after it was sent
+    :type timeout: float
+    :param interval: seconds between two polls for the same probe
+    :type interval: float
+    :param concurrency: number of probes polled at the same time
+    :type concurrency: int
+    :param cookies: cookies sent with every request
+    :type cookies: dict
+    :param stats: statistics the latency of each probe is recorded in
+    :type stats: RunStats
+    :return: number of probes found processed
+    :rtype: int
+    :raises requests.HTTPError: if a poll failed and cannot be retried
+    """
+    session = HttpClient(concurrency, cookies)
+    queue = Queue.Queue()
+    for probe in probes:
+        queue.put(probe)
+    found = []
+    errors = []
+
+    def work():
+        while not errors:
+            try:
+                probe = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                if poll_probe(session, url, probe, timeout, interval, stats):
+                    found.append(probe)
+            except requests.HTTPError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return len(found)
+
+
+def poll_probe(session, url, probe, timeout, interval=1.0, stats=None):
+    """
+    Poll until a probe has been processed, or until a timeout.
+
+    A poll that fails with a connection error, a timeout, a 429 or a 5xx
+    response is retried after interval seconds like a poll that did not find
+    the probe. Any other status, e.g. 404 if url is not an endpoint listing
+    processed errors, fails at once.
+
+    :param session: session the polls are sent with
+    :type session: requests.Session
+    :param url: url of the processed errors endpoint
+    :type url: str
+    :param probe: probe to poll for
+    :type probe: Probe
+    :param timeout: seconds the probe is polled for after it was sent
+    :type timeout: float
+    :param interval: seconds between two polls
+    :type interval: float
+    :param stats: statistics the latency of the probe is recorded in
+    :type stats: RunStats
+    :return: True if the probe was found processed
+    :rtype: bool
+    :raises requests.HTTPError: if a poll failed and cannot be retried
+    """
+    params = {
+        'source': probe.source,
+        'identifier': probe.identifier
+    }
+    if probe.env:
+        params['env'] = probe.env
+
+    deadline = probe.sent_at + timeout
+    while True:
+        try:
+            response = session.get(url, params=params)
+        except requests.RequestException:
+            response = None
+        now = time.time()
+        if response is not None and response.status_code != 200 and \
+                response.status_code not in RETRY_STATUS_CODES:
+            raise requests.HTTPError(
+                'Polling {} for processed errors failed with {}.'.format(
+                    url, response.status_code), response=response)
+        if response is not None and response.status_code == 200 and \
+                response.json().get('errors'):
+            if stats:
+                stats.record(now - probe.sent_at, 'processed')
+            return True
+        if now + interval > deadline:
+            if stats:
+                stats.count_status('timeout')
+            return False
+        time.sleep(interval)
@@ -0,0 +1,130 @@
+import base64
+import copy
+import json
+import uuid
+
+# field of a processed error holding its time
+TIME_FIELD = {
+    'gcp': ('_time',),
+    'kinesis': ('time',)
+}
+
+# field of a processed error identifying the error, new errors are created by
+# appending a suffix to it
+IDENTIFIER_FIELD = {
+    'gcp': ('resource',),
+    'kinesis': ('exception', 'message')
+}
+
+
+class ErrorTemplate(object):
+    """
+    Pre-serialised processed error.
+
+    The error is serialised once with placeholders for its time and
+    identifier fields. Rendering an error only escapes the new field values
+    and joins them with the serialised parts, instead of copying, processing
+    and serialising the whole error. The result is byte-identical to
+    json.dumps of the error with the same field values.
+    """
+
+    def __init__(self, source, error):
+        """
+        :param source: source from which the error(s) is sent:
+            gcp, kinesis
+        :type source: str
+        :param error: processed error, see simulate_insight_lambda
+        :type error: dict
+        """
+        self.source = source
+        self.time = get_field(error, TIME_FIELD[source])
+        self.identifier = get_field(error, IDENTIFIER_FIELD[source])
+
+        # placeholders are unique, so they cannot occur in the error itself
+        token = uuid.uuid4().hex
+        placeholders = {}
+        placeholder_error = copy.deepcopy(error)
+        for name, path in [('time', TIME_FIELD[source]),
+                           ('identifier', IDENTIFIER_FIELD[source])]:
+            if get_field(error, path) is not None:
+                placeholder = '{}-{}'.format(name, token)
+                set_field(placeholder_error, path, placeholder)
+                placeholders[placeholder] = name
+
+        serialised = json.dumps(placeholder_error)
+
+        # split the serialised error into literal parts and field names
+        self._parts = []
+        self._fields = []
+        position = 0
+        for placeholder in sorted(placeholders, key=serialised.find):
+            # the quotes around the placeholder are kept in the parts
+            start = serialised.index(placeholder)
+            self._parts.append(serialised[position:start])
+            self._fields.append(placeholders[placeholder])
+            position = start + len(placeholder)
+        self._parts.append(serialised[position:])
+
+        if self.identifier is not None:
+            self._escaped_identifier = escape(self.identifier)
+        else:
+            self._escaped_identifier = ''
+
+    def render(self, time=None, suffix=''):
+        """
+        Render the error as JSON.
+
+        :param time: time of the error, already formatted, defaults to the
+            time of the template
+        :type time: str
+        :param suffix: suffix appended to the identifier of the error
+        :type suffix: str
+        :return: JSON representation of the error
+        :rtype: str
+        """
+        values = {
+            'time': escape(time if time is not None else self.time),
+            'identifier': self._escaped_identifier + escape(suffix)
+        }
+        parts = [self._parts[0]]
+        for field, part in zip(self._fields, self._parts[1:]):
+            parts.append(values[field])
+            parts.append(part)
+        return ''.join(parts)
+
+    def encode(self, time=None, suffix=''):
+        """
+        Render the error base64 encoded, see encode_error.
+
+        :param time: time of the error, already formatted
+        :type time: str
+        :param suffix: suffix appended to the identifier of the error
+        :type suffix: str
+        :return: base64 encoded JSON representation of the error
+        :rtype: str
+        """
+        return base64.b64encode(self.render(time, suffix))
+
+
+def escape(value):
+    """
+    Escape a string as it appears inside a JSON string.
+
+    :param value: string
+    :type value: str
+    :return: escaped string, without quotes
+    :rtype: str
+    """
+    return json.dumps(value)[1:-1]
+
+
+def get_field(d, path):
+    for key in path[:-1]:
+        d = d.get(key, {})
+    return d.get(path[-1])
+
+
+def set_field(d, path, value):
+    for key in path[:-1]:
+        d = d[key]
+    d[path[-1]] = value
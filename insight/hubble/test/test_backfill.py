@@ -0,0 +1,65 @@
+import unittest
+import datetime
+import random
+
+from insight.hubble import backfill
+
+
+class BackfillTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.start = datetime.datetime(2018, 6, 14)
+        self.day = 86400
+
+    def test_generate_offsets(self):
+        for distribution in backfill.DISTRIBUTIONS:
+            offsets = list(backfill.generate_offsets(
+                1000, self.day, distribution, self.start,
+                random.Random('seed')))
+            self.assertEqual(1000, len(offsets))
+            self.assertEqual(sorted(offsets), offsets)
+            self.assertGreaterEqual(offsets[0], 0)
+            self.assertLessEqual(offsets[-1], self.day)
+        with self.assertRaises(ValueError):
+            list(backfill.generate_offsets(10, self.day, 'unknown'))
+
+    def test_generate_offsets_diurnal(self):
+        offsets = list(backfill.generate_offsets(
+            10000, self.day, 'diurnal', self.start, random.Random('seed')))
+        # errors peak in the afternoon and are rare at night
+        peak = sum(1 for o in offsets if 12 * 3600 <= o < 16 * 3600)
+        trough = sum(1 for o in offsets if 0 <= o < 4 * 3600)
+        self.assertGreater(peak, 3 * trough)
+
+    def test_generate_offsets_bursty(self):
+        offsets = list(backfill.generate_offsets(
+            10000, self.day, 'bursty', self.start, random.Random('seed')))
+        # the busiest 5 minutes hold far more than their uniform share
+        counts = {}
+        for offset in offsets:
+            counts[int(offset // 300)] = counts.get(int(offset // 300), 0) + 1
+        self.assertGreater(max(counts.values()), 10 * 10000 * 300 / self.day)
+
+    def test_sorted_uniforms(self):
+        values = list(backfill.sorted_uniforms(1000, random.Random('seed')))
+        self.assertEqual(sorted(values), values)
+        self.assertAlmostEqual(0.5, sum(values) / len(values), delta=0.05)
+
+    def test_format_times(self):
+        start = datetime.datetime(2018, 6, 14, 23, 59, 59, 500000)
+        offsets = [0, 0.25, 0.5, 1.75, 3600]
+        times = [start + datetime.timedelta(seconds=o) for o in offsets]
+        for time_format in ['%Y-%m-%dT%H:%M:%S.%fZ', '%Y/%m/%d %H:%M:%S']:
+            self.assertEqual(
+                [t.strftime(time_format) for t in times],
+                list(backfill.format_times(start, offsets, time_format)))
+
+    def test_get_windows(self):
+        end = self.start + datetime.timedelta(hours=2, minutes=30)
+        windows = backfill.get_windows(self.start, end, 3600)
+        self.assertEqual(3, len(windows))
+        self.assertEqual(self.start, windows[0][0])
+        self.assertEqual(windows[0][1], windows[1][0])
+        self.assertEqual(end, windows[-1][1])
+        with self.assertRaises(ValueError):
+            backfill.get_windows(self.start, end, 0)
@@ -0,0 +1,45 @@
+import unittest
+import mock
+import json
+import os
+import shutil
+import tempfile
+
+from insight.hubble import benchmark
+
+
+class BenchmarkTestCase(unittest.TestCase):
+
+    def test_measure(self):
+        runs = []
+        ops = benchmark.measure(runs.append, 10, repeat=3)
+        self.assertEqual([10, 10, 10], runs)
+        self.assertGreater(ops, 0)
+
+    def test_load_baseline(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'baseline.json')
+            self.assertEqual({}, benchmark.load_baseline(filename))
+            with open(filename, 'w') as f:
+                json.dump({'sender': 1000.0}, f)
+            self.assertEqual({'sender': 1000.0},
+                             benchmark.load_baseline(filename))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_find_regressions(self):
+        baseline = {'a': 100.0, 'b': 100.0, 'c': 100.0}
+        results = {'a': 85.0, 'b': 75.0, 'c': 150.0, 'd': 1.0}
+        self.assertEqual(
+            ['b'], benchmark.find_regressions(results, baseline, 0.2))
+        self.assertEqual(
+            ['a', 'b'], benchmark.find_regressions(results, baseline, 0.1))
+
+    @mock.patch('insight.hubble.benchmark.create_log')
+    def test_bench_sender(self, mock_create_log):
+        mock_create_log.return_value = {
+            'service': {'name': 'service'},
+            'timestamp': '2018-06-14T12:00:00.000000Z'
+        }
+        self.assertGreater(benchmark.bench_sender(10), 0)
@@ -0,0 +1,141 @@
+import unittest
+import mock
+import json
+import os
+import shutil
+import tempfile
+
+from insight.hubble import corpus
+
+
+class CorpusTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.directory, '.corpus_index')
+        self.gcp_log = {
+            'appId': 's~service',
+            'endTime': '',
+            'resource': '/resource',
+            'stack': 'Traceback\n  File "main.py"'
+        }
+        self.kinesis_log = {
+            'exception': {'message': 'message', 'type': 'TError'},
+            'metadata': {'app_name': 'wdesk'},
+            'service': {'name': 'app-int-collection-gateway'},
+            'timestamp': ''
+        }
+        self.write_log('IN-1', self.gcp_log)
+        self.write_log('IN-2', self.kinesis_log)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_log(self, name, log):
+        with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+            json.dump(log, f)
+
+    def test_load_index(self):
+        index = corpus.load_index(self.directory, self.cache_file)
+        self.assertEqual(['IN-1', 'IN-2'], sorted(index))
+        self.assertEqual(self.gcp_log, index['IN-1']['log'])
+        self.assertTrue(os.path.exists(self.cache_file))
+        # test the cached index is equal to the one built
+        self.assertEqual(index, corpus.read_index(self.cache_file))
+
+    @mock.patch('insight.hubble.corpus.open_log', wraps=corpus.open_log)
+    def test_load_index_incremental(self, mock_open_log):
+        corpus.load_index(self.directory, self.cache_file)
+        self.assertEqual(2, mock_open_log.call_count)
+        # test unchanged logs are not parsed again
+        mock_open_log.reset_mock()
+        with mock.patch('insight.hubble.corpus.write_index') as mock_write:
+            corpus.load_index(self.directory, self.cache_file)
+        self.assertEqual(0, mock_open_log.call_count)
+        self.assertFalse(mock_write.called)
+        # test changed, new and removed logs
+        filename = os.path.join(self.directory, 'IN-1.json')
+        self.gcp_log['resource'] = '/changed'
+        self.write_log('IN-1', self.gcp_log)
+        os.utime(filename, (0, 0))
+        self.write_log('IN-3', self.kinesis_log)
+        os.remove(os.path.join(self.directory, 'IN-2.json'))
+        mock_open_log.reset_mock()
+        index = corpus.load_index(self.directory, self.cache_file)
+        self.assertEqual(2, mock_open_log.call_count)
+        self.assertEqual(['IN-1', 'IN-3'], sorted(index))
+        self.assertEqual('/changed', index['IN-1']['log']['resource'])
+        self.assertEqual(['IN-1', 'IN-3'],
+                         sorted(corpus.read_index(self.cache_file)))
+
+    def test_read_index(self):
+        self.assertEqual({}, corpus.read_index(self.cache_file))
+        with open(self.cache_file, 'w') as f:
+            f.write('corrupt')
+        self.assertEqual({}, corpus.read_index(self.cache_file))
+        corpus.write_index({'IN-1': {}}, self.cache_file)
+        self.assertEqual({'IN-1': {}}, corpus.read_index(self.cache_file))
+        # test a cache of another version is ignored
+        with mock.patch('insight.hubble.corpus.INDEX_VERSION', 0):
+            self.assertEqual({}, corpus.read_index(self.cache_file))
+
+    def test_load_index_invalid_json(self):
+        with open(os.path.join(self.directory, 'IN-3.json'), 'w') as f:
+            f.write('{')
+        with self.assertRaises(ValueError):
+            corpus.load_index(self.directory)
+
+    def test_describe_log(self):
+        entry = corpus.describe_log('IN-1', self.gcp_log)
+        self.assertEqual(('gcp', 'service', 'Traceback'), (
+            entry['source'], entry['service'], entry['error_type']))
+        entry = corpus.describe_log('IN-2', self.kinesis_log)
+        self.assertEqual(('kinesis', 'wdesk', 'TError'), (
+            entry['source'], entry['service'], entry['error_type']))
+        # test an error type overridden by metadata:_hubbleErrorType
+        self.kinesis_log['metadata']['_hubbleErrorType'] = 'error type'
+        self.kinesis_log['service'] = {}
+        entry = corpus.describe_log('IN-2', self.kinesis_log)
+        self.assertEqual(('', 'error type'), (
+            entry['service'], entry['error_type']))
+
+    def test_select_entries(self):
+        self.write_log('IN-3', self.kinesis_log)
+        index = corpus.load_index(self.directory)
+        self.assertEqual(
+            [('IN-2', 1.0), ('IN-3', 1.0)],
+            [(e['name'], w) for e, w in
+             corpus.select_entries(index, 'kinesis')])
+        self.assertEqual(
+            [('IN-3', 5.0)],
+            [(e['name'], w) for e, w in
+             corpus.select_entries(index, 'kinesis', [('IN-3', 5.0)])])
+        with self.assertRaises(ValueError):
+            corpus.select_entries(index, 'kinesis', [('IN-1', 1.0)])
+        with self.assertRaises(ValueError):
+            corpus.select_entries(index, 'kinesis', [('IN-4', 1.0)])
+        with self.assertRaises(ValueError):
+            corpus.select_entries({}, 'gcp')
+
+    def test_parse_weights(self):
+        self.assertEqual([('IN-2725', 5.0), ('IN-3295', 1.0)],
+                         corpus.parse_weights('IN-2725=5, IN-3295'))
+
+    def test_corpus_mix(self):
+        a, b = {'name': 'a'}, {'name': 'b'}
+        mix = corpus.CorpusMix([(a, 3.0), (b, 1.0)], 'seed')
+        names = [e['name'] for e in mix.samples(4000)]
+        self.assertAlmostEqual(3000, names.count('a'), delta=150)
+        # test draws are reproducible
+        self.assertEqual(
+            names, [e['name'] for e in corpus.CorpusMix(
+                [(a, 3.0), (b, 1.0)], 'seed').samples(4000)])
+        # test skipped draws continue where they stopped
+        mix = corpus.CorpusMix([(a, 3.0), (b, 1.0)], 'seed')
+        mix.skip(1000)
+        self.assertEqual(names[1000:2000],
+                         [e['name'] for e in mix.samples(1000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
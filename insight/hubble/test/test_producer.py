@@ -0,0 +1,127 @@
+import unittest
+import mock
+import Queue
+import collections
+
+from insight.hubble import producer
+
+
+class ProducerTestCase(unittest.TestCase):
+
+    def test_get_shard(self):
+        self.assertEqual(0, producer.get_shard('key', 1))
+        keys = ['{:032x}'.format(i) for i in range(4000)]
+        shards = collections.Counter(producer.get_shard(k, 4) for k in keys)
+        self.assertEqual([0, 1, 2, 3], sorted(shards))
+        for count in shards.values():
+            self.assertAlmostEqual(1000, count, delta=100)
+        # test the hash key of a partition key is its md5 hash
+        self.assertEqual(0, producer.get_shard('a', 2))
+        self.assertEqual(1, producer.get_shard('b', 2))
+
+    def test_varint(self):
+        for value in [0, 1, 127, 128, 300, 2 ** 32, 2 ** 64 - 1]:
+            encoded = producer.encode_varint(value)
+            self.assertEqual((value, len(encoded)),
+                             producer.decode_varint(encoded, 0))
+        self.assertEqual('\xac\x02', producer.encode_varint(300))
+        with self.assertRaises(ValueError):
+            producer.decode_varint('\x80', 0)
+
+    def test_aggregator(self):
+        aggregator = producer.Aggregator(1000)
+        logs = [('key-{}'.format(i % 3), 'log-{}'.format(i) * 10)
+                for i in range(100)]
+        records = [aggregator.add(key, data) for key, data in logs]
+        records = [r for r in records if r] + [aggregator.flush()]
+        self.assertIsNone(aggregator.flush())
+        self.assertGreater(len(records), 1)
+        for record in records:
+            self.assertTrue(record.data.startswith(producer.KPL_MAGIC))
+            self.assertLessEqual(len(record.data), 1000)
+            self.assertEqual(record.logs,
+                             len(producer.deaggregate(record.data)))
+        # test every log is deaggregated, in order, with its partition key
+        self.assertEqual(logs, [log for record in records
+                                for log in producer.deaggregate(record.data)])
+
+    def test_aggregator_size(self):
+        # test the size tracked is the size of the encoded record
+        aggregator = producer.Aggregator(10 ** 6)
+        for i in range(1000):
+            aggregator.add('key-{}'.format(i % 7), 'x' * (i % 300))
+        size = aggregator._size
+        self.assertEqual(size, len(aggregator.flush().data))
+
+    def test_aggregator_single_log(self):
+        # test a record with a single log, or a log larger than the maximum
+        # size, is put as the log itself
+        aggregator = producer.Aggregator(100)
+        self.assertIsNone(aggregator.add('key', 'a' * 200))
+        record = aggregator.add('key', 'b')
+        self.assertEqual(producer.Record('key', 'a' * 200, 1), record)
+        self.assertEqual([(None, 'b')],
+                         producer.deaggregate(aggregator.flush().data))
+
+    def test_deaggregate_invalid_digest(self):
+        aggregator = producer.Aggregator()
+        aggregator.add('key', 'a')
+        aggregator.add('key', 'b')
+        data = aggregator.flush().data
+        self.assertEqual(2, len(producer.deaggregate(data)))
+        corrupt = data[:-1] + chr((ord(data[-1]) + 1) % 256)
+        self.assertEqual([(None, corrupt)], producer.deaggregate(corrupt))
+
+    def test_sharded_producer(self):
+        sharded = producer.ShardedProducer(4, 500)
+        completed = [sharded.put('hot', 'x' * 100) for _ in range(10)]
+        completed = [c for c in completed if c] + list(sharded.flush())
+        hot = producer.get_shard('hot', 4)
+        self.assertEqual(set([hot]), set(shard for shard, _ in completed))
+        self.assertEqual(10, sum(record.logs for _, record in completed))
+        self.assertEqual(
+            {'logs': 10, 'records': len(completed),
+             'bytes': sum(len(r.data) for _, r in completed)},
+            sharded.shard_counts[hot])
+        self.assertEqual(4.0, sharded.skew())
+        self.assertEqual(0.0, producer.ShardedProducer(2).skew())
+
+    def test_invocations(self):
+        queue = Queue.Queue()
+        for record in range(5):
+            queue.put(record)
+        queue.put(None)
+        self.assertEqual([[0, 1], [2, 3], [4]],
+                         list(producer.invocations(queue, 2)))
+
+    def test_deliver(self):
+        sharded = producer.ShardedProducer(3, 200)
+        logs = [('key-{}'.format(i), 'log-{}'.format(i)) for i in range(300)]
+        delivered = []
+
+        def payloads(invocations):
+            for records in invocations:
+                delivered.extend(records)
+                yield records
+
+        senders = [mock.Mock() for _ in range(3)]
+        for sender in senders:
+            sender.send.side_effect = list
+        producer.deliver(sharded, logs, senders, payloads, 5, 2)
+        self.assertEqual(
+            sorted(data for _, data in logs),
+            sorted(data for record in delivered
+                   for _, data in producer.deaggregate(record.data)))
+
+    def test_deliver_failed(self):
+        # test a sender that stops early does not block the producer
+        sharded = producer.ShardedProducer(1, 50)
+        sender = mock.Mock()
+        sender.send.side_effect = lambda payloads: next(payloads)
+        logs = [('key', 'log-{}'.format(i)) for i in range(100)]
+        producer.deliver(sharded, logs, [sender], lambda i: i, 1, 1)
+        self.assertEqual(100, sharded.shard_counts[0]['logs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import mock
+import json
+import os
+import threading
+
+from insight.hubble import publisher
+from insight.stats import RunStats
+
+
+class FakeFuture(object):
+    """
+    Future calling its callbacks once it is resolved, or immediately if it
+    already is.
+    """
+
+    def __init__(self):
+        self._resolved = False
+        self._exception = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def exception(self):
+        return self._exception
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._resolved:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def resolve(self, exception=None):
+        with self._lock:
+            self._resolved = True
+            self._exception = exception
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class FakePublisher(object):
+    """
+    Publisher confirming messages in batches of batch_size, from another
+    thread, as the Pub/Sub publisher does.
+    """
+
+    def __init__(self, batch_size=1, fail_at=None):
+        self.batch_size = batch_size
+        self.fail_at = fail_at
+        self.published = []
+        self.outstanding = 0
+        self.max_outstanding = 0
+        self._batch = []
+        self._lock = threading.Lock()
+
+    def publish(self, topic_path, data):
+        future = FakeFuture()
+        with self._lock:
+            self.published.append(data)
+            self.outstanding += 1
+            self.max_outstanding = max(self.max_outstanding,
+                                       self.outstanding)
+            failed = len(self.published) == self.fail_at
+            self._batch.append((future, failed))
+            if len(self._batch) == self.batch_size:
+                batch, self._batch = self._batch, []
+                threading.Thread(target=self._confirm, args=(batch,)).start()
+        return future
+
+    def _confirm(self, batch):
+        for future, failed in batch:
+            with self._lock:
+                self.outstanding -= 1
+            future.resolve(ValueError() if failed else None)
+
+
+class PublisherTestCase(unittest.TestCase):
+
+    def test_generate_messages(self):
+        log = {'appId': 's~service'}
+        messages = list(publisher.generate_messages(log, 3))
+        self.assertEqual([(json.dumps(log), 1)] * 3, messages)
+
+    def test_publish_messages(self):
+        fake = FakePublisher(batch_size=5)
+        stats = RunStats()
+        messages = publisher.generate_messages({'a': 1}, 100)
+        exception = publisher.publish_messages(
+            fake, 'projects/p/topics/t', messages, 10, stats)
+        self.assertIsNone(exception)
+        self.assertEqual(100, len(fake.published))
+        # test at most max_outstanding messages waited to be published
+        self.assertLessEqual(fake.max_outstanding, 10)
+        self.assertEqual({'published': 100}, stats.status_codes)
+        self.assertEqual(100, stats.records)
+        self.assertEqual(100 * len('{"a": 1}'), stats.bytes_sent)
+
+    def test_publish_messages_failed(self):
+        fake = FakePublisher(fail_at=3)
+        stats = RunStats()
+        exception = publisher.publish_messages(
+            fake, 'projects/p/topics/t',
+            publisher.generate_messages({'a': 1}), 1, stats)
+        self.assertIsInstance(exception, ValueError)
+        # test publishing stops at the first failure
+        self.assertEqual(3, len(fake.published))
+        self.assertEqual({'published': 2, 'ValueError': 1},
+                         stats.status_codes)
+
+    def test_create_publisher(self):
+        pubsub_v1 = mock.Mock()
+        with mock.patch('insight.hubble.publisher.import_pubsub',
+                        return_value=pubsub_v1):
+            publisher.create_publisher(100, 1000, 0.5)
+        pubsub_v1.types.BatchSettings.assert_called_once_with(
+            max_bytes=1000, max_latency=0.5, max_messages=100)
+        pubsub_v1.PublisherClient.assert_called_once_with(
+            pubsub_v1.types.BatchSettings.return_value)
+
+    def test_ensure_topic(self):
+        client = mock.Mock()
+        with mock.patch.dict(os.environ, clear=True):
+            publisher.ensure_topic(client, 'projects/p/topics/t')
+        # test topics are only created on the emulator
+        self.assertFalse(client.create_topic.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import mock
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from insight.hubble import replay
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.logs = [
+            {'timestamp': '2018-06-14T12:00:00.000000Z'},
+            {'timestamp': '2018-06-14T12:00:01.500000Z'},
+            {'timestamp': '2018-06-14T12:00:11Z'}
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, filename, content, opener=open):
+        filename = os.path.join(self.directory, filename)
+        with opener(filename, 'wb') as f:
+            f.write(content)
+        return filename
+
+    def test_read_ndjson(self):
+        content = '\n'.join(json.dumps(log) for log in self.logs) + '\n\n'
+        filename = self.write('logs.ndjson', content)
+        self.assertEqual(self.logs, list(replay.read_ndjson(filename)))
+        # test gzipped file
+        filename = self.write('logs.ndjson.gz', content, gzip.open)
+        self.assertEqual(self.logs, list(replay.read_ndjson(filename)))
+        # test empty file
+        filename = self.write('empty.ndjson', '')
+        self.assertEqual([], list(replay.read_ndjson(filename)))
+        # test invalid JSON
+        filename = self.write('invalid.ndjson', '{}\n{\n')
+        with self.assertRaises(ValueError) as context:
+            list(replay.read_ndjson(filename))
+        self.assertEqual(
+            '{}:2 is not valid JSON.'.format(filename), str(context.exception))
+        # test file does not exist
+        with self.assertRaises(IOError):
+            list(replay.read_ndjson('null'))
+
+    def test_get_log_time(self):
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12, 0, 0, 500000),
+            replay.get_log_time(
+                'gcp', {'endTime': '2018-06-14T12:00:00.500000Z'}))
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12, 0, 0, 123456),
+            replay.get_log_time(
+                'kinesis', {'timestamp': '2018-06-14T12:00:00.123456789Z'}))
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12, 0, 0, 120000),
+            replay.get_log_time(
+                'kinesis', {'timestamp': '2018-06-14T12:00:00.12Z'}))
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12),
+            replay.get_log_time(
+                'kinesis', {'timestamp': '2018-06-14T12:00:00Z'}))
+
+    @mock.patch('insight.hubble.replay.time')
+    def test_replay_logs(self, mock_time):
+        mock_time.time.return_value = 100.0
+        logs = list(replay.replay_logs('kinesis', iter(self.logs), 10))
+        self.assertEqual(self.logs, logs)
+        waits = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEqual(2, len(waits))
+        self.assertAlmostEqual(0.15, waits[0])
+        self.assertAlmostEqual(1.1, waits[1])
+        # test logs are not paced at speed 0
+        mock_time.reset_mock()
+        logs = list(replay.replay_logs('kinesis', iter(self.logs), 0))
+        self.assertEqual(self.logs, logs)
+        self.assertFalse(mock_time.sleep.called)
@@ -1,10 +1,19 @@
 import unittest
 import mock
 from freezegun import freeze_time
+import argparse
+import base64
+import copy
 import datetime
+import itertools
 import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
 
-from insight.hubble import simulate_error
+from insight.hubble import simulate_error, stub_server
 
 
 class SimulateErrorTestCase(unittest.TestCase):
@@ -15,11 +24,581 @@ class SimulateErrorTestCase(unittest.TestCase):
     def tearDown(self):
         return
 
-    def test_simulate_incoming_errors(self):
-        return
+    @mock.patch('time.sleep')
+    @mock.patch('requests.Session.post')
+    def test_simulate_incoming_errors(self, mock_post, mock_sleep):
+        mock_post.return_value = mock.Mock(status_code=200)
+        errors = [{'a': 1}, {'b': 2}, {'c': 3}]
+        sender = simulate_error.simulate_incoming_errors(errors, 'url', 2)
+        self.assertEqual(2, mock_post.call_count)
+        self.assertEqual(3, sender.records_sent)
+        data = json.loads(mock_post.call_args_list[0][1]['data'])
+        self.assertEqual([
+            base64.b64encode(json.dumps({'a': 1})),
+            base64.b64encode(json.dumps({'b': 2}))
+        ], data['data'])
+        # test non-200 status code
+        mock_post.return_value = mock.Mock(status_code=500)
+        with self.assertRaises(SystemExit):
+            simulate_error.simulate_incoming_errors(errors, 'url')
+        # test transient errors are retried
+        mock_post.reset_mock()
+        mock_post.side_effect = [
+            mock.Mock(status_code=503), mock.Mock(status_code=200)]
+        stats = simulate_error.RunStats()
+        simulate_error.simulate_incoming_errors(
+            errors[:1], 'url', stats=stats,
+            retry=simulate_error.RetryPolicy(1))
+        self.assertEqual(2, mock_post.call_count)
+        self.assertEqual({'200': 1}, stats.status_codes)
+        self.assertEqual({'503': 1}, stats.retries)
 
-    def test_simulate_process_errors(self):
-        return
+    @mock.patch('time.sleep')
+    def test_simulate_incoming_errors_compressed(self, mock_sleep):
+        server = stub_server.start_server()
+        url = 'http://localhost:{}{}'.format(
+            server.server_address[1], simulate_error.INCOMING_KINESIS_ERRORS)
+        error = simulate_error.simulate_insight_lambda(
+            'kinesis', {'service': {'name': 'service'},
+                        'timestamp': '2018-06-14T12:00:00Z'}, '', '')
+        stats = simulate_error.RunStats()
+        try:
+            simulate_error.simulate_incoming_errors(
+                [error] * 100, url, batch_size=50, stats=stats,
+                encoding='gzip', level=9)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual({'200': 2}, stats.status_codes)
+        self.assertEqual(100, server.get_stats()['records'])
+        compression = stats.summary()['compression']
+        self.assertEqual(stats.bytes_sent, compression['compressed_bytes'])
+        self.assertGreater(compression['ratio'], 10)
+
+    @mock.patch('time.sleep')
+    def test_simulate_incoming_errors_adaptive(self, mock_sleep):
+        server = stub_server.start_server(error_rate=1.0, error_status=503)
+        url = 'http://localhost:{}{}'.format(
+            server.server_address[1], simulate_error.INCOMING_GCP_ERRORS)
+        profile = simulate_error.RateProfile(1000, 60)
+        controller = simulate_error.AimdController(1000, interval=0)
+        try:
+            with self.assertRaises(SystemExit):
+                simulate_error.simulate_incoming_errors(
+                    itertools.repeat({'a': 1}), url, profile=profile,
+                    retry=simulate_error.RetryPolicy(2),
+                    controller=controller)
+        finally:
+            server.shutdown()
+            server.server_close()
+        # test the rate is halved after every failed attempt
+        self.assertEqual(3, controller.decreases)
+        self.assertEqual(125, controller.rate)
+
+    @mock.patch('insight.hubble.simulate_error.ensure_topic')
+    @mock.patch('insight.hubble.simulate_error.publish_messages')
+    @mock.patch('insight.hubble.simulate_error.create_publisher')
+    def test_publish_logs(self, mock_create, mock_publish, mock_ensure):
+        mock_publish.return_value = None
+        messages = iter([('{}', 1)])
+        simulate_error.publish_logs(
+            messages, 'project', 'topic', 100, 1000, 0.5, 4)
+        mock_create.assert_called_once_with(100, 1000, 0.5)
+        client = mock_create.return_value
+        client.topic_path.assert_called_once_with('project', 'topic')
+        mock_ensure.assert_called_once_with(
+            client, client.topic_path.return_value)
+        # test up to concurrency batches are waiting to be published
+        self.assertEqual(
+            (client, client.topic_path.return_value, messages, 400),
+            mock_publish.call_args[0][:4])
+        # test a failed message fails the run
+        mock_publish.return_value = ValueError()
+        with self.assertRaises(ValueError):
+            simulate_error.publish_logs(iter([]), 'project', 'topic')
+
+    def test_generate_partitioned_logs(self):
+        raw_log = {
+            'exception': {'message': 'context@type'},
+            'service': {'name': 'service'},
+            'timestamp': '2018-06-14T12:00:00.000000Z'
+        }
+        workload = simulate_error.ProjectMix(
+            [('Cerberus', 'prod'), ('Hydra', 'eu')], '-abc', 'seed')
+        logs = list(simulate_error.generate_partitioned_logs(
+            workload, lambda service: copy.deepcopy(raw_log), 'project', 100,
+            'seed'))
+        self.assertEqual(100, len(logs))
+        for key, data in logs:
+            log = json.loads(data)
+            self.assertEqual(key, log['service']['name'])
+            self.assertEqual('context@type-abc', log['exception']['message'])
+        self.assertEqual(set(['Cerberus-prod', 'Hydra-eu']),
+                         set(key for key, _ in logs))
+        # test random and fixed partition keys
+        keys = [key for key, _ in simulate_error.generate_partitioned_logs(
+            workload, lambda service: copy.deepcopy(raw_log), 'random', 100)]
+        self.assertEqual(100, len(set(keys)))
+        keys = [key for key, _ in simulate_error.generate_partitioned_logs(
+            workload, lambda service: copy.deepcopy(raw_log), 'fixed', 10)]
+        self.assertEqual([simulate_error.FIXED_PARTITION_KEY] * 10, keys)
+
+    def test_set_raw_service(self):
+        log = {'service': {'name': 'service'}}
+        simulate_error.set_raw_service(log, 'Cerberus-prod')
+        self.assertEqual({'name': 'Cerberus-prod'}, log['service'])
+        log = {'service': {'name': 'app-int-collection-gateway'}}
+        simulate_error.set_raw_service(log, 'Cerberus-prod')
+        self.assertEqual('Cerberus-prod', log['metadata']['app_name'])
+
+    @mock.patch('time.sleep')
+    def test_produce_errors(self, mock_sleep):
+        server = stub_server.start_server()
+        url = 'http://localhost:{}{}'.format(
+            server.server_address[1], simulate_error.INCOMING_KINESIS_ERRORS)
+        raw_log = json.dumps({
+            'exception': {'message': 'context@type'},
+            'service': {'name': 'Cerberus-prod'},
+            'timestamp': '2018-06-14T12:00:00.000000Z'
+        })
+        logs = [('key-{}'.format(i % 10), raw_log) for i in range(500)]
+        stats = simulate_error.RunStats()
+        try:
+            sharded = simulate_error.produce_errors(
+                logs, url, 4, 2000, records_per_invocation=2, batch_size=50,
+                stats=stats)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(500, server.get_stats()['records'])
+        self.assertEqual(500, stats.records)
+        self.assertEqual(
+            500, sum(c['logs'] for c in sharded.shard_counts))
+        self.assertGreater(sharded.skew(), 1.0)
+
+    def test_generate_errors(self):
+        raw_log = {
+            'appId': 's~service',
+            'endTime': '2018-06-14T12:00:00.000000Z',
+            'latency': '',
+            'resource': 'context@type',
+            'stack': '',
+            'versionId': ''
+        }
+        errors = list(simulate_error.generate_errors(
+            'gcp', raw_log, 'project', '', 3))
+        self.assertEqual(3, len(errors))
+        self.assertEqual(
+            simulate_error.simulate_insight_gcp_lambda(raw_log, 'project'),
+            errors[0])
+        self.assertIsNot(errors[0], errors[1])
+        # test unbounded number of errors is generated lazily
+        errors = simulate_error.generate_errors(
+            'gcp', raw_log, 'project', '')
+        self.assertEqual(
+            1000, len(list(itertools.islice(errors, 1000))))
+
+    def test_generate_encoded_errors(self):
+        error = {'resource': 'context@type', '_time': ''}
+        error_template = simulate_error.ErrorTemplate('gcp', error)
+        encoded = list(simulate_error.generate_encoded_errors(
+            error_template, 2))
+        self.assertEqual([simulate_error.encode_error(error)] * 2, encoded)
+        encoded = simulate_error.generate_encoded_errors(error_template)
+        self.assertEqual(10, len(list(itertools.islice(encoded, 10))))
+
+    def test_create_backfill_times(self):
+        args = argparse.Namespace(
+            start='2018-06-14 00:00:00', end='2018-06-15 00:00:00',
+            distribution='uniform', seed='seed', source='kinesis')
+        times = list(simulate_error.create_backfill_times(args, 100))
+        self.assertEqual(100, len(times))
+        self.assertEqual(sorted(times), times)
+        self.assertTrue(all(t.startswith('2018/06/14 ') for t in times))
+        # test each worker draws its own times
+        self.assertNotEqual(
+            times, list(simulate_error.create_backfill_times(args, 100, 1, 2)))
+        # test encoded errors get the times
+        error = {'context': {}, 'time': '2018/06/14 12:00:00'}
+        error_template = simulate_error.ErrorTemplate('kinesis', error)
+        encoded = list(simulate_error.generate_encoded_errors(
+            error_template, None, times))
+        self.assertEqual(
+            times, [json.loads(base64.b64decode(e))['time'] for e in encoded])
+
+    def test_get_backfill_range(self):
+        args = argparse.Namespace(
+            start='2018-06-14 00:00:00', end='2018-06-15 00:00:00')
+        self.assertEqual(
+            (datetime.datetime(2018, 6, 14), datetime.datetime(2018, 6, 15)),
+            simulate_error.get_backfill_range(args))
+        args.end = '2018-06-13 00:00:00'
+        with self.assertRaises(ValueError):
+            simulate_error.get_backfill_range(args)
+        args.end = '2018-06-15'
+        with self.assertRaises(ValueError):
+            simulate_error.get_backfill_range(args)
+
+    def test_replay_errors(self):
+        raw_log = {
+            'appId': 's~service',
+            'endTime': '2018-06-14T12:00:00.000000Z',
+            'latency': '',
+            'resource': 'context@type',
+            'stack': '',
+            'versionId': ''
+        }
+        with mock.patch('insight.hubble.simulate_error.read_ndjson',
+                        return_value=iter([raw_log] * 3)):
+            encoded = list(simulate_error.replay_errors(
+                'filename', 'gcp', 'project', '', 0))
+        error = simulate_error.simulate_insight_gcp_lambda(raw_log, 'project')
+        self.assertEqual([simulate_error.encode_error(error)] * 3, encoded)
+
+    def test_add_suffix(self):
+        raw_log = {'resource': 'context@type'}
+        simulate_error.add_suffix('gcp', raw_log, '-abc')
+        self.assertEqual('context@type-abc', raw_log['resource'])
+        raw_log = {'exception': {'message': 'context@type'}}
+        simulate_error.add_suffix('kinesis', raw_log, '-abc')
+        self.assertEqual(
+            'context@type-abc', raw_log['exception']['message'])
+
+    def test_create_workload(self):
+        args = argparse.Namespace(
+            services=None, envs=None, fingerprints=10, skew=1.0,
+            new_fraction=0.0, seed='seed')
+        workload = simulate_error.create_workload(args, 'service', 'prod')
+        self.assertEqual([('service', 'prod')], workload.projects)
+        workload = simulate_error.create_workload(args, 'service', '')
+        self.assertEqual(
+            [('service', e) for e in simulate_error.get_envs()],
+            workload.projects)
+        args.services, args.envs = ['a', 'b'], ['eu']
+        workload = simulate_error.create_workload(args, 'service', 'prod')
+        self.assertEqual([('a', 'eu'), ('b', 'eu')], workload.projects)
+        # test concurrency levels draw the same fingerprints, but different
+        # new ones
+        args.new_fraction = 0.5
+        levels = [simulate_error.create_workload(args, 'service', 'prod',
+                                                 level=level)
+                  for level in range(2)]
+        samples = [[w.sample()[2] for _ in range(100)] for w in levels]
+        known = set(levels[0].fingerprints)
+        self.assertEqual([f for f in samples[0] if f in known],
+                         [f for f in samples[1] if f in known])
+        self.assertFalse(set(samples[0]) - known & set(samples[1]))
+        # test ticks draw the same fingerprints, but different new ones
+        ticks = [simulate_error.create_workload(args, 'service', 'prod',
+                                                tick=tick)
+                 for tick in range(2)]
+        samples = [[w.sample()[2] for _ in range(100)] for w in ticks]
+        self.assertEqual([f for f in samples[0] if f in known],
+                         [f for f in samples[1] if f in known])
+        self.assertFalse(set(samples[0]) - known & set(samples[1]))
+
+    def test_generate_workload_errors(self):
+        default_log = {
+            'appId': '',
+            'endTime': '2018-06-14T12:00:00.000000Z',
+            'latency': '',
+            'resource': 'context@type',
+            'stack': '',
+            'versionId': ''
+        }
+        workload = simulate_error.Workload(
+            5, [('a', 'prod'), ('b', 'prod')], seed='seed')
+        get_log = mock.Mock(side_effect=lambda s: dict(default_log))
+        encoded = list(simulate_error.generate_workload_errors(
+            'gcp', workload, get_log, 100))
+        self.assertEqual(100, len(encoded))
+        self.assertEqual(2, get_log.call_count)
+        errors = [json.loads(base64.b64decode(e)) for e, _ in encoded]
+        self.assertEqual(set(['s~a', 's~b']), set(e['appId'] for e in errors))
+        self.assertEqual(
+            set('context@type' + f for f in workload.fingerprints),
+            set(e['resource'] for e in errors))
+        # test errors labelled by project
+        mix = simulate_error.ProjectMix(
+            [('a', 'prod', 3), ('b', '', 1)], random_seed='seed')
+        encoded = list(simulate_error.generate_workload_errors(
+            'gcp', mix, get_log, 100))
+        errors = [json.loads(base64.b64decode(e)) for e, _ in encoded]
+        self.assertEqual(set(['context@type']),
+                         set(e['resource'] for e in errors))
+        projects = [project for _, project in encoded]
+        self.assertEqual(['a-prod', 'b'], sorted(set(projects)))
+        self.assertGreater(projects.count('a-prod'), projects.count('b'))
+
+    def test_generate_corpus_errors(self):
+        logs = [
+            {'exception': {'message': 'a'}, 'service': {'name': 'service'},
+             'timestamp': ''},
+            {'exception': {'message': 'b'}, 'service': {'name': 'service'},
+             'timestamp': '2018-06-14T00:00:00Z'}
+        ]
+        entries = [({'name': log['exception']['message'], 'log': log}, 1.0)
+                   for log in logs]
+        mix = simulate_error.CorpusMix(entries, 'seed')
+        timestamp = datetime.datetime(2018, 6, 14, 12)
+        encoded = list(simulate_error.generate_corpus_errors(
+            'kinesis', mix, '', 'prod', timestamp, 100, suffix='-new'))
+        self.assertEqual(100, len(encoded))
+        errors = [json.loads(base64.b64decode(e)) for e in encoded]
+        self.assertEqual(set(['a-new', 'b-new']),
+                         set(e['exception']['message'] for e in errors))
+        # test the time of every log is the time of the run
+        self.assertEqual(set(['2018/06/14 12:00:00']),
+                         set(e['time'] for e in errors))
+        self.assertEqual(set(['service-prod']),
+                         set(e['service'] for e in errors))
+        # test the logs of the corpus are left unchanged
+        self.assertEqual('', logs[0]['timestamp'])
+        # test formatted times replace count
+        encoded = list(simulate_error.generate_corpus_errors(
+            'kinesis', mix, '', 'prod', timestamp,
+            times=['2018/06/14 00:00:00'] * 3))
+        self.assertEqual(3, len(encoded))
+
+    def test_create_workload_projects(self):
+        args = argparse.Namespace(
+            fingerprints=None, new=False, skew=1.0, new_fraction=0.0,
+            seed='seed')
+        projects = [('a', 'prod', 2.0), ('b', 'eu', 1.0)]
+        workload = simulate_error.create_workload(
+            args, '', '', projects=projects)
+        self.assertEqual([('a', 'prod'), ('b', 'eu')], workload.projects)
+        self.assertEqual('', workload.fingerprint)
+        args.new = True
+        workload = simulate_error.create_workload(
+            args, '', '', projects=projects)
+        self.assertEqual(8, len(workload.fingerprint))
+        args.fingerprints = 10
+        workload = simulate_error.create_workload(
+            args, '', '', projects=projects)
+        self.assertEqual(10, len(workload.fingerprints))
+        self.assertEqual([('a', 'prod'), ('b', 'eu')], workload.projects)
+
+    def test_load_projects(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name, content in [
+                    ('a.txt', '# services\nCerberus-prod 3\n\nHydra-eu\n'),
+                    ('b.txt', 'Minotaur-wk-dev 0.5 # low traffic\n')]:
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(content)
+            filename = os.path.join(directory, 'a.txt')
+            self.assertTrue(simulate_error.is_project_list(filename))
+            self.assertEqual(
+                [('Cerberus', 'prod', 3.0), ('Hydra', 'eu', 1.0)],
+                simulate_error.load_projects(filename))
+            pattern = os.path.join(directory, '*.txt')
+            self.assertTrue(simulate_error.is_project_list(pattern))
+            self.assertEqual(
+                [('Cerberus', 'prod', 3.0), ('Hydra', 'eu', 1.0),
+                 ('Minotaur', 'wk-dev', 0.5)],
+                simulate_error.load_projects(pattern))
+            self.assertFalse(simulate_error.is_project_list('Cerberus-prod'))
+            # test invalid files
+            with self.assertRaises(IOError):
+                simulate_error.load_projects(
+                    os.path.join(directory, '*.json'))
+            with open(filename, 'w') as f:
+                f.write('Cerberus-prod heavy\n')
+            with self.assertRaises(ValueError):
+                simulate_error.load_projects(filename)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_get_project(self):
+        self.assertEqual('a-prod', simulate_error.get_project('a', 'prod'))
+        self.assertEqual('a', simulate_error.get_project('a', ''))
+
+    def test_get_envs(self):
+        envs = simulate_error.get_envs()
+        self.assertEqual(len(envs), len(set(envs)))
+        self.assertIn('prod', envs)
+
+    def test_parse_list(self):
+        self.assertEqual(['a', 'b'], simulate_error.parse_list('a, b,'))
+
+    def test_get_shard_count(self):
+        counts = [simulate_error.get_shard_count(10, worker, 3)
+                  for worker in range(3)]
+        self.assertEqual([4, 3, 3], counts)
+        self.assertEqual(10, simulate_error.get_shard_count(10, 0, 1))
+
+    def test_get_worker_seed(self):
+        self.assertEqual('seed', simulate_error.get_worker_seed('seed', 0, 1))
+        seeds = set(simulate_error.get_worker_seed('seed', worker, 4)
+                    for worker in range(4))
+        self.assertEqual(4, len(seeds))
+
+    def test_get_tick_seed(self):
+        self.assertEqual('seed', simulate_error.get_tick_seed('seed', 0))
+        # test ticks and workers have distinct seeds
+        seeds = set(simulate_error.get_worker_seed(
+            simulate_error.get_tick_seed('seed', tick), worker, 2)
+            for tick in range(2) for worker in range(2))
+        self.assertEqual(4, len(seeds))
+
+    def test_run_workers(self):
+        def send_incoming_errors(args, url, service, env, timestamp, results,
+                                 worker, workers, projects=None, tick=0):
+            stats = simulate_error.RunStats()
+            stats.record(0.010, 200, 100, worker + 1)
+            results.append((1, stats))
+            if worker == 1:
+                sys.exit(1)
+
+        args = argparse.Namespace(workers=2, concurrency=[1])
+        results = []
+        with mock.patch(
+                'insight.hubble.simulate_error.send_incoming_errors',
+                send_incoming_errors):
+            failed = simulate_error.run_workers(
+                args, 'url', 'service', 'prod', None, results)
+        self.assertTrue(failed)
+        self.assertEqual(1, len(results))
+        self.assertEqual(1, results[0][0])
+        self.assertEqual(2, results[0][1].requests)
+        self.assertEqual(3, results[0][1].records)
+
+    def test_run_workers_killed(self):
+        def send_incoming_errors(args, url, service, env, timestamp, results,
+                                 worker, workers, projects=None, tick=0):
+            stats = simulate_error.RunStats()
+            stats.record(0.010, 200, 100, 1)
+            results.append((1, stats))
+            if worker == 1:
+                # killed before its output is put on the queue
+                os.kill(os.getpid(), signal.SIGKILL)
+
+        args = argparse.Namespace(workers=2, concurrency=[1])
+        results = []
+        with mock.patch(
+                'insight.hubble.simulate_error.send_incoming_errors',
+                send_incoming_errors):
+            failed = simulate_error.run_workers(
+                args, 'url', 'service', 'prod', None, results)
+        # test a killed worker fails the run instead of blocking it
+        self.assertTrue(failed)
+        self.assertEqual(1, results[0][1].records)
+
+    def test_parse_int_list(self):
+        self.assertEqual([1], simulate_error.parse_int_list('1'))
+        self.assertEqual([1, 4, 16], simulate_error.parse_int_list('1,4,16'))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            simulate_error.parse_int_list('1,a')
+        with self.assertRaises(argparse.ArgumentTypeError):
+            simulate_error.parse_int_list('0')
+
+    def test_encode_error(self):
+        encoded = simulate_error.encode_error({'a': 1})
+        self.assertEqual({'a': 1}, json.loads(base64.b64decode(encoded)))
+
+    def test_create_batches(self):
+        # test batch size
+        batches = list(simulate_error.create_batches(
+            ['aaaa', 'bbbb', 'cccc'], 2))
+        self.assertEqual([['aaaa', 'bbbb'], ['cccc']], batches)
+        # test maximum bytes, {"data": ["aaaa", "bbbb"]} is 26 bytes
+        batches = list(simulate_error.create_batches(
+            ['aaaa', 'bbbb', 'cccc'], 10, 26))
+        self.assertEqual([['aaaa', 'bbbb'], ['cccc']], batches)
+        self.assertEqual(26, len(json.dumps({'data': batches[0]})))
+        # test error larger than maximum bytes
+        batches = list(simulate_error.create_batches(
+            ['aaaa', 'b' * 100], 10, 26))
+        self.assertEqual([['aaaa'], ['b' * 100]], batches)
+
+    @freeze_time("2018-06-14 12:00:00.000000")
+    @mock.patch('requests.Session.request')
+    def test_simulate_process_errors(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=200)
+        stats = simulate_error.RunStats()
+        simulate_error.simulate_process_errors('prod', 'gcp', 'url', stats)
+        data = mock_post.call_args[1]['data']
+        self.assertEqual('2018-06-14T11:59:00.000-00:00', data['start_time'])
+        self.assertEqual('2018-06-14T12:01:00.000-00:00', data['end_time'])
+        self.assertEqual('prod', data['env'])
+        self.assertEqual({'200': 1}, stats.status_codes)
+        # test the errors are processed around the time of a virtual clock
+        clock = simulate_error.VirtualClock(
+            datetime.datetime(2018, 3, 16), datetime.timedelta(0))
+        clock.advance(86400)
+        simulate_error.simulate_process_errors('prod', 'gcp', 'url',
+                                               clock=clock)
+        data = mock_post.call_args[1]['data']
+        self.assertEqual('2018-03-16T23:59:00.000-00:00', data['start_time'])
+        self.assertEqual('2018-03-17T00:01:00.000-00:00', data['end_time'])
+        # test non-200 status code
+        mock_post.return_value = mock.Mock(status_code=403)
+        with self.assertRaises(SystemExit):
+            simulate_error.simulate_process_errors('prod', 'gcp', 'url')
+
+    @mock.patch('requests.Session.request')
+    def test_process_windows(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=200)
+        start = datetime.datetime(2018, 6, 14)
+        windows = simulate_error.get_windows(
+            start, start + datetime.timedelta(hours=3), 3600)
+        stats = simulate_error.RunStats()
+        simulate_error.process_windows('', 'kinesis', 'url', windows, stats)
+        self.assertEqual(3, mock_post.call_count)
+        data = [c[1]['data'] for c in mock_post.call_args_list]
+        self.assertEqual('2018-06-14T00:00:00.000-00:00',
+                         data[0]['start_time'])
+        self.assertEqual(data[0]['end_time'], data[1]['start_time'])
+        self.assertEqual('2018-06-14T03:00:00.000-00:00', data[2]['end_time'])
+        self.assertIsNone(data[0]['env'])
+        self.assertEqual({'200': 3}, stats.status_codes)
+        # test processing stops at the first non-200 status code
+        mock_post.reset_mock()
+        mock_post.return_value = mock.Mock(status_code=500)
+        with self.assertRaises(SystemExit):
+            simulate_error.process_windows('', 'kinesis', 'url', windows)
+        self.assertEqual(1, mock_post.call_count)
+
+    def test_sweep_process_errors(self):
+        # the default logs are relative to the directory of the script
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(os.path.dirname(os.path.abspath(simulate_error.__file__)))
+        server = stub_server.start_server()
+        base_url = 'http://localhost:{}'.format(server.server_address[1])
+        args = argparse.Namespace(
+            sweep_sources=['gcp', 'kinesis'], source='gcp', envs=None,
+            concurrency=[2], probes=2, seed='seed', staging=False,
+            poll_timeout=5, poll_interval=0.01,
+            processed_errors_path=stub_server.PROCESSED_ERRORS)
+        windows = simulate_error.get_windows(
+            datetime.datetime(2018, 6, 14), datetime.datetime(2018, 6, 15),
+            43200)
+        process_stats = simulate_error.RunStats()
+        latency_stats = simulate_error.RunStats()
+        try:
+            simulate_error.sweep_process_errors(
+                args, base_url, 'Cerberus', 'prod', windows, process_stats,
+                latency_stats)
+        finally:
+            server.shutdown()
+            server.server_close()
+        # test each window, plus the current one, processed per source
+        self.assertEqual({'200': 6}, process_stats.status_codes)
+        self.assertEqual({'gcp:prod': 3, 'kinesis:prod': 3},
+                         server.get_stats()['process_errors'])
+        self.assertEqual({'processed': 4}, latency_stats.status_codes)
+
+    def test_create_report(self):
+        args = argparse.Namespace(source='gcp', count=1)
+        stats = simulate_error.RunStats()
+        stats.record(0.010, 200, 100, 1)
+        report = simulate_error.create_report(
+            args, [(4, stats)], simulate_error.RunStats())
+        self.assertEqual({'source': 'gcp', 'count': 1}, report['args'])
+        self.assertEqual(4, report['incoming_errors'][0]['concurrency'])
+        self.assertEqual(1, report['incoming_errors'][0]['records'])
+        self.assertEqual(0, report['process_errors']['requests'])
 
     def test_simulate_insight_lambda(self):
         # mock calls to child functions
@@ -175,6 +754,41 @@ class SimulateErrorTestCase(unittest.TestCase):
             }
         }, log)
 
+    def test_simulate_insight_lambdas(self):
+        gcp_logs = [
+            {'appId': 's~service', 'endTime': '2018-06-14T12:00:00.000000Z',
+             'latency': '', 'resource': 'context@type', 'versionId': ''},
+            {'endTime': '2018-06-14T12:00:01.5Z', 'resource': 'other'}
+        ]
+        kinesis_logs = [
+            {'exception': {'message': 'context@type'},
+             'service': {'name': 'service'},
+             'timestamp': '2018-06-14T12:00:00.000000Z',
+             'container': {'name': 'version'}},
+            {'service': {'name': 'app-int-collection-gateway'},
+             'timestamp': '2018-06-14T12:00:01.123456789Z',
+             'metadata': {'app_name': 'client'}},
+            {'service': {'name': 'service'},
+             'timestamp': '2018-06-14T12:00:02Z'},
+            # not zero-padded, falls back to datetime.strptime
+            {'service': {'name': 'service'},
+             'timestamp': '2018-6-14T12:00:03Z'}
+        ]
+        # test the batch lambdas against the scalar lambdas
+        for service, env in [('', ''), ('project', ''), ('project', 'env'),
+                             ('', 'env')]:
+            for source, logs in [('gcp', gcp_logs),
+                                 ('kinesis', kinesis_logs)]:
+                self.assertEqual(
+                    [simulate_error.simulate_insight_lambda(
+                        source, log, service, env) for log in logs],
+                    list(simulate_error.simulate_insight_lambdas(
+                        source, iter(logs), service, env)))
+        # test log without a service
+        with self.assertRaises(ValueError):
+            list(simulate_error.simulate_insight_lambdas(
+                'kinesis', [{'timestamp': '2018-06-14T12:00:00Z'}], '', ''))
+
     def test_generate_default_log(self):
         timestamp = datetime.datetime.now()
         log = simulate_error.populate_default_log(
@@ -282,6 +896,28 @@ class SimulateErrorTestCase(unittest.TestCase):
         service, env = simulate_error.get_service_env('service')
         self.assertEqual('service', service)
         self.assertEqual('', env)
+        # test suffix in the middle of the name
+        self.assertEqual(('service-production', ''),
+                         simulate_error.get_service_env('service-production'))
+        self.assertEqual(('service-eu-api', 'wk-dev'),
+                         simulate_error.get_service_env(
+                             'service-eu-api-wk-dev'))
+        self.assertEqual(('service-prod', 'eu'),
+                         simulate_error.get_service_env('service-prod-eu'))
+
+    def test_get_service_envs(self):
+        self.assertEqual(
+            [('a', 'prod'), ('b', 'eu'), ('c', ''), ('a', 'prod')],
+            simulate_error.get_service_envs(
+                ['a-prod', 'b-eu', 'c', 'a-prod']))
+
+    @mock.patch('insight.hubble.simulate_error.MAX_SERVICE_ENVS', 2)
+    @mock.patch('insight.hubble.simulate_error._service_envs', {})
+    def test_get_service_env_memo(self):
+        simulate_error.get_service_envs(['a-prod', 'b-eu', 'c-demo'])
+        # test the memo is cleared once it is full
+        self.assertEqual({'c-demo': ('c', 'demo')},
+                         simulate_error._service_envs)
 
     def test_open_json_file(self):
         # test valid JSON
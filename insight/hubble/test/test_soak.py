@@ -0,0 +1,102 @@
+import unittest
+import mock
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+from insight.hubble import soak
+
+
+class SoakTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'soak.json')
+        self.args = argparse.Namespace(
+            source='kinesis', count=1000, concurrency=[4], seed='seed',
+            resume=False, report=None, checkpoint_interval=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_resources(self):
+        self.assertGreater(soak.get_rss(), 0)
+        self.assertGreaterEqual(soak.get_cpu_seconds(), 0)
+
+    def test_get_rss_growth(self):
+        samples = [{'elapsed': t, 'rss_bytes': 1000 + 2 * t}
+                   for t in range(0, 100, 10)]
+        self.assertAlmostEqual(7200, soak.get_rss_growth(samples))
+        self.assertIsNone(soak.get_rss_growth(samples[:1]))
+        self.assertIsNone(soak.get_rss_growth(samples[:1] * 2))
+
+    def test_checkpoint(self):
+        checkpointer = soak.Checkpointer(self.filename, self.args)
+        checkpointer.stats.record(0.010, 200, 100, 10)
+        checkpointer.checkpoint()
+        checkpoint = soak.read_checkpoint(self.filename)
+        self.assertEqual(10, checkpoint['stats']['records'])
+        self.assertEqual([4], checkpoint['args']['concurrency'])
+        self.assertFalse(checkpoint['complete'])
+        self.assertEqual(1, len(checkpoint['samples']))
+        # test the checkpoint replaces the last one
+        self.assertEqual(['soak.json'], os.listdir(self.directory))
+        with open(self.filename, 'w') as f:
+            json.dump({'version': 0}, f)
+        with self.assertRaises(ValueError):
+            soak.read_checkpoint(self.filename)
+
+    def test_resume(self):
+        checkpointer = soak.Checkpointer(self.filename, self.args)
+        checkpointer.start()
+        checkpointer.stats.record(0.010, 200, 100, 10)
+        checkpointer.stop()
+        # test a resumed run continues the statistics and seed of the last
+        # checkpoint
+        args = argparse.Namespace(**vars(self.args))
+        args.seed = None
+        args.resume = True
+        resumed = soak.Checkpointer(self.filename, args)
+        resumed.resume()
+        self.assertEqual('seed', args.seed)
+        self.assertEqual(10, resumed.stats.records)
+        self.assertEqual({'200': 1}, resumed.stats.status_codes)
+        self.assertEqual(1, resumed.resumes)
+        self.assertEqual(2, len(resumed.samples))
+        resumed.start()
+        resumed.stop(complete=True)
+        checkpoint = soak.read_checkpoint(self.filename)
+        self.assertTrue(checkpoint['complete'])
+        self.assertEqual([0, 0, 1, 1],
+                         [s['run'] for s in checkpoint['samples']])
+        # test a run with different arguments cannot resume
+        args.count = 2000
+        with self.assertRaises(ValueError):
+            soak.Checkpointer(self.filename, args).resume()
+
+    @mock.patch('insight.hubble.soak.get_cpu_seconds')
+    @mock.patch('insight.hubble.soak.get_rss')
+    def test_format_resources(self, mock_rss, mock_cpu):
+        checkpointer = soak.Checkpointer(self.filename, self.args)
+        checkpointer.samples = [
+            {'run': 0, 'elapsed': 0.0, 'records': 0, 'rss_bytes': 10 ** 9,
+             'cpu_seconds': 0.0},
+            {'run': 1, 'elapsed': 0.0, 'records': 0, 'rss_bytes': 10 ** 7,
+             'cpu_seconds': 0.0}]
+        checkpointer.resumes = 1
+        mock_rss.return_value = 10 ** 7 + 10 ** 6
+        mock_cpu.return_value = 1.0
+        checkpointer.stats.elapsed = 3600.0
+        checkpointer.stats.records = 1000
+        checkpointer.sample()
+        # test only the samples of the current process are reported
+        self.assertEqual(
+            'Soak test: 1000 errors in 3600s, RSS 11.0 MB (+1.00 MB/h), '
+            'CPU 0.0% (1000.00 ms/1000 errors)',
+            checkpointer.format_resources())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+import base64
+import json
+import time
+import zlib
+
+import requests
+
+from insight.hubble import stub_server
+from insight.hubble.stub_server import (
+    INCOMING_GCP_ERRORS, INCOMING_KINESIS_ERRORS, INCOMING_LOGS)
+
+
+class StubServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.gcp_error = {
+            '_time': '2018-06-14T12:00:00.000000Z',
+            'appId': 's~service',
+            'latency': '0.1s',
+            'resource': '/resource',
+            'stack': '',
+            'versionId': '1'
+        }
+        self.kinesis_error = {
+            'context': {},
+            'exception': {'message': 'Exception'},
+            'level': 'error',
+            'message': '',
+            'metadata': {},
+            'service': 'service-prod',
+            'time': '2018/06/14 12:00:00'
+        }
+        self.server = stub_server.start_server()
+        self.url = 'http://localhost:{}'.format(
+            self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, path, errors):
+        data = [base64.b64encode(json.dumps(e)) for e in errors]
+        return requests.post(self.url + path, json={'data': data})
+
+    def test_incoming_errors(self):
+        response = self.post(INCOMING_GCP_ERRORS, [self.gcp_error] * 3)
+        self.assertEqual(200, response.status_code)
+        response = self.post(INCOMING_KINESIS_ERRORS, [self.kinesis_error])
+        self.assertEqual(200, response.status_code)
+
+        stats = requests.get(self.url + stub_server.STATS).json()
+        self.assertEqual(4, stats['records'])
+        self.assertEqual(
+            {'requests': 1, 'records': 3},
+            dict((k, v) for k, v in
+                 stats['endpoints'][INCOMING_GCP_ERRORS].items()
+                 if k != 'bytes'))
+        self.assertEqual(
+            1, stats['endpoints'][INCOMING_KINESIS_ERRORS]['records'])
+        self.assertEqual(0, stats['rejected'])
+
+    def test_invalid_errors(self):
+        # test error of the wrong source
+        response = self.post(INCOMING_GCP_ERRORS, [self.kinesis_error])
+        self.assertEqual(400, response.status_code)
+        self.assertIn('missing', response.text)
+        # test body that is not base64 encoded JSON
+        response = requests.post(self.url + INCOMING_KINESIS_ERRORS,
+                                 json={'data': ['not base64']})
+        self.assertEqual(400, response.status_code)
+        response = requests.post(self.url + INCOMING_KINESIS_ERRORS,
+                                 data='not JSON')
+        self.assertEqual(400, response.status_code)
+        # test unknown path
+        response = self.post('/unknown', [self.kinesis_error])
+        self.assertEqual(404, response.status_code)
+
+        stats = self.server.get_stats()
+        self.assertEqual(0, stats['records'])
+        self.assertEqual(3, stats['rejected'])
+
+    def test_compressed_errors(self):
+        body = json.dumps({'data': [
+            base64.b64encode(json.dumps(self.kinesis_error))] * 2})
+        for encoding, wbits in [('gzip', 16 + zlib.MAX_WBITS),
+                                ('deflate', zlib.MAX_WBITS)]:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+            response = requests.post(
+                self.url + INCOMING_KINESIS_ERRORS,
+                data=compressor.compress(body) + compressor.flush(),
+                headers={'Content-Encoding': encoding})
+            self.assertEqual(200, response.status_code)
+        self.assertEqual(4, self.server.get_stats()['records'])
+        # test unsupported and corrupt bodies
+        response = requests.post(self.url + INCOMING_KINESIS_ERRORS,
+                                 data=body, headers={'Content-Encoding': 'br'})
+        self.assertEqual(415, response.status_code)
+        response = requests.post(self.url + INCOMING_KINESIS_ERRORS,
+                                 data=body,
+                                 headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(2, self.server.get_stats()['rejected'])
+
+    def test_process_errors(self):
+        response = requests.post(self.url + stub_server.PROCESS_ERRORS,
+                                 data={'source': 'kinesis', 'env': 'prod'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'kinesis:prod': 1},
+                         self.server.get_stats()['process_errors'])
+
+    def test_inject_errors(self):
+        self.server.error_rate = 1.0
+        self.server.error_status = 503
+        response = self.post(INCOMING_KINESIS_ERRORS, [self.kinesis_error])
+        self.assertEqual(503, response.status_code)
+        stats = self.server.get_stats()
+        self.assertEqual(1, stats['injected_errors'])
+        self.assertEqual(0, stats['records'])
+
+    def test_incoming_logs(self):
+        log = {
+            'context': {},
+            'level': 'info',
+            'message': 'message',
+            'metadata': {'logger': 'service-prod'},
+            'service': {'name': 'service-prod'},
+            'timestamp': '2018-06-14T12:00:00.000000Z'
+        }
+        response = self.post(INCOMING_LOGS, [log] * 2)
+        self.assertEqual(200, response.status_code)
+        response = self.post(INCOMING_LOGS, [self.gcp_error])
+        self.assertEqual(400, response.status_code)
+
+        stats = requests.get(self.url + stub_server.STATS).json()
+        self.assertEqual(2, stats['endpoints'][INCOMING_LOGS]['records'])
+        self.assertEqual(1, stats['rejected'])
+
+    def test_validate_error(self):
+        stub_server.validate_error('gcp', self.gcp_error)
+        stub_server.validate_error('kinesis', self.kinesis_error)
+        self.kinesis_error['service'] = ''
+        with self.assertRaises(ValueError):
+            stub_server.validate_error('kinesis', self.kinesis_error)
+        del self.gcp_error['stack']
+        with self.assertRaises(ValueError) as e:
+            stub_server.validate_error('gcp', self.gcp_error)
+        self.assertEqual('Error is missing stack.', str(e.exception))
+
+    def test_processed_errors(self):
+        self.post(INCOMING_GCP_ERRORS, [self.gcp_error])
+        url = self.url + stub_server.PROCESSED_ERRORS
+        params = {'source': 'gcp', 'identifier': '/resource'}
+        self.assertEqual({'errors': []}, requests.get(url, params).json())
+        requests.post(self.url + stub_server.PROCESS_ERRORS,
+                      data={'source': 'gcp'})
+        self.assertEqual({'errors': ['/resource']},
+                         requests.get(url, params).json())
+        # test errors are processed per source
+        params['source'] = 'kinesis'
+        self.assertEqual({'errors': []}, requests.get(url, params).json())
+
+    def test_process_delay(self):
+        self.server.process_delay = 0.05
+        self.post(INCOMING_KINESIS_ERRORS, [self.kinesis_error])
+        self.server.process('kinesis')
+        self.assertFalse(self.server.is_processed('kinesis', 'Exception'))
+        time.sleep(0.2)
+        self.assertTrue(self.server.is_processed('kinesis', 'Exception'))
@@ -0,0 +1,102 @@
+import unittest
+import mock
+import base64
+import json
+import time
+import urlparse
+
+import requests
+
+from insight.hubble import stub_server, sweep
+from insight.hubble.stub_server import INCOMING_KINESIS_ERRORS
+from insight.stats import RunStats
+from insight.hubble.sweep import Probe
+
+
+class SweepTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = stub_server.start_server()
+        self.url = 'http://localhost:{}'.format(
+            self.server.server_address[1])
+        self.processed_url = self.url + stub_server.PROCESSED_ERRORS
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def send_error(self, identifier):
+        error = {
+            'context': {},
+            'exception': {'message': identifier},
+            'level': 'error',
+            'message': '',
+            'metadata': {},
+            'service': 'service-prod',
+            'time': '2018/06/14 12:00:00'
+        }
+        requests.post(self.url + INCOMING_KINESIS_ERRORS, json={
+            'data': [base64.b64encode(json.dumps(error))]})
+        return Probe('kinesis', 'prod', identifier, time.time())
+
+    def test_encode_form(self):
+        form = urlparse.parse_qs(sweep.encode_form(
+            {'source': 'gcp', 'env': None, 'start_time': 'a b'}))
+        self.assertEqual({'source': ['gcp'], 'start_time': ['a b']}, form)
+
+    def test_process_concurrently(self):
+        forms = [{'source': 'kinesis', 'env': e} for e in ['prod', 'eu']]
+        stats = RunStats()
+        sender = sweep.process_concurrently(
+            self.url + '/tasks/process_errors', forms, 2, stats=stats)
+        self.assertIsNone(sender.exception)
+        self.assertEqual({'200': 2}, stats.status_codes)
+        self.assertEqual({'kinesis:prod': 1, 'kinesis:eu': 1},
+                         self.server.get_stats()['process_errors'])
+
+    def test_poll_probes(self):
+        probes = [self.send_error('Exception-{}'.format(i)) for i in range(3)]
+        sweep.process_concurrently(
+            self.url + '/tasks/process_errors', [{'source': 'kinesis'}])
+        stats = RunStats()
+        found = sweep.poll_probes(self.processed_url, probes, 1, 0.01, 2,
+                                  stats=stats)
+        self.assertEqual(3, found)
+        self.assertEqual({'processed': 3}, stats.status_codes)
+
+    def test_poll_probes_timeout(self):
+        # test probe which is never processed
+        probe = self.send_error('Exception')
+        stats = RunStats()
+        found = sweep.poll_probes(self.processed_url, [probe], 0.05, 0.01,
+                                  stats=stats)
+        self.assertEqual(0, found)
+        self.assertEqual({'timeout': 1}, stats.status_codes)
+        # test timeouts are not recorded as latencies
+        self.assertIsNone(stats.summary()['latency_ms']['max'])
+
+    def test_poll_probes_not_found(self):
+        # test polling an endpoint which does not exist fails at once
+        probe = self.send_error('Exception')
+        start = time.time()
+        with self.assertRaises(requests.HTTPError) as context:
+            sweep.poll_probes(self.url + '/api/v1/missing', [probe] * 3, 5,
+                              0.01, 2)
+        self.assertEqual(404, context.exception.response.status_code)
+        self.assertLess(time.time() - start, 1)
+
+    def test_poll_probe_failed(self):
+        # test a poll that times out or fails with 503 is retried
+        session = mock.Mock()
+        session.get.side_effect = [
+            requests.Timeout(),
+            mock.Mock(status_code=503),
+            mock.Mock(status_code=200, json=lambda: {'errors': [{}]})]
+        probe = Probe('kinesis', None, 'Exception', time.time())
+        self.assertTrue(sweep.poll_probe(
+            session, self.processed_url, probe, 1, 0.01))
+        self.assertEqual(3, session.get.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
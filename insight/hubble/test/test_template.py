@@ -0,0 +1,67 @@
+import unittest
+import base64
+import json
+
+from insight.hubble import simulate_error
+from insight.hubble import template
+
+
+class TemplateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.gcp_error = {
+            '_time': '2018-06-14T12:00:00.000000Z',
+            'appId': 's~service',
+            'latency': '',
+            'resource': 'context@type',
+            'stack': '',
+            'versionId': ''
+        }
+        self.kinesis_error = {
+            'context': {},
+            'exception': {
+                'stacktrace': '',
+                'message': u'context@type \u2013 "quoted"',
+                'type': ''
+            },
+            'level': 'error',
+            'message': '',
+            'metadata': {},
+            'service': 'service-prod',
+            'time': '2018/06/14 12:00:00'
+        }
+
+    def test_render(self):
+        error_template = template.ErrorTemplate('gcp', self.gcp_error)
+        self.assertEqual(json.dumps(self.gcp_error), error_template.render())
+        error_template = template.ErrorTemplate('kinesis', self.kinesis_error)
+        self.assertEqual(
+            json.dumps(self.kinesis_error), error_template.render())
+
+    def test_render_fields(self):
+        error_template = template.ErrorTemplate('gcp', self.gcp_error)
+        rendered = error_template.render('2018-06-15T12:00:00.000000Z', '-a')
+        self.gcp_error['_time'] = '2018-06-15T12:00:00.000000Z'
+        self.gcp_error['resource'] = 'context@type-a'
+        self.assertEqual(json.dumps(self.gcp_error), rendered)
+        error_template = template.ErrorTemplate('kinesis', self.kinesis_error)
+        rendered = error_template.render('2018/06/15 12:00:00', '-"b"')
+        self.kinesis_error['time'] = '2018/06/15 12:00:00'
+        self.kinesis_error['exception']['message'] += '-"b"'
+        self.assertEqual(json.dumps(self.kinesis_error), rendered)
+
+    def test_render_missing_fields(self):
+        error = {'appId': 's~service'}
+        error_template = template.ErrorTemplate('gcp', error)
+        self.assertEqual(json.dumps(error), error_template.render(suffix='-a'))
+
+    def test_encode(self):
+        error_template = template.ErrorTemplate('gcp', self.gcp_error)
+        self.assertEqual(simulate_error.encode_error(self.gcp_error),
+                         error_template.encode())
+        self.assertEqual(self.gcp_error, json.loads(
+            base64.b64decode(error_template.encode())))
+
+    def test_escape(self):
+        self.assertEqual('a\\"b', template.escape('a"b'))
+        self.assertEqual('\\u2013', template.escape(u'\u2013'))
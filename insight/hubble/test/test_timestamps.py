@@ -0,0 +1,40 @@
+import unittest
+import datetime
+
+from insight.hubble import timestamps
+
+
+class TimestampsTestCase(unittest.TestCase):
+
+    def test_parse_raw_timestamp(self):
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12, 0, 1, 500000),
+            timestamps.parse_raw_timestamp('2018-06-14T12:00:01.5Z'))
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12, 0, 1, 123456),
+            timestamps.parse_raw_timestamp('2018-06-14T12:00:01.123456789Z'))
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12, 0, 1),
+            timestamps.parse_raw_timestamp('2018-06-14T12:00:01Z'))
+        # test timestamp that is not zero-padded
+        self.assertEqual(
+            datetime.datetime(2018, 6, 14, 12, 0, 1),
+            timestamps.parse_raw_timestamp('2018-6-14T12:00:01Z'))
+        # test invalid timestamps
+        with self.assertRaises(ValueError):
+            timestamps.parse_raw_timestamp('2018-13-14T12:00:01Z')
+        with self.assertRaises(ValueError):
+            timestamps.parse_raw_timestamp('2018-06-14 12:00:01')
+
+    def test_format_kinesis_time(self):
+        for timestamp in ['2018-06-14T12:00:01.000000Z',
+                          '2018-06-14T12:00:01.123456789Z',
+                          '2018-06-14T12:00:01Z',
+                          '2018-6-14T12:00:01Z']:
+            self.assertEqual('2018/06/14 12:00:01',
+                             timestamps.format_kinesis_time(timestamp))
+        # test invalid timestamps
+        with self.assertRaises(ValueError):
+            timestamps.format_kinesis_time('2018-02-30T12:00:01Z')
+        with self.assertRaises(ValueError):
+            timestamps.format_kinesis_time('2018-06-14 12:00:01')
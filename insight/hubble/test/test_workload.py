@@ -0,0 +1,74 @@
+import unittest
+import collections
+import random
+
+from insight.hubble import workload
+
+
+class WorkloadTestCase(unittest.TestCase):
+
+    def test_workload(self):
+        with self.assertRaises(ValueError):
+            workload.Workload(0, [('service', 'prod')])
+        with self.assertRaises(ValueError):
+            workload.Workload(10, [])
+        w = workload.Workload(10, [('service', 'prod')], seed='seed')
+        self.assertEqual(10, len(set(w.fingerprints)))
+        # the same seed yields the same fingerprints
+        self.assertEqual(w.fingerprints, workload.Workload(
+            10, [('service', 'prod')], seed='seed').fingerprints)
+
+    def test_sample(self):
+        w = workload.Workload(
+            100, [('a', 'prod'), ('b', 'eu')], skew=1.0, seed='seed')
+        samples = list(w.samples(20000))
+        self.assertEqual(20000, len(samples))
+        fingerprints = collections.Counter(s[2] for s in samples)
+        projects = collections.Counter(s[:2] for s in samples)
+        # rank 1 is drawn with probability 1 / H(100) ~ 0.19
+        self.assertAlmostEqual(
+            0.19, fingerprints[w.fingerprints[0]] / 20000.0, delta=0.02)
+        # rank 2 is drawn half as often as rank 1
+        self.assertAlmostEqual(
+            0.5, float(fingerprints[w.fingerprints[1]]) /
+            fingerprints[w.fingerprints[0]], delta=0.1)
+        self.assertAlmostEqual(
+            0.5, projects[('a', 'prod')] / 20000.0, delta=0.02)
+
+    def test_sample_new_fraction(self):
+        w = workload.Workload(
+            10, [('a', 'prod')], new_fraction=0.5, seed='seed')
+        samples = [s[2] for s in w.samples(1000)]
+        new = [s for s in samples if s not in w.fingerprints]
+        self.assertAlmostEqual(500, len(new), delta=60)
+        self.assertEqual(len(new), len(set(new)))
+        # test skipped draws continue where they stopped
+        w = workload.Workload(
+            10, [('a', 'prod')], new_fraction=0.5, seed='seed')
+        w.skip(500)
+        self.assertEqual(samples[500:], [s[2] for s in w.samples(500)])
+
+    def test_sample_weights(self):
+        w = workload.Workload(
+            1, [('a', 'prod', 3), ('b', 'prod', 1)], seed='seed')
+        projects = collections.Counter(s[:2] for s in w.samples(10000))
+        self.assertAlmostEqual(
+            0.75, projects[('a', 'prod')] / 10000.0, delta=0.02)
+
+    def test_create_fingerprint(self):
+        fingerprint = workload.create_fingerprint('seed', 1)
+        self.assertEqual(8, len(fingerprint))
+        self.assertTrue(fingerprint.startswith('-'))
+        self.assertNotEqual(fingerprint, workload.create_fingerprint(
+            'seed', 2))
+
+    def test_cumulative(self):
+        self.assertEqual([0.25, 0.5, 1.0], workload.cumulative([1, 1, 2]))
+        with self.assertRaises(ValueError):
+            workload.cumulative([0, 0])
+
+    def test_draw(self):
+        r = random.Random(1)
+        weights = workload.cumulative([0, 1, 0])
+        self.assertEqual(set([1]), set(
+            workload.draw(r, weights) for _ in range(100)))
@@ -0,0 +1,77 @@
+import datetime
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import (
+    TIME_FORMAT_KINESIS_ERROR, TIME_FORMAT_KINESIS_RAW_ERROR,
+    TIME_FORMAT_KINESIS_RAW_ERROR_NO_MICRO_SEC)
+
+# timestamp of a raw GCP or Kinesis log, i.e. TIME_FORMAT_GCP_RAW_ERROR,
+# TIME_FORMAT_KINESIS_RAW_ERROR or TIME_FORMAT_KINESIS_RAW_ERROR_NO_MICRO_SEC
+# with zero-padded fields
+RAW_TIMESTAMP = re.compile(
+    r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d+))?Z\Z')
+
+
+def parse_raw_timestamp(timestamp):
+    """
+    Parse the timestamp of a raw GCP or Kinesis log.
+
+    Timestamps of the fixed raw layouts are parsed by slicing, which is an
+    order of magnitude faster than datetime.strptime. A fraction longer than
+    6 digits is truncated to microseconds. Other timestamps fall back to
+    datetime.strptime.
+
+    :param timestamp: timestamp of the form %Y-%m-%dT%H:%M:%S.%fZ or
+        %Y-%m-%dT%H:%M:%SZ
+    :type timestamp: str
+    :return: time of the log
+    :rtype: datetime.datetime
+    """
+    match = RAW_TIMESTAMP.match(timestamp)
+    if not match:
+        if '.' in timestamp:
+            return datetime.datetime.strptime(
+                timestamp, TIME_FORMAT_KINESIS_RAW_ERROR)
+        return datetime.datetime.strptime(
+            timestamp, TIME_FORMAT_KINESIS_RAW_ERROR_NO_MICRO_SEC)
+
+    year, month, day, hour, minute, second, fraction = match.groups()
+    microsecond = int(fraction[:6].ljust(6, '0')) if fraction else 0
+    return datetime.datetime(int(year), int(month), int(day), int(hour),
+                             int(minute), int(second), microsecond)
+
+
+def format_kinesis_time(timestamp):
+    """
+    Convert the timestamp of a raw Kinesis log to the time of a processed
+    Kinesis error, i.e. TIME_FORMAT_KINESIS_ERROR.
+
+    Timestamps of the fixed raw layouts are converted by slicing, without
+    parsing them into a datetime. Other timestamps fall back to
+    datetime.strptime, as simulate_insight_kinesis_lambda does.
+
+    :param timestamp: timestamp of the form %Y-%m-%dT%H:%M:%S.%fZ or
+        %Y-%m-%dT%H:%M:%SZ
+    :type timestamp: str
+    :return: time of the form %Y/%m/%d %H:%M:%S
+    :rtype: str
+    """
+    match = RAW_TIMESTAMP.match(timestamp)
+    if not match:
+        if timestamp.find('.') >= 0:
+            time = datetime.datetime.strptime(
+                timestamp.rsplit('.', 1)[0], '%Y-%m-%dT%H:%M:%S')
+        else:
+            time = datetime.datetime.strptime(
+                timestamp, TIME_FORMAT_KINESIS_RAW_ERROR_NO_MICRO_SEC)
+        return time.strftime(TIME_FORMAT_KINESIS_ERROR)
+
+    year, month, day, hour, minute, second = match.groups()[:6]
+    # validate the date, as datetime.strptime does
+    datetime.datetime(int(year), int(month), int(day), int(hour),
+                      int(minute), int(second))
+    return '{}/{}/{} {}:{}:{}'.format(year, month, day, hour, minute, second)
@@ -0,0 +1,192 @@
+import bisect
+import hashlib
+import itertools
+import random
+
+
+class ProjectMix(object):
+    """
+    Weighted mix of the projects errors are sent from.
+
+    Every error gets the same fingerprint, e.g. none to send the error of
+    each project as it is, or a single new one.
+    """
+
+    def __init__(self, projects, fingerprint='', random_seed=None):
+        """
+        :param projects: (service, env) pairs errors are sent from, or
+            (service, env, weight) to send a weighted share from a project
+        :type projects: list
+        :param fingerprint: fingerprint of every error, see add_suffix
+        :type fingerprint: str
+        :param random_seed: seed of the draws
+        :type random_seed: str
+        """
+        if not projects:
+            raise ValueError('projects must not be empty.')
+        self.projects = [project[:2] for project in projects]
+        self.fingerprint = fingerprint
+        self._project_weights = cumulative(
+            project[2] if len(project) > 2 else 1.0 for project in projects)
+        self._random = random.Random(random_seed)
+
+    def sample_project(self):
+        """
+        Draw the project of an error.
+
+        :return: service, environment
+        :rtype: str, str
+        """
+        return self.projects[draw(self._random, self._project_weights)]
+
+    def sample(self):
+        """
+        Draw the project and fingerprint of an error.
+
+        :return: service, environment, fingerprint
+        :rtype: str, str, str
+        """
+        service, env = self.sample_project()
+        return service, env, self.fingerprint
+
+    def samples(self, count=None):
+        """
+        Draw the projects and fingerprints of a number of errors.
+
+        :param count: number of errors, None for an unbounded number
+        :type count: int
+        :return: generator of (service, environment, fingerprint)
+        :rtype: generator
+        """
+        draws = itertools.count() if count is None else xrange(count)
+        for _ in draws:
+            yield self.sample()
+
+    def skip(self, count):
+        """
+        Skip the draws of a number of errors, e.g. the errors a soak test
+        sent before it was resumed, so that the draws continue where they
+        stopped.
+
+        :param count: number of errors
+        :type count: int
+        :return: None
+        :rtype: None
+        """
+        for _ in xrange(count):
+            self.sample()
+
+
+class Workload(ProjectMix):
+    """
+    Mix of error fingerprints, services and environments.
+
+    Fingerprints are drawn from a Zipf distribution: the fingerprint of rank
+    k (starting at 1) is drawn with a probability proportional to
+    1 / k ** skew, so a few fingerprints are very hot and the rest form a
+    long tail. With probability new_fraction an error gets a fingerprint that
+    has never been sent before instead.
+
+    A fingerprint is the suffix appended to the identifier of an error, see
+    add_suffix. The same seed yields the same fingerprints, so that workers
+    of a run share them, while the draws depend on random_seed and new
+    fingerprints on new_seed.
+    """
+
+    def __init__(self, fingerprints, projects, skew=1.0, new_fraction=0.0,
+                 seed='', random_seed=None, new_seed=None):
+        """
+        :param fingerprints: number of distinct fingerprints
+        :type fingerprints: int
+        :param projects: (service, env) pairs errors are sent from, or
+            (service, env, weight) to send a weighted share from a project
+        :type projects: list
+        :param skew: exponent of the Zipf distribution, 0 is uniform
+        :type skew: float
+        :param new_fraction: fraction of errors with a new fingerprint
+        :type new_fraction: float
+        :param seed: seed of the fingerprints
+        :type seed: str
+        :param random_seed: seed of the draws, defaults to seed
+        :type random_seed: str
+        :param new_seed: seed of new fingerprints, defaults to random_seed
+        :type new_seed: str
+        """
+        if fingerprints < 1:
+            raise ValueError('fingerprints must be at least 1.')
+        self.seed = seed
+        self.random_seed = seed if random_seed is None else random_seed
+        self.new_seed = self.random_seed if new_seed is None else new_seed
+        ProjectMix.__init__(self, projects, random_seed=self.random_seed)
+        self.fingerprints = [create_fingerprint(seed, rank)
+                             for rank in range(fingerprints)]
+        self.skew = skew
+        self.new_fraction = new_fraction
+        self._fingerprint_weights = cumulative(
+            1.0 / (rank + 1) ** skew for rank in range(fingerprints))
+        self._new = itertools.count()
+
+    def sample(self):
+        """
+        Draw the project and fingerprint of an error.
+
+        :return: service, environment, fingerprint
+        :rtype: str, str, str
+        """
+        service, env = self.sample_project()
+        if self.new_fraction and self._random.random() < self.new_fraction:
+            fingerprint = create_fingerprint(
+                '{}-new'.format(self.new_seed), next(self._new))
+        else:
+            fingerprint = self.fingerprints[
+                draw(self._random, self._fingerprint_weights)]
+        return service, env, fingerprint
+
+
+def create_fingerprint(seed, rank):
+    """
+    Return the fingerprint of a given rank, e.g. '-1a2b3c4'.
+
+    :param seed: seed of the fingerprints
+    :type seed: str
+    :param rank: rank of the fingerprint
+    :type rank: int
+    :return: fingerprint
+    :rtype: str
+    """
+    hash = hashlib.sha256('{}-{}'.format(seed, rank))
+    return '{}{}'.format('-', hash.hexdigest()[0:7])
+
+
+def cumulative(weights):
+    """
+    Return the normalised, cumulative weights.
+
+    :param weights: iterable of non-negative weights
+    :type weights: iterable
+    :return: cumulative weights, the last of which is 1
+    :rtype: list
+    """
+    totals = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        totals.append(total)
+    if not totals or total <= 0:
+        raise ValueError('weights must contain a positive weight.')
+    return [t / total for t in totals]
+
+
+def draw(random_, weights):
+    """
+    Draw an index with probabilities given by cumulative weights.
+
+    :param random_: random number generator
+    :type random_: random.Random
+    :param weights: cumulative weights, see cumulative
+    :type weights: list
+    :return: index
+    :rtype: int
+    """
+    return min(bisect.bisect_right(weights, random_.random()),
+               len(weights) - 1)
@@ -0,0 +1,690 @@
+import Queue
+import collections
+import json
+import random
+import threading
+import time
+import zlib
+
+import requests
+
+from constants import MAX_BATCH_BYTES
+from stats import RunStats
+from utils import HttpClient
+
+# profiles of the target rate over the duration of a run
+RATE_PROFILES = ['constant', 'ramp', 'step', 'spike']
+
+# longest time the token bucket sleeps before re-reading its rate
+MAX_WAIT = 0.1
+
+# shortest time the token bucket sleeps while waiting for tokens
+MIN_WAIT = 0.001
+
+# status codes of responses that are retried
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# exceptions of requests that are retried
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+# base and maximum backoff between retries in seconds
+BACKOFF = 0.1
+MAX_BACKOFF = 10.0
+
+# content encodings request bodies can be compressed with, and the default
+# compression level
+CONTENT_ENCODINGS = ['gzip', 'deflate']
+COMPRESSION_LEVEL = 6
+
+# fraction of the target rate an interval must achieve for an adaptive rate
+# to be increased
+MIN_ACHIEVED_RATE = 0.9
+
+
+def create_batches(encoded_records, batch_size=1, max_bytes=MAX_BATCH_BYTES):
+    """
+    Group encoded records, e.g. errors, into batches for a single request
+    body.
+
+    A batch is closed once it contains batch_size records or once adding the
+    next record would make the request body, {"data": [...]}, exceed
+    max_bytes. A record that exceeds max_bytes on its own is sent in a batch
+    by itself.
+
+    :param encoded_records: iterable of base64 encoded records
+    :type encoded_records: iterable
+    :param batch_size: maximum number of records per batch
+    :type batch_size: int
+    :param max_bytes: maximum size of a request body in bytes
+    :type max_bytes: int
+    :return: generator of lists of base64 encoded records
+    :rtype: generator
+    """
+    # size of '{"data": []}'
+    overhead = len(json.dumps({'data': []}))
+    batch = []
+    size = overhead
+
+    for encoded in encoded_records:
+        # quoted string, separated from the previous one by ', '
+        item_size = len(encoded) + 2 + (2 if batch else 0)
+        is_full = (len(batch) >= batch_size or
+                   size + item_size > max_bytes)
+        if batch and is_full:
+            yield batch
+            batch = []
+            size = overhead
+            item_size = len(encoded) + 2
+        batch.append(encoded)
+        size += item_size
+
+    if batch:
+        yield batch
+
+
+def create_payloads(records, batch_size=1, max_bytes=MAX_BATCH_BYTES):
+    """
+    Lazily create the payloads of the requests sending records, each the
+    body of a batch of records, see create_batches.
+
+    A record is either base64 encoded, or (base64 encoded record, label),
+    e.g. labelled with the project of an error. The records of each payload
+    are counted by label, so that a Sender counts the records it delivers
+    by label.
+
+    :param records: iterable of base64 encoded records, or of (base64
+        encoded record, label)
+    :type records: iterable
+    :param batch_size: maximum number of records per batch
+    :type batch_size: int
+    :param max_bytes: maximum size of a request body in bytes
+    :type max_bytes: int
+    :return: generator of (body, number of records in the body, number of
+        records per label)
+    :rtype: generator
+    """
+    # labels of the records read by create_batches, which reads one record
+    # past the end of a batch
+    labels = collections.deque()
+
+    def encoded_records():
+        for record in records:
+            if isinstance(record, tuple):
+                record, label = record
+            else:
+                label = None
+            labels.append(label)
+            yield record
+
+    for batch in create_batches(encoded_records(), batch_size, max_bytes):
+        counts = {}
+        for _ in batch:
+            label = labels.popleft()
+            if label is not None:
+                counts[label] = counts.get(label, 0) + 1
+        yield json.dumps({'data': batch}), len(batch), counts
+
+
+class Sender(object):
+    """
+    Send request bodies to a URL with a number of requests in flight.
+
+    Bodies are handed to a pool of worker threads through a bounded queue, so
+    at most 2 * concurrency bodies are held in memory at any time. All worker
+    threads share a single, pooled session.
+
+    Sending stops at the first non-200 response, which is recorded in
+    status_code, along with the time it was received in failed_at. The
+    latency, size and status code of every request are recorded in stats,
+    and the records of every 200 response are counted by label, see
+    create_payloads.
+
+    With a retry policy, 429 and 5xx responses and connection errors are
+    retried after a backoff, and only fail the run once the retries of a
+    request are exhausted. Retried attempts are recorded in stats.retries.
+    A controller, e.g. AimdController, observes the outcome of every attempt.
+    """
+
+    def __init__(self, url, concurrency=1, headers=None, cookies=None,
+                 session=None, stats=None, retry=None, controller=None):
+        """
+        :param url: url to which the bodies are sent
+        :type url: str
+        :param concurrency: number of requests in flight
+        :type concurrency: int
+        :param headers: headers sent with every request
+        :type headers: dict
+        :param cookies: cookies sent with every request
+        :type cookies: dict
+        :param session: session to use, defaults to a new client with a pool
+            of concurrency connections
+        :type session: requests.Session
+        :param stats: statistics the requests are recorded in
+        :type stats: RunStats
+        :param retry: policy of retrying failed requests, defaults to no
+            retries
+        :type retry: RetryPolicy
+        :param controller: controller observing the latency and outcome of
+            every attempt
+        :type controller: AimdController
+        """
+        self.url = url
+        self.concurrency = concurrency
+        self.headers = headers or {}
+        self.session = session or HttpClient(concurrency, cookies)
+        self.stats = stats or RunStats()
+        self.retry = retry or RetryPolicy(0)
+        self.controller = controller
+        self.requests_sent = 0
+        self.records_sent = 0
+        self.elapsed = 0.0
+        self.status_code = None
+        self.exception = None
+        self.failed_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def failed(self):
+        return self.status_code is not None or self.exception is not None
+
+    def send(self, payloads):
+        """
+        Send payloads and wait for every request to complete.
+
+        :param payloads: iterable of (body, number of records in the body),
+            or of (body, number of records, number of records per label)
+        :type payloads: iterable
+        :return: True if every request succeeded
+        :rtype: bool
+        """
+        queue = Queue.Queue(maxsize=2 * self.concurrency)
+        threads = [threading.Thread(target=self._work, args=(queue,))
+                   for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        start = time.time()
+        self.stats.start()
+        try:
+            for payload in payloads:
+                if self.failed:
+                    break
+                queue.put(payload)
+        finally:
+            # stop the worker threads even if payloads raises
+            for _ in threads:
+                queue.put(None)
+            for thread in threads:
+                thread.join()
+            self.elapsed += time.time() - start
+            self.stats.stop()
+
+        return not self.failed
+
+    def throughput(self):
+        """
+        Return the number of requests and records sent per second.
+
+        :return: requests per second, records per second
+        :rtype: float, float
+        """
+        if not self.elapsed:
+            return 0.0, 0.0
+        return (self.requests_sent / self.elapsed,
+                self.records_sent / self.elapsed)
+
+    def _work(self, queue):
+        while True:
+            payload = queue.get()
+            if payload is None:
+                return
+            if self.failed:
+                # drain the queue once a request has failed
+                continue
+            self._post(*payload)
+
+    def _post(self, body, count, labels=None):
+        attempt = 0
+        while True:
+            start = time.time()
+            try:
+                response = self.session.post(
+                    self.url, headers=self.headers, data=body)
+            except requests.RequestException as e:
+                latency = time.time() - start
+                self._observe(latency, False, count)
+                if self.retry.should_retry(e, attempt) and not self.failed:
+                    self.stats.record_retry(
+                        latency, e.__class__.__name__, len(body))
+                    self.retry.sleep(attempt)
+                    attempt += 1
+                    continue
+                self.stats.record(latency, e.__class__.__name__, len(body))
+                with self._lock:
+                    if not self.failed:
+                        self.exception = e
+                        self.failed_at = time.time()
+                return
+            latency = time.time() - start
+            is_ok = response.status_code == 200
+            self._observe(latency, is_ok, count)
+            if not is_ok and not self.failed and \
+                    self.retry.should_retry(response.status_code, attempt):
+                self.stats.record_retry(
+                    latency, response.status_code, len(body))
+                self.retry.sleep(attempt)
+                attempt += 1
+                continue
+            self.stats.record(latency, response.status_code,
+                              len(body), count if is_ok else 0)
+            if is_ok and labels:
+                for label, records in labels.iteritems():
+                    self.stats.count_label(label, records)
+            with self._lock:
+                if is_ok:
+                    self.requests_sent += 1
+                    self.records_sent += count
+                elif not self.failed:
+                    self.status_code = response.status_code
+                    self.failed_at = time.time()
+            return
+
+    def _observe(self, latency, is_ok, count):
+        if self.controller:
+            self.controller.observe(latency, is_ok, count)
+
+
+class RetryPolicy(object):
+    """
+    Policy of retrying requests that failed with a transient error.
+
+    The backoff before a retry is drawn uniformly between 0 and
+    backoff * 2 ** attempt, capped at max_backoff ("full jitter"), so that
+    the retries of concurrent requests do not arrive in lockstep.
+    """
+
+    def __init__(self, retries=3, backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 random_=None):
+        """
+        :param retries: maximum number of retries of a request
+        :type retries: int
+        :param backoff: base backoff in seconds
+        :type backoff: float
+        :param max_backoff: maximum backoff in seconds
+        :type max_backoff: float
+        :param random_: random number generator
+        :type random_: random.Random
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.random = random_ or random.Random()
+
+    def should_retry(self, error, attempt):
+        """
+        Return whether a failed attempt of a request is retried.
+
+        :param error: status code of the response, or the exception raised
+            by the attempt
+        :type error: int | Exception
+        :param attempt: number of retries of the request so far
+        :type attempt: int
+        :return: True if the attempt is retried
+        :rtype: bool
+        """
+        if attempt >= self.retries:
+            return False
+        if isinstance(error, Exception):
+            return isinstance(error, RETRY_EXCEPTIONS)
+        return error in RETRY_STATUS_CODES
+
+    def get_backoff(self, attempt):
+        """
+        Return the backoff before a retry.
+
+        :param attempt: number of retries of the request so far
+        :type attempt: int
+        :return: backoff in seconds
+        :rtype: float
+        """
+        return self.random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def sleep(self, attempt):
+        time.sleep(self.get_backoff(attempt))
+
+
+class AimdController(object):
+    """
+    Additive-increase, multiplicative-decrease control of the send rate.
+
+    The outcome and latency of every attempt are observed over intervals.
+    At the end of an interval in which the fraction of failed attempts
+    exceeds max_error_rate, or the 90th percentile latency exceeds
+    max_latency, the rate is multiplied by decrease. Otherwise it is
+    increased by increase, unless fewer records than MIN_ACHIEVED_RATE of the
+    rate were sent, i.e. the sender rather than the endpoint is the
+    bottleneck, in which case it is held. The rate then saws around the
+    highest rate the endpoint sustains, which is estimated from the second
+    half of the run.
+
+    current_rate can be passed to TokenBucket as its rate.
+    """
+
+    def __init__(self, rate, min_rate=1.0, max_rate=None, increase=None,
+                 decrease=0.5, max_error_rate=0.01, max_latency=None,
+                 interval=1.0):
+        """
+        :param rate: initial rate
+        :type rate: float
+        :param min_rate: minimum rate
+        :type min_rate: float
+        :param max_rate: maximum rate, defaults to no maximum
+        :type max_rate: float
+        :param increase: rate added after an interval without errors,
+            defaults to a tenth of the initial rate
+        :type increase: float
+        :param decrease: factor the rate is multiplied by after an interval
+            with errors
+        :type decrease: float
+        :param max_error_rate: highest fraction of failed attempts of an
+            interval that does not decrease the rate
+        :type max_error_rate: float
+        :param max_latency: highest 90th percentile latency of an interval
+            in seconds that does not decrease the rate, defaults to none
+        :type max_latency: float
+        :param interval: seconds between two adjustments of the rate
+        :type interval: float
+        """
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase or max(self.rate / 10, min_rate)
+        self.decrease = decrease
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.interval = interval
+        self.decreases = 0
+        # (seconds since the start, rate) of every adjustment
+        self.history = []
+        self._started = time.time()
+        self._last = self._started
+        self._latencies = []
+        self._errors = 0
+        self._records = 0
+        self._lock = threading.Lock()
+
+    def observe(self, latency, is_ok, records=0):
+        """
+        Observe an attempt of a request.
+
+        :param latency: time the attempt took in seconds
+        :type latency: float
+        :param is_ok: if the attempt succeeded
+        :type is_ok: bool
+        :param records: number of records sent by the attempt
+        :type records: int
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self._latencies.append(latency)
+            if is_ok:
+                self._records += records
+            else:
+                self._errors += 1
+            self._adjust(time.time())
+
+    def current_rate(self):
+        with self._lock:
+            self._adjust(time.time())
+            return self.rate
+
+    def _adjust(self, now):
+        # the rate is only adjusted after intervals with observations
+        if now - self._last < self.interval or not self._latencies:
+            return
+        error_rate = float(self._errors) / len(self._latencies)
+        latencies = sorted(self._latencies)
+        latency = latencies[int(0.9 * (len(latencies) - 1))]
+        if error_rate > self.max_error_rate or \
+                (self.max_latency and latency > self.max_latency):
+            self.rate = max(self.rate * self.decrease, self.min_rate)
+            self.decreases += 1
+        elif self._records >= \
+                MIN_ACHIEVED_RATE * self.rate * (now - self._last):
+            self.rate += self.increase
+            if self.max_rate:
+                self.rate = min(self.rate, self.max_rate)
+        self.history.append((now - self._started, self.rate))
+        self._last = now
+        self._latencies = []
+        self._errors = 0
+        self._records = 0
+
+    def sustainable_rate(self):
+        """
+        Estimate the highest rate the endpoint sustains.
+
+        :return: mean rate over the second half of the adjustments, or the
+            current rate if the rate has not been adjusted
+        :rtype: float
+        """
+        with self._lock:
+            rates = [rate for _, rate in
+                     self.history[len(self.history) // 2:]]
+            if not rates:
+                return self.rate
+            return sum(rates) / len(rates)
+
+
+class RateProfile(object):
+    """
+    Target rate of records per second over the duration of a run.
+
+    Profiles:
+        - constant: rate for the whole run
+        - ramp: linear increase from 0 to rate over the run
+        - step: rate / steps, increased by rate / steps in equal intervals
+        - spike: rate, except for the middle tenth of the run, which runs at
+          rate * spike_factor
+    """
+
+    def __init__(self, rate, duration, profile='constant', steps=5,
+                 spike_factor=5.0, resumed_at=0.0):
+        """
+        :param rate: target (peak) rate in records per second
+        :type rate: float
+        :param duration: duration of the run in seconds
+        :type duration: float
+        :param profile: constant, ramp, step or spike
+        :type profile: str
+        :param steps: number of steps of the step profile
+        :type steps: int
+        :param spike_factor: multiple of rate during a spike
+        :type spike_factor: float
+        :param resumed_at: seconds into the run the profile starts at, e.g.
+            of a run resumed from a checkpoint
+        :type resumed_at: float
+        """
+        if profile not in RATE_PROFILES:
+            raise ValueError('{} is not a valid profile.'.format(profile))
+        self.rate = float(rate)
+        self.duration = float(duration)
+        self.profile = profile
+        self.steps = steps
+        self.spike_factor = spike_factor
+        self.resumed_at = resumed_at
+        self.started = None
+
+    def start(self):
+        self.started = time.time() - self.resumed_at
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def is_finished(self):
+        return self.elapsed() >= self.duration
+
+    def rate_at(self, elapsed):
+        """
+        Return the target rate a number of seconds into the run.
+
+        :param elapsed: seconds since the start of the run
+        :type elapsed: float
+        :return: target rate in records per second
+        :rtype: float
+        """
+        if self.profile == 'ramp':
+            return self.rate * min(elapsed / self.duration, 1.0)
+        elif self.profile == 'step':
+            step = min(int(elapsed * self.steps / self.duration),
+                       self.steps - 1)
+            return self.rate * (step + 1) / self.steps
+        elif self.profile == 'spike':
+            if 0.45 <= elapsed / self.duration < 0.55:
+                return self.rate * self.spike_factor
+        return self.rate
+
+    def current_rate(self):
+        return self.rate_at(self.elapsed())
+
+
+class TokenBucket(object):
+    """
+    Token bucket limiting the rate at which records are sent.
+
+    The bucket holds at most burst seconds worth of tokens. A request for
+    more tokens than the bucket can hold is granted once the bucket is full,
+    leaving it in debt, so that large batches are still paced correctly.
+    """
+
+    def __init__(self, rate, burst=1.0):
+        """
+        :param rate: tokens per second, or a callable returning the current
+            tokens per second
+        :type rate: float | callable
+        :param burst: seconds worth of tokens the bucket can hold
+        :type burst: float
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = 0.0
+        self._last = time.time()
+
+    def current_rate(self):
+        return self.rate() if callable(self.rate) else self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Block until a number of tokens is available and take them.
+
+        :param tokens: number of tokens
+        :type tokens: int
+        :return: None
+        :rtype: None
+        """
+        while True:
+            now = time.time()
+            rate = self.current_rate()
+            capacity = max(rate * self.burst, 1.0)
+            self._tokens = min(
+                capacity, self._tokens + (now - self._last) * rate)
+            self._last = now
+            needed = min(tokens, capacity)
+            # allow for rounding errors in the refill
+            if self._tokens + 1e-9 >= needed:
+                self._tokens -= tokens
+                return
+            if rate > 0:
+                # sleep at least MIN_WAIT so that a tiny deficit cannot spin
+                wait = max((needed - self._tokens) / rate, MIN_WAIT)
+                time.sleep(min(wait, MAX_WAIT))
+            else:
+                time.sleep(MAX_WAIT)
+
+
+def compress(body, encoding='gzip', level=COMPRESSION_LEVEL):
+    """
+    Compress a request body with a content encoding.
+
+    :param body: request body
+    :type body: str
+    :param encoding: gzip, deflate
+    :type encoding: str
+    :param level: compression level, 1 (fastest) to 9 (smallest)
+    :type level: int
+    :return: compressed body
+    :rtype: str
+    """
+    if encoding == 'gzip':
+        # a gzip header and trailer instead of a zlib one
+        wbits = 16 + zlib.MAX_WBITS
+    elif encoding == 'deflate':
+        wbits = zlib.MAX_WBITS
+    else:
+        raise ValueError('{} is not one of: {}.'.format(
+            encoding, ', '.join(CONTENT_ENCODINGS)))
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_payloads(payloads, encoding='gzip', level=COMPRESSION_LEVEL,
+                      stats=None):
+    """
+    Lazily compress the bodies of payloads, see compress.
+
+    The size of each body before and after compression, and the wall-clock
+    time spent compressing it, are recorded in stats. Processor time is not
+    used, as it is only available for the whole process, and would include
+    the time of every thread sending requests meanwhile.
+
+    :param payloads: iterable of (body, number of records in the body), and
+        optionally the number of records per label
+    :type payloads: iterable
+    :param encoding: gzip, deflate
+    :type encoding: str
+    :param level: compression level, 1 (fastest) to 9 (smallest)
+    :type level: int
+    :param stats: statistics the compression is recorded in
+    :type stats: RunStats
+    :return: generator of payloads
+    :rtype: generator
+    """
+    for payload in payloads:
+        body = payload[0]
+        start = time.time()
+        compressed = compress(body, encoding, level)
+        if stats:
+            stats.record_compression(
+                len(body), len(compressed), time.time() - start)
+        yield (compressed,) + tuple(payload[1:])
+
+
+def pace(payloads, profile, rate=None):
+    """
+    Pace payloads according to a rate profile.
+
+    Payloads are yielded no faster than the current target rate of the
+    profile, counted in records. The generator stops once the duration of the
+    profile has elapsed.
+
+    :param payloads: iterable of (body, number of records in the body), and
+        optionally the number of records per label
+    :type payloads: iterable
+    :param profile: target rate over the duration of the run
+    :type profile: RateProfile
+    :param rate: callable returning the current target rate, replaces the
+        rate of the profile, e.g. AimdController.current_rate
+    :type rate: callable
+    :return: generator of payloads
+    :rtype: generator
+    """
+    profile.start()
+    bucket = TokenBucket(rate or profile.current_rate)
+    for payload in payloads:
+        bucket.acquire(payload[1])
+        if profile.is_finished():
+            return
+        yield payload
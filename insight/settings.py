@@ -0,0 +1,2 @@
+COOKIE_LOCAL = 'user.name@workiva.com:True'
+COOKIE_STAGING = ''
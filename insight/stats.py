@@ -0,0 +1,456 @@
+import json
+import threading
+import time
+
+# number of bits kept of each recorded value, a relative error of at most
+# 1 / 2 ** (PRECISION_BITS - 1), i.e. < 1%
+PRECISION_BITS = 8
+
+PERCENTILES = [50, 90, 99]
+
+
+class Histogram(object):
+    """
+    HDR-style histogram of non-negative integer values.
+
+    Values below 2 ** precision_bits are counted exactly. Larger values are
+    counted in log-linear buckets: each power of two is split into
+    2 ** (precision_bits - 1) linear buckets, so the relative error of a
+    reported value is bounded regardless of its magnitude. Counts are kept
+    sparsely, which keeps histograms cheap to merge and serialize.
+    """
+
+    def __init__(self, precision_bits=PRECISION_BITS):
+        self.precision_bits = precision_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        shift = max(value.bit_length() - self.precision_bits, 0)
+        return (shift << self.precision_bits) | (value >> shift)
+
+    def _value(self, index):
+        shift = index >> self.precision_bits
+        mantissa = index & ((1 << self.precision_bits) - 1)
+        # report the middle of the bucket
+        return (mantissa << shift) + ((1 << shift) >> 1)
+
+    def record(self, value, count=1):
+        """
+        Record a value.
+
+        :param value: non-negative value, e.g. a latency in microseconds
+        :type value: int
+        :param count: number of times the value occurred
+        :type count: int
+        :return: None
+        :rtype: None
+        """
+        value = int(value)
+        if value < 0:
+            raise ValueError('{} is negative.'.format(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """
+        Return the value at a given percentile.
+
+        :param percentile: percentile between 0 and 100
+        :type percentile: float
+        :return: value at the percentile, None if the histogram is empty
+        :rtype: int
+        """
+        if not self.count:
+            return None
+        rank = max(int(round(self.count * percentile / 100.0)), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return float(self.total) / self.count if self.count else None
+
+    def merge(self, other):
+        """
+        Add the counts of another histogram to this one.
+
+        :param other: histogram with the same precision
+        :type other: Histogram
+        :return: None
+        :rtype: None
+        """
+        if other.precision_bits != self.precision_bits:
+            raise ValueError('Histograms have a different precision.')
+        for index, count in other.counts.iteritems():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(
+                self.min, other.min)
+            self.max = other.max if self.max is None else max(
+                self.max, other.max)
+
+    def to_dict(self):
+        return {
+            'precision_bits': self.precision_bits,
+            'counts': [[index, count] for index, count in
+                       sorted(self.counts.iteritems())],
+            'total': self.total,
+            'min': self.min,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        histogram = cls(d['precision_bits'])
+        histogram.counts = dict((index, count)
+                                for index, count in d['counts'])
+        histogram.count = sum(histogram.counts.itervalues())
+        histogram.total = d['total']
+        histogram.min = d['min']
+        histogram.max = d['max']
+        return histogram
+
+
+class RunStats(object):
+    """
+    Latency, throughput and status code statistics of a run.
+
+    Requests are recorded from any number of threads. Latencies are kept in a
+    histogram in microseconds and reported in milliseconds. Records delivered
+    can also be counted by label, e.g. by the project they are sent from.
+    Attempts that are retried are counted by status code in retries,
+    separately from the status codes of the requests' final responses. If
+    request bodies are compressed, their size before and after compression
+    and the wall-clock time spent compressing them are recorded too.
+    """
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.requests = 0
+        self.records = 0
+        self.bytes_sent = 0
+        self.status_codes = {}
+        self.retries = {}
+        self.labels = {}
+        self.uncompressed_bytes = 0
+        self.compressed_bytes = 0
+        self.compression_seconds = 0.0
+        self.elapsed = 0.0
+        self._started = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._started = time.time()
+
+    def stop(self):
+        if self._started is not None:
+            self.elapsed += time.time() - self._started
+            self._started = None
+
+    def get_elapsed(self):
+        """
+        Return the seconds the run has been started for, including the time
+        since it was last started if it is running.
+
+        :return: elapsed seconds
+        :rtype: float
+        """
+        started = self._started
+        if started is None:
+            return self.elapsed
+        return self.elapsed + time.time() - started
+
+    def record(self, latency, status_code, bytes_sent=0, records=0):
+        """
+        Record a request.
+
+        :param latency: time the request took in seconds
+        :type latency: float
+        :param status_code: status code of the response, or the name of the
+            exception raised by the request
+        :type status_code: int | str
+        :param bytes_sent: size of the request body in bytes
+        :type bytes_sent: int
+        :param records: number of records in the request body
+        :type records: int
+        :return: None
+        :rtype: None
+        """
+        key = str(status_code)
+        with self._lock:
+            self.latency.record(latency * 1e6)
+            self.requests += 1
+            self.records += records
+            self.bytes_sent += bytes_sent
+            self.status_codes[key] = self.status_codes.get(key, 0) + 1
+
+    def time_request(self, method, url, latency, status):
+        """
+        Record a request timed by an HttpClient, see HttpClient.add_timer.
+
+        :param method: method of the request
+        :type method: str
+        :param url: url of the request
+        :type url: str
+        :param latency: time the request took in seconds
+        :type latency: float
+        :param status: status code of the response, or the name of the
+            exception raised by the request
+        :type status: int | str
+        :return: None
+        :rtype: None
+        """
+        self.record(latency, status)
+
+    def count_status(self, status_code):
+        """
+        Count a request whose latency is unknown, e.g. a probe that was not
+        processed before a timeout, by its status without recording its
+        latency.
+
+        :param status_code: status of the request
+        :type status_code: int | str
+        :return: None
+        :rtype: None
+        """
+        key = str(status_code)
+        with self._lock:
+            self.requests += 1
+            self.status_codes[key] = self.status_codes.get(key, 0) + 1
+
+    def record_retry(self, latency, status_code, bytes_sent=0):
+        """
+        Record an attempt of a request that is retried.
+
+        :param latency: time the attempt took in seconds
+        :type latency: float
+        :param status_code: status code of the response, or the name of the
+            exception raised by the attempt
+        :type status_code: int | str
+        :param bytes_sent: size of the request body in bytes
+        :type bytes_sent: int
+        :return: None
+        :rtype: None
+        """
+        key = str(status_code)
+        with self._lock:
+            self.latency.record(latency * 1e6)
+            self.bytes_sent += bytes_sent
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def record_compression(self, uncompressed_bytes, compressed_bytes,
+                           seconds):
+        """
+        Record the compression of a request body.
+
+        :param uncompressed_bytes: size of the body before compression
+        :type uncompressed_bytes: int
+        :param compressed_bytes: size of the body after compression
+        :type compressed_bytes: int
+        :param seconds: wall-clock time spent compressing the body
+        :type seconds: float
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self.uncompressed_bytes += uncompressed_bytes
+            self.compressed_bytes += compressed_bytes
+            self.compression_seconds += seconds
+
+    def count_label(self, label, records=1):
+        """
+        Count records by label.
+
+        :param label: label of the records, e.g. a project
+        :type label: str
+        :param records: number of records
+        :type records: int
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self.labels[label] = self.labels.get(label, 0) + records
+
+    def merge(self, other):
+        """
+        Add the statistics of another run to this one.
+
+        Elapsed time is not added, runs being merged are assumed to have
+        run at the same time.
+
+        :param other: statistics of another run
+        :type other: RunStats
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self.latency.merge(other.latency)
+            self.requests += other.requests
+            self.records += other.records
+            self.bytes_sent += other.bytes_sent
+            for key, count in other.status_codes.iteritems():
+                self.status_codes[key] = self.status_codes.get(key, 0) + count
+            for key, count in other.retries.iteritems():
+                self.retries[key] = self.retries.get(key, 0) + count
+            for label, count in other.labels.iteritems():
+                self.labels[label] = self.labels.get(label, 0) + count
+            self.uncompressed_bytes += other.uncompressed_bytes
+            self.compressed_bytes += other.compressed_bytes
+            self.compression_seconds += other.compression_seconds
+            self.elapsed = max(self.elapsed, other.elapsed)
+
+    def summary(self):
+        """
+        Return a summary of the run.
+
+        :return: summary of the run
+        :rtype: dict
+        """
+        elapsed = self.get_elapsed()
+
+        latency = {}
+        for percentile in PERCENTILES:
+            latency['p{}'.format(percentile)] = to_milliseconds(
+                self.latency.percentile(percentile))
+        latency['max'] = to_milliseconds(self.latency.max)
+        latency['mean'] = to_milliseconds(self.latency.mean())
+
+        return {
+            'requests': self.requests,
+            'records': self.records,
+            'bytes_sent': self.bytes_sent,
+            'elapsed': elapsed,
+            'requests_per_second': self.requests / elapsed if elapsed else 0.0,
+            'records_per_second': self.records / elapsed if elapsed else 0.0,
+            'status_codes': dict(self.status_codes),
+            'retries': dict(self.retries),
+            'labels': dict(self.labels),
+            'compression': {
+                'uncompressed_bytes': self.uncompressed_bytes,
+                'compressed_bytes': self.compressed_bytes,
+                'ratio': float(self.uncompressed_bytes) /
+                self.compressed_bytes if self.compressed_bytes else None,
+                'seconds': self.compression_seconds
+            },
+            'latency_ms': latency
+        }
+
+    def to_dict(self):
+        # a running run can be serialised, e.g. to checkpoint it
+        with self._lock:
+            return {
+                'latency': self.latency.to_dict(),
+                'requests': self.requests,
+                'records': self.records,
+                'bytes_sent': self.bytes_sent,
+                'status_codes': dict(self.status_codes),
+                'retries': dict(self.retries),
+                'labels': dict(self.labels),
+                'uncompressed_bytes': self.uncompressed_bytes,
+                'compressed_bytes': self.compressed_bytes,
+                'compression_seconds': self.compression_seconds,
+                'elapsed': self.get_elapsed()
+            }
+
+    @classmethod
+    def from_dict(cls, d):
+        stats = cls()
+        stats.latency = Histogram.from_dict(d['latency'])
+        stats.requests = d['requests']
+        stats.records = d['records']
+        stats.bytes_sent = d['bytes_sent']
+        stats.status_codes = dict(d['status_codes'])
+        stats.retries = dict(d.get('retries', {}))
+        stats.labels = dict(d.get('labels', {}))
+        stats.uncompressed_bytes = d.get('uncompressed_bytes', 0)
+        stats.compressed_bytes = d.get('compressed_bytes', 0)
+        stats.compression_seconds = d.get('compression_seconds', 0.0)
+        stats.elapsed = d['elapsed']
+        return stats
+
+
+def to_milliseconds(microseconds):
+    if microseconds is None:
+        return None
+    return microseconds / 1000.0
+
+
+def format_summary(summary, title='', record_name='records'):
+    """
+    Format a summary of a run as human-readable text.
+
+    :param summary: summary of a run, see RunStats.summary
+    :type summary: dict
+    :param title: title of the run
+    :type title: str
+    :param record_name: name of the records sent, e.g. errors
+    :type record_name: str
+    :return: summary of the run as text
+    :rtype: str
+    """
+    latency = summary['latency_ms']
+
+    def ms(value):
+        return '-' if value is None else '{:.2f}'.format(value)
+
+    lines = []
+    if title:
+        lines.append(title)
+    lines.extend([
+        '  requests:     {} in {:.2f}s ({:.1f} requests/s)'.format(
+            summary['requests'], summary['elapsed'],
+            summary['requests_per_second']),
+        '  {:<13} {} ({:.1f} {}/s)'.format(
+            record_name + ':', summary['records'],
+            summary['records_per_second'], record_name),
+        '  bytes sent:   {}'.format(summary['bytes_sent'])
+    ])
+    compression = summary.get('compression')
+    if compression and compression['compressed_bytes']:
+        lines.append(
+            '  compression:  {} to {} bytes ({:.1f}x) in {:.2f}s wall '
+            'time'.format(
+                compression['uncompressed_bytes'],
+                compression['compressed_bytes'], compression['ratio'],
+                compression['seconds']))
+    lines.append('  status codes: {}'.format(', '.join(
+        '{}: {}'.format(code, count) for code, count in
+        sorted(summary['status_codes'].iteritems()))))
+    if summary.get('retries'):
+        lines.append('  retries:      {}'.format(', '.join(
+            '{}: {}'.format(code, count) for code, count in
+            sorted(summary['retries'].iteritems()))))
+    lines.append('  latency (ms): p50 {} p90 {} p99 {} max {}'.format(
+        ms(latency['p50']), ms(latency['p90']), ms(latency['p99']),
+        ms(latency['max'])))
+    return '\n'.join(lines)
+
+
+def write_report(report, filename):
+    """
+    Write a report as JSON.
+
+    :param report: report, e.g. summaries of one or more runs
+    :type report: dict
+    :param filename: name of the JSON file
+    :type filename: str
+    :return: None
+    :rtype: None
+    """
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2, separators=(',', ': '),
+                  sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,42 @@
+import unittest
+import mock
+import datetime
+
+from freezegun import freeze_time
+
+from insight import clock
+
+
+class ClockTestCase(unittest.TestCase):
+
+    @freeze_time("2018-06-14 12:00:00.000000")
+    def test_clock(self):
+        wall = clock.Clock()
+        self.assertEqual(datetime.datetime(2018, 6, 14, 12), wall.utcnow())
+        self.assertEqual(1528977600.0, wall.time())
+        self.assertEqual(datetime.timedelta(0), clock.get_utc_offset())
+
+    @mock.patch('time.sleep')
+    def test_clock_advance(self, mock_sleep):
+        # test the wall clock can only advance by waiting
+        clock.Clock().advance(5)
+        mock_sleep.assert_called_once_with(5)
+
+    @mock.patch('time.sleep')
+    def test_virtual_clock(self, mock_sleep):
+        start = datetime.datetime(2018, 3, 16, 2)
+        virtual = clock.VirtualClock(start, datetime.timedelta(hours=2))
+        self.assertEqual(start, virtual.now())
+        self.assertEqual(datetime.datetime(2018, 3, 16), virtual.utcnow())
+        self.assertEqual(1521158400.0, virtual.time())
+        virtual.sleep(1.5)
+        virtual.advance(90 * 86400)
+        self.assertEqual(datetime.datetime(2018, 6, 14, 0, 0, 1, 500000),
+                         virtual.utcnow())
+        self.assertEqual(1528934401.5, virtual.time())
+        # test the virtual clock never waits
+        self.assertFalse(mock_sleep.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+import unittest
+import mock
+import random
+import requests
+import threading
+import zlib
+
+from insight import sender
+
+
+class FakeTime(object):
+    """
+    Stand-in for the time module whose sleep advances time instantly.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SenderTestCase(unittest.TestCase):
+
+    def test_send(self):
+        session = mock.Mock()
+        session.post.return_value = mock.Mock(status_code=200)
+        s = sender.Sender('url', 4, {'a': 'b'}, session=session)
+        payloads = [('body', 2)] * 10
+        self.assertTrue(s.send(payloads))
+        self.assertEqual(10, session.post.call_count)
+        session.post.assert_called_with('url', headers={'a': 'b'}, data='body')
+        self.assertEqual(10, s.requests_sent)
+        self.assertEqual(20, s.records_sent)
+        self.assertFalse(s.failed)
+
+    def test_send_failure(self):
+        session = mock.Mock()
+        session.post.return_value = mock.Mock(status_code=403)
+        s = sender.Sender('url', 2, session=session)
+        self.assertFalse(s.send([('body', 1)] * 100))
+        self.assertEqual(403, s.status_code)
+        self.assertIsNotNone(s.failed_at)
+        self.assertEqual(0, s.records_sent)
+        # stops sending after the first failure
+        self.assertLess(session.post.call_count, 100)
+
+    def test_send_labels(self):
+        session = mock.Mock()
+        session.post.side_effect = [
+            mock.Mock(status_code=200), mock.Mock(status_code=500)]
+        run_stats = sender.RunStats()
+        s = sender.Sender('url', 1, session=session, stats=run_stats)
+        self.assertFalse(s.send([('body', 3, {'a': 2, 'b': 1}),
+                                 ('body', 2, {'a': 2})]))
+        # test only the records of 200 responses are counted by label
+        self.assertEqual({'a': 2, 'b': 1}, run_stats.labels)
+
+    def test_send_exception(self):
+        session = mock.Mock()
+        session.post.side_effect = requests.ConnectionError('refused')
+        s = sender.Sender('url', 2, session=session)
+        self.assertFalse(s.send([('body', 1)] * 10))
+        self.assertIsInstance(s.exception, requests.ConnectionError)
+
+    @mock.patch('insight.sender.time.sleep')
+    def test_send_retry(self, mock_sleep):
+        session = mock.Mock()
+        session.post.side_effect = [
+            mock.Mock(status_code=503), requests.ConnectionError('reset'),
+            mock.Mock(status_code=200)]
+        s = sender.Sender('url', session=session,
+                          retry=sender.RetryPolicy(2))
+        self.assertTrue(s.send([('body', 1)]))
+        self.assertEqual(3, session.post.call_count)
+        self.assertEqual(2, mock_sleep.call_count)
+        self.assertEqual({'200': 1}, s.stats.status_codes)
+        self.assertEqual({'503': 1, 'ConnectionError': 1}, s.stats.retries)
+        # test retries are exhausted
+        session.post.side_effect = None
+        session.post.return_value = mock.Mock(status_code=429)
+        self.assertFalse(s.send([('body', 1)]))
+        self.assertEqual(429, s.status_code)
+        self.assertEqual(2, s.stats.retries['429'])
+        # test errors that are not transient are not retried
+        session.post.reset_mock()
+        session.post.return_value = mock.Mock(status_code=403)
+        s = sender.Sender('url', session=session,
+                          retry=sender.RetryPolicy(2))
+        self.assertFalse(s.send([('body', 1)]))
+        self.assertEqual(1, session.post.call_count)
+
+    def test_retry_policy(self):
+        retry = sender.RetryPolicy(3, 0.1, 1.0, random.Random('seed'))
+        self.assertTrue(retry.should_retry(500, 0))
+        self.assertTrue(retry.should_retry(requests.Timeout(), 2))
+        self.assertFalse(retry.should_retry(500, 3))
+        self.assertFalse(retry.should_retry(400, 0))
+        self.assertFalse(retry.should_retry(ValueError(), 0))
+        for attempt, cap in [(0, 0.1), (2, 0.4), (10, 1.0)]:
+            backoffs = [retry.get_backoff(attempt) for _ in range(100)]
+            self.assertLessEqual(max(backoffs), cap)
+            self.assertGreater(max(backoffs), cap / 2)
+
+    def test_send_controller(self):
+        session = mock.Mock()
+        session.post.return_value = mock.Mock(status_code=200)
+        controller = mock.Mock()
+        s = sender.Sender('url', session=session, controller=controller)
+        s.send([('body', 1)] * 3)
+        self.assertEqual(3, controller.observe.call_count)
+        self.assertTrue(controller.observe.call_args[0][1])
+
+    def test_compress(self):
+        body = '{"data": ["' + 'a' * 1000 + '"]}'
+        gzipped = sender.compress(body, 'gzip', 9)
+        self.assertEqual(body, zlib.decompress(gzipped, 16 + zlib.MAX_WBITS))
+        self.assertLess(len(gzipped), len(body) / 10)
+        self.assertEqual(body, zlib.decompress(
+            sender.compress(body, 'deflate', 1)))
+        with self.assertRaises(ValueError):
+            sender.compress(body, 'br')
+
+    def test_create_payloads(self):
+        records = [('a', 'x'), ('b', 'y'), 'c', ('d', 'x'), ('e', 'x')]
+        payloads = list(sender.create_payloads(records, 2))
+        self.assertEqual(
+            [('{"data": ["a", "b"]}', 2, {'x': 1, 'y': 1}),
+             ('{"data": ["c", "d"]}', 2, {'x': 1}),
+             ('{"data": ["e"]}', 1, {'x': 1})], payloads)
+
+    @mock.patch('insight.sender.time.time')
+    def test_compress_payloads(self, mock_time):
+        # test each compression is timed with the wall clock
+        mock_time.side_effect = [1.0, 1.5] * 4
+        run_stats = sender.RunStats()
+        payloads = list(sender.compress_payloads(
+            [('a' * 1000, 2)] * 3, 'deflate', stats=run_stats))
+        self.assertEqual(3, len(payloads))
+        self.assertEqual(('a' * 1000, 2),
+                         (zlib.decompress(payloads[0][0]), payloads[0][1]))
+        compression = run_stats.summary()['compression']
+        self.assertEqual(3000, compression['uncompressed_bytes'])
+        self.assertEqual(sum(len(p[0]) for p in payloads),
+                         compression['compressed_bytes'])
+        self.assertGreater(compression['ratio'], 10)
+        self.assertEqual(1.5, compression['seconds'])
+        # test the labels of a payload are kept
+        payloads = list(sender.compress_payloads([('a', 1, {'x': 1})]))
+        self.assertEqual({'x': 1}, payloads[0][2])
+
+    def test_send_payloads_exception(self):
+        def payloads():
+            yield ('body', 1)
+            raise ValueError('invalid payload')
+
+        session = mock.Mock()
+        session.post.return_value = mock.Mock(status_code=200)
+        s = sender.Sender('url', 2, session=session)
+        with self.assertRaises(ValueError):
+            s.send(payloads())
+        self.assertEqual(1, s.records_sent)
+        self.assertEqual(1, threading.active_count())
+
+    def test_throughput(self):
+        s = sender.Sender('url', session=mock.Mock())
+        self.assertEqual((0.0, 0.0), s.throughput())
+        s.requests_sent, s.records_sent, s.elapsed = 10, 100, 2.0
+        self.assertEqual((5.0, 50.0), s.throughput())
+
+
+class RateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = mock.patch('insight.sender.time', FakeTime())
+        self.time = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_rate_profile(self):
+        with self.assertRaises(ValueError):
+            sender.RateProfile(10, 100, 'sawtooth')
+        profile = sender.RateProfile(10, 100)
+        self.assertEqual(10, profile.rate_at(0))
+        self.assertEqual(10, profile.rate_at(99))
+        profile = sender.RateProfile(10, 100, 'ramp')
+        self.assertEqual(0, profile.rate_at(0))
+        self.assertEqual(5, profile.rate_at(50))
+        self.assertEqual(10, profile.rate_at(100))
+        profile = sender.RateProfile(10, 100, 'step', steps=5)
+        self.assertEqual(2, profile.rate_at(0))
+        self.assertEqual(4, profile.rate_at(20))
+        self.assertEqual(10, profile.rate_at(99))
+        profile = sender.RateProfile(10, 100, 'spike', spike_factor=3)
+        self.assertEqual(10, profile.rate_at(40))
+        self.assertEqual(30, profile.rate_at(50))
+        self.assertEqual(10, profile.rate_at(60))
+        # test a resumed profile starts part of the way into the run
+        profile = sender.RateProfile(10, 100, 'ramp', resumed_at=50)
+        profile.start()
+        self.assertEqual(5, profile.current_rate())
+        self.time.sleep(50)
+        self.assertTrue(profile.is_finished())
+
+    def test_token_bucket(self):
+        bucket = sender.TokenBucket(100)
+        start = self.time.now
+        for _ in range(100):
+            bucket.acquire()
+        self.assertAlmostEqual(1.0, self.time.now - start)
+        # batches larger than the bucket are paced by their size
+        start = self.time.now
+        bucket.acquire(500)
+        bucket.acquire(1)
+        self.assertAlmostEqual(5.0, self.time.now - start, places=1)
+
+    def test_token_bucket_rounding(self):
+        # a deficit below float resolution of the clock must not spin
+        bucket = sender.TokenBucket(100)
+        bucket._tokens = 0.999999998999
+        bucket._last = self.time.now
+        start = self.time.now
+        bucket.acquire()
+        self.assertLessEqual(self.time.now - start, sender.MIN_WAIT)
+
+    def test_aimd_controller(self):
+        controller = sender.AimdController(
+            100, min_rate=10, max_rate=120, max_latency=0.5)
+        # test the rate is not adjusted within an interval
+        controller.observe(0.1, True, 100)
+        self.assertEqual(100, controller.current_rate())
+        # test additive increase, up to the maximum rate
+        for rate in [110, 120, 120]:
+            self.time.sleep(1)
+            controller.observe(0.1, True, 120)
+            self.assertEqual(rate, controller.current_rate())
+        # test the rate is held while it is not achieved
+        self.time.sleep(1)
+        controller.max_rate = None
+        controller.observe(0.1, True, 100)
+        self.assertEqual(120, controller.current_rate())
+        # test multiplicative decrease on errors and on latency
+        self.time.sleep(1)
+        controller.observe(0.1, False)
+        self.assertEqual(60, controller.current_rate())
+        self.time.sleep(1)
+        controller.observe(1.0, True)
+        self.assertEqual(30, controller.current_rate())
+        self.assertEqual(2, controller.decreases)
+        # test the rate is not decreased below the minimum
+        for _ in range(3):
+            self.time.sleep(1)
+            controller.observe(0.1, False)
+        self.assertEqual(10, controller.current_rate())
+        # test intervals without observations leave the rate unchanged
+        self.time.sleep(10)
+        self.assertEqual(10, controller.current_rate())
+        self.assertEqual(9, len(controller.history))
+        self.assertAlmostEqual(
+            sum(r for _, r in controller.history[4:]) / 5,
+            controller.sustainable_rate())
+
+    def test_pace(self):
+        profile = sender.RateProfile(10, 10)
+        payloads = list(sender.pace(iter([('body', 1)] * 1000), profile))
+        self.assertEqual(99, len(payloads))
+        self.assertAlmostEqual(10.0, profile.elapsed(), places=1)
+        # test pacing by a rate other than the profile's
+        profile = sender.RateProfile(10, 10)
+        payloads = list(sender.pace(
+            iter([('body', 1)] * 1000), profile, lambda: 20))
+        self.assertEqual(199, len(payloads))
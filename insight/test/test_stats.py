@@ -0,0 +1,184 @@
+import unittest
+import mock
+import json
+import os
+import tempfile
+
+from insight import stats
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_record(self):
+        histogram = stats.Histogram()
+        for value in range(1, 101):
+            histogram.record(value)
+        self.assertEqual(100, histogram.count)
+        self.assertEqual(1, histogram.min)
+        self.assertEqual(100, histogram.max)
+        self.assertEqual(50.5, histogram.mean())
+        with self.assertRaises(ValueError):
+            histogram.record(-1)
+
+    def test_percentile(self):
+        histogram = stats.Histogram()
+        self.assertIsNone(histogram.percentile(50))
+        # small values are counted exactly
+        for value in range(1, 101):
+            histogram.record(value)
+        self.assertEqual(50, histogram.percentile(50))
+        self.assertEqual(99, histogram.percentile(99))
+        self.assertEqual(100, histogram.percentile(100))
+        # large values are within the precision of the histogram
+        histogram = stats.Histogram()
+        for value in range(1, 100001):
+            histogram.record(value * 10)
+        for percentile in [50, 90, 99]:
+            expected = percentile * 10000
+            self.assertAlmostEqual(
+                expected, histogram.percentile(percentile),
+                delta=expected / 2 ** (stats.PRECISION_BITS - 1))
+        self.assertEqual(1000000, histogram.percentile(100))
+
+    def test_merge(self):
+        a, b = stats.Histogram(), stats.Histogram()
+        a.record(10)
+        b.record(1000, 3)
+        a.merge(b)
+        self.assertEqual(4, a.count)
+        self.assertEqual(10, a.min)
+        self.assertEqual(1000, a.max)
+        self.assertEqual(3010, a.total)
+        with self.assertRaises(ValueError):
+            a.merge(stats.Histogram(4))
+
+    def test_to_dict(self):
+        histogram = stats.Histogram()
+        for value in [1, 10, 1000, 123456]:
+            histogram.record(value)
+        d = json.loads(json.dumps(histogram.to_dict()))
+        copy = stats.Histogram.from_dict(d)
+        self.assertEqual(histogram.counts, copy.counts)
+        self.assertEqual(histogram.count, copy.count)
+        self.assertEqual(histogram.percentile(90), copy.percentile(90))
+
+
+class RunStatsTestCase(unittest.TestCase):
+
+    def test_record(self):
+        run_stats = stats.RunStats()
+        run_stats.record(0.010, 200, 100, 10)
+        run_stats.record(0.020, 200, 100, 10)
+        run_stats.record(0.030, 500, 100)
+        run_stats.elapsed = 2.0
+        summary = run_stats.summary()
+        self.assertEqual(3, summary['requests'])
+        self.assertEqual(20, summary['records'])
+        self.assertEqual(300, summary['bytes_sent'])
+        self.assertEqual(1.5, summary['requests_per_second'])
+        self.assertEqual(10.0, summary['records_per_second'])
+        self.assertEqual({'200': 2, '500': 1}, summary['status_codes'])
+        self.assertAlmostEqual(20.0, summary['latency_ms']['p50'], delta=0.2)
+        self.assertAlmostEqual(30.0, summary['latency_ms']['max'], delta=0.2)
+
+    def test_count_status(self):
+        run_stats = stats.RunStats()
+        run_stats.record(0.010, 'processed')
+        run_stats.count_status('timeout')
+        summary = run_stats.summary()
+        self.assertEqual(2, summary['requests'])
+        self.assertEqual({'processed': 1, 'timeout': 1},
+                         summary['status_codes'])
+        # test the latency of a request counted by status is not recorded
+        self.assertAlmostEqual(10.0, summary['latency_ms']['max'], delta=0.1)
+
+    def test_record_retry(self):
+        run_stats = stats.RunStats()
+        run_stats.record_retry(0.010, 503, 100)
+        run_stats.record_retry(0.010, 'ConnectionError', 100)
+        run_stats.record(0.020, 200, 100, 10)
+        summary = run_stats.summary()
+        # test retried attempts are not counted as requests
+        self.assertEqual(1, summary['requests'])
+        self.assertEqual(300, summary['bytes_sent'])
+        self.assertEqual({'200': 1}, summary['status_codes'])
+        self.assertEqual({'503': 1, 'ConnectionError': 1}, summary['retries'])
+        self.assertIn('retries:      503: 1, ConnectionError: 1',
+                      stats.format_summary(summary))
+
+    def test_record_compression(self):
+        run_stats = stats.RunStats()
+        self.assertIsNone(run_stats.summary()['compression']['ratio'])
+        self.assertNotIn('compression:', stats.format_summary(
+            run_stats.summary()))
+        run_stats.record_compression(1000, 100, 0.01)
+        run_stats.record_compression(3000, 300, 0.03)
+        compression = run_stats.summary()['compression']
+        self.assertEqual(4000, compression['uncompressed_bytes'])
+        self.assertEqual(400, compression['compressed_bytes'])
+        self.assertEqual(10.0, compression['ratio'])
+        self.assertAlmostEqual(0.04, compression['seconds'])
+        self.assertIn(
+            'compression:  4000 to 400 bytes (10.0x) in 0.04s wall time',
+            stats.format_summary(run_stats.summary()))
+
+    def test_merge(self):
+        a, b = stats.RunStats(), stats.RunStats()
+        a.record(0.010, 200, 100, 10)
+        b.record(0.020, 200, 100, 10)
+        b.record(0.030, 'ConnectionError')
+        a.count_label('service-prod', 10)
+        b.count_label('service-prod', 5)
+        b.count_label('service-eu', 5)
+        b.record_retry(0.010, 429)
+        b.record_compression(1000, 100, 0.01)
+        a.merge(b)
+        self.assertEqual(3, a.requests)
+        self.assertEqual(20, a.records)
+        self.assertEqual({'200': 2, 'ConnectionError': 1}, a.status_codes)
+        self.assertEqual({'service-prod': 15, 'service-eu': 5}, a.labels)
+        self.assertEqual({'429': 1}, a.retries)
+        self.assertEqual(100, a.compressed_bytes)
+
+    def test_to_dict(self):
+        run_stats = stats.RunStats()
+        run_stats.record(0.010, 200, 100, 10)
+        run_stats.record_retry(0.010, 500)
+        run_stats.record_compression(1000, 100, 0.01)
+        run_stats.elapsed = 1.0
+        d = json.loads(json.dumps(run_stats.to_dict()))
+        self.assertEqual(run_stats.summary(),
+                         stats.RunStats.from_dict(d).summary())
+
+    @mock.patch('time.time')
+    def test_to_dict_running(self, mock_time):
+        # test a running run is serialised with the time it has run for
+        mock_time.return_value = 100.0
+        run_stats = stats.RunStats()
+        run_stats.elapsed = 10.0
+        run_stats.start()
+        mock_time.return_value = 105.0
+        self.assertEqual(15.0, run_stats.get_elapsed())
+        self.assertEqual(15.0, run_stats.to_dict()['elapsed'])
+        run_stats.stop()
+        self.assertEqual(15.0, run_stats.get_elapsed())
+
+    def test_format_summary(self):
+        run_stats = stats.RunStats()
+        run_stats.record(0.010, 200, 100, 10)
+        run_stats.elapsed = 1.0
+        text = stats.format_summary(run_stats.summary(), 'Run:', 'errors')
+        self.assertIn('Run:', text)
+        self.assertIn('errors:       10 (10.0 errors/s)', text)
+        self.assertIn('status codes: 200: 1', text)
+        self.assertIn('p50 10.00', text)
+
+    def test_write_report(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            stats.write_report({'a': 1}, filename)
+            with open(filename) as f:
+                self.assertEqual({'a': 1}, json.load(f))
+        finally:
+            os.remove(filename)
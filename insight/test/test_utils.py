@@ -0,0 +1,69 @@
+import unittest
+import mock
+
+import requests
+
+from insight import utils
+from insight.hubble import stub_server
+
+
+class HttpClientTestCase(unittest.TestCase):
+
+    def test_http_client(self):
+        client = utils.HttpClient(4, {'SACSID': 'cookie'}, ('user', 'pass'),
+                                  {'X-Header': 'value'})
+        self.assertEqual('cookie', client.cookies.get('SACSID'))
+        self.assertEqual(('user', 'pass'), client.auth)
+        self.assertEqual('value', client.headers['X-Header'])
+        adapter = client.get_adapter('https://example.com')
+        self.assertEqual(4, adapter._pool_maxsize)
+        self.assertEqual(utils.POOL_HOSTS, adapter._pool_connections)
+        self.assertIs(adapter, client.get_adapter('http://example.com'))
+
+    @mock.patch('requests.Session.request')
+    def test_request_timeout(self, mock_request):
+        client = utils.HttpClient(timeout=5)
+        client.get('url')
+        self.assertEqual(5, mock_request.call_args[1]['timeout'])
+        # test a timeout of the request overrides the client's
+        client.post('url', timeout=1)
+        self.assertEqual(1, mock_request.call_args[1]['timeout'])
+
+    def test_timers(self):
+        server = stub_server.start_server()
+        url = 'http://localhost:{}'.format(server.server_address[1])
+        timings = []
+        client = utils.HttpClient()
+        client.add_timer(lambda *timing: timings.append(timing))
+        try:
+            client.get(url + stub_server.STATS)
+            client.post(url + '/unknown')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(
+            [('GET', url + stub_server.STATS, 200),
+             ('POST', url + '/unknown', 404)],
+            [(m, u, s) for m, u, _, s in timings])
+        self.assertTrue(all(latency > 0 for _, _, latency, _ in timings))
+        # test a request that raises is timed with the name of the exception
+        with mock.patch('requests.Session.request',
+                        side_effect=requests.ConnectionError):
+            with self.assertRaises(requests.ConnectionError):
+                client.get(url)
+        self.assertEqual('ConnectionError', timings[-1][3])
+
+    @mock.patch('insight.utils._cookies', {})
+    def test_get_cookies(self):
+        settings = mock.Mock(COOKIE_LOCAL='local', COOKIE_STAGING='staging')
+        with mock.patch.dict('sys.modules', {
+                'settings': settings, 'insight.settings': settings}):
+            cookies = utils.get_cookies()
+        self.assertEqual(
+            {'dev_appserver_login': 'local', 'SACSID': 'staging'}, cookies)
+        # test the cookies are only read once
+        self.assertEqual(cookies, utils.get_cookies())
+
+
+if __name__ == '__main__':
+    unittest.main()
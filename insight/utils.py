@@ -0,0 +1,104 @@
+import time
+
+import requests
+
+# seconds to wait for a connection to be established and for a response to
+# be read, see http://docs.python-requests.org/en/master/user/advanced/
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 60
+
+# number of hosts a client keeps a pool of connections to
+POOL_HOSTS = 10
+
+_cookies = {}
+
+
+def get_cookies():
+    """
+    Return the cookies authenticating requests to Insight.
+
+    The cookies are read from settings.py once, on first use, so that tools
+    that do not send requests to Insight do not need settings.py.
+
+    :return: cookies of the local and staging instances
+    :rtype: dict
+    """
+    if not _cookies:
+        from settings import COOKIE_LOCAL, COOKIE_STAGING
+        _cookies.update({
+            'dev_appserver_login': COOKIE_LOCAL,
+            'SACSID': COOKIE_STAGING
+        })
+    return dict(_cookies)
+
+
+class HttpClient(requests.Session):
+    """
+    Session shared by the Insight tools.
+
+    Connections are kept alive in a pool per host, of up to pool_size
+    connections each, and reused across requests. Cookies, auth and headers
+    are set once on the client instead of on every request, and every
+    request has a connect and read timeout unless it passes its own.
+
+    Timers added with add_timer are called after every request with its
+    method, url, latency in seconds and status: the status code of the
+    response, or the name of the exception raised.
+    """
+
+    def __init__(self, pool_size=1, cookies=None, auth=None, headers=None,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        """
+        :param pool_size: maximum number of connections kept per host
+        :type pool_size: int
+        :param cookies: cookies sent with every request
+        :type cookies: dict
+        :param auth: auth of every request, e.g. (user, password)
+        :type auth: tuple
+        :param headers: headers sent with every request
+        :type headers: dict
+        :param timeout: seconds to wait for a connection and a response, or
+            (connect, read), None to wait forever
+        :type timeout: float
+        """
+        super(HttpClient, self).__init__()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=POOL_HOSTS, pool_maxsize=pool_size)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        if cookies:
+            self.cookies.update(cookies)
+        if auth:
+            self.auth = auth
+        if headers:
+            self.headers.update(headers)
+        self.timeout = timeout
+        self.timers = []
+
+    def add_timer(self, timer):
+        """
+        Add a function called with the timing of every request.
+
+        :param timer: function of (method, url, latency, status)
+        :type timer: function
+        :return: None
+        :rtype: None
+        """
+        self.timers.append(timer)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        start = time.time()
+        try:
+            response = super(HttpClient, self).request(method, url, **kwargs)
+        except requests.RequestException as e:
+            self._time(method, url, time.time() - start,
+                       e.__class__.__name__)
+            raise
+        self._time(method, url, time.time() - start, response.status_code)
+        return response
+
+    def _time(self, method, url, latency, status):
+        for timer in self.timers:
+            timer(method, url, latency, status)